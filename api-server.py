@@ -1,102 +1,62 @@
 import http.server
-import socketserver
 import os
-import json
 import urllib.parse
 from datetime import datetime, timedelta
 import hashlib
-import jwt
 import sqlite3
+import jwt
 from functools import wraps
 
+from hallulies import (cache, compression, db, migrations, pagination, passwords, ratelimit, resizer, serving,
+                       static, tokens)
+from hallulies.cache import CachingMixin, cached
+from hallulies.conditional import PUBLIC_CACHE_CONTROL, conditional
+from hallulies.ratelimit import rate_limited
+from hallulies.resizer import ResizedImageMixin
+from hallulies.responses import ResponseMixin
+from hallulies.router import Router, RoutingMixin
+from hallulies.static import StaticFileMixin
+
 PORT = int(os.environ.get('PORT', 8000))
 SECRET_KEY = os.environ.get('SECRET_KEY', 'hallulies_secret_key_2024')
+TOKENS = tokens.TokenVerifier(SECRET_KEY)
+MIN_PASSWORD_LENGTH = int(os.environ.get('MIN_PASSWORD_LENGTH', 8))
+
+BOOKING_FIELDS = ['id', 'guest_name', 'email', 'phone', 'checkin_date', 'checkout_date', 'room_type',
+                  'adults', 'children', 'special_requests', 'status', 'total_amount', 'created_at']
+
+def testimonial_to_dict(testimonial):
+    return {
+        'id': testimonial[0],
+        'name': testimonial[1],
+        'location': testimonial[2],
+        'title': testimonial[3],
+        'content': testimonial[4],
+        'rating': testimonial[5],
+        'status': testimonial[6],
+        'created_at': testimonial[7]
+    }
+
+def menu_item_to_dict(item):
+    return {
+        'id': item[0],
+        'name': item[1],
+        'description': item[2],
+        'category': item[3],
+        'price': item[4],
+        'discounted_price': item[5],
+        'ingredients': item[6],
+        'allergens': item[7],
+        'tags': item[8],
+        'image_url': item[9],
+        'is_active': bool(item[10]),
+        'created_at': item[11]
+    }
 
 # Database setup
 def init_database():
-    conn = sqlite3.connect('hallulies.db')
-    cursor = conn.cursor()
-    
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            guest_name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            phone TEXT,
-            checkin_date DATE NOT NULL,
-            checkout_date DATE NOT NULL,
-            room_type TEXT NOT NULL,
-            adults INTEGER DEFAULT 1,
-            children INTEGER DEFAULT 0,
-            special_requests TEXT,
-            status TEXT DEFAULT 'pending',
-            total_amount REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS testimonials (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            location TEXT,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            rating INTEGER NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS menu_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            category TEXT NOT NULL,
-            price REAL NOT NULL,
-            discounted_price REAL,
-            ingredients TEXT,
-            allergens TEXT,
-            tags TEXT,
-            image_url TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Insert sample admin user (password: admin123)
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (username, email, password_hash, role)
-        VALUES (?, ?, ?, ?)
-    ''', ('admin', 'admin@hallulies.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.PZvO.S', 'admin'))
-    
-    # Insert sample menu items
-    sample_menu_items = [
-        ('Bruschetta Trio', 'Fresh tomatoes, basil, garlic on ciabatta', 'appetizers', 35.0, 26.0, 'Ciabatta bread, tomatoes, basil, garlic, olive oil', 'Gluten', 'vegetarian,gluten-free', ''),
-        ('Seared Scallops', 'Pan-seared Atlantic scallops with cauliflower purée', 'appetizers', 45.0, 34.0, 'Atlantic scallops, cauliflower, pancetta, truffle oil', 'Milk', 'seafood,gluten-free', ''),
-        ('Herb-Crusted Rack of Lamb', 'New Zealand lamb with rosemary crust and mint jus', 'mains', 85.0, 68.0, 'New Zealand lamb, fresh herbs, mint, root vegetables', 'Milk,Gluten', 'meat', ''),
-        ('Wild Mushroom Risotto', 'Creamy arborio rice with wild forest mushrooms', 'mains', 42.0, None, 'Arborio rice, wild mushrooms, vegetable stock, white wine', 'Milk', 'vegetarian,vegan,gluten-free', '')
-    ]
-    
-    cursor.executemany('''
-        INSERT OR IGNORE INTO menu_items (name, description, category, price, discounted_price, ingredients, allergens, tags, image_url)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_menu_items)
-    
-    conn.commit()
+    conn = db.connect()
+    migrations.migrate(conn)
     conn.close()
 
 # Authentication decorator
@@ -105,27 +65,18 @@ def require_auth(f):
     def wrapper(self, *args, **kwargs):
         auth_header = self.headers.get('Authorization')
         if not auth_header:
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Authorization header required'}).encode())
+            self.send_json_response({'error': 'Authorization header required'}, 401)
             return
         
         try:
             token = auth_header.split('Bearer ')[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+            payload = TOKENS.decode(token)
             self.current_user = payload
         except jwt.ExpiredSignatureError:
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Token expired'}).encode())
+            self.send_json_response({'error': 'Token expired'}, 401)
             return
         except jwt.InvalidTokenError:
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Invalid token'}).encode())
+            self.send_json_response({'error': 'Invalid token'}, 401)
             return
         
         return f(self, *args, **kwargs)
@@ -137,192 +88,119 @@ def require_role(required_role):
         @wraps(f)
         def wrapper(self, *args, **kwargs):
             if not hasattr(self, 'current_user'):
-                self.send_response(401)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Authentication required'}).encode())
+                self.send_json_response({'error': 'Authentication required'}, 401)
                 return
             
             user_role = self.current_user.get('role', 'user')
             if user_role != required_role and user_role != 'admin':
-                self.send_response(403)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Insufficient permissions'}).encode())
+                self.send_json_response({'error': 'Insufficient permissions'}, 403)
                 return
             
             return f(self, *args, **kwargs)
         return wrapper
     return decorator
 
-class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
+# API routes: (method, path pattern, handler method)
+ROUTES = Router([
+    ('POST', '/api/auth/login', 'handle_login'),
+    ('POST', '/api/auth/register', 'handle_register'),
+    ('GET', '/api/bookings', 'handle_get_bookings'),
+    ('POST', '/api/bookings', 'handle_create_booking'),
+    ('GET', '/api/bookings/{booking_id:int}', 'handle_get_booking'),
+    ('PUT', '/api/bookings/{booking_id:int}', 'handle_update_booking'),
+    ('DELETE', '/api/bookings/{booking_id:int}', 'handle_delete_booking'),
+    ('GET', '/api/testimonials', 'handle_get_testimonials'),
+    ('POST', '/api/testimonials', 'handle_create_testimonial'),
+    ('PUT', '/api/testimonials/{testimonial_id:int}', 'handle_update_testimonial'),
+    ('DELETE', '/api/testimonials/{testimonial_id:int}', 'handle_delete_testimonial'),
+    ('GET', '/api/menu', 'handle_get_menu'),
+    ('POST', '/api/menu', 'handle_create_menu_item'),
+    ('GET', '/api/menu/category/{category}', 'handle_get_menu_by_category'),
+    ('PUT', '/api/menu/{menu_id:int}', 'handle_update_menu_item'),
+    ('DELETE', '/api/menu/{menu_id:int}', 'handle_delete_menu_item'),
+    ('POST', '/api/contact', 'handle_contact_form'),
+    ('GET', '/api/analytics/dashboard', 'handle_get_dashboard_analytics'),
+    ('GET', '/api/users/profile', 'handle_get_user_profile'),
+    ('GET', '/api/admin/stats', 'handle_get_server_stats'),
+    ('GET', '/api/docs', 'handle_api_docs'),
+    ('GET', '/img/{width:int}/{path:path}', 'handle_resized_image'),
+])
+
+class HalluliesAPIHandler(RoutingMixin, CachingMixin, ResponseMixin, StaticFileMixin, ResizedImageMixin,
+                          http.server.SimpleHTTPRequestHandler):
+    routes = ROUTES
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=os.getcwd(), **kwargs)
     
     def do_OPTIONS(self):
-        self.send_response(200)
+        self.send_empty_response(200)
+    
+    def end_headers(self):
+        # Add CORS headers to all responses
         self.send_cors_headers()
-        self.end_headers()
+        super().end_headers()
     
     def send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Access-Control-Expose-Headers', 'X-Next-Cursor, Link')
     
     def do_GET(self):
-        if self.path.startswith('/api/'):
-            # API Routes
-            self.send_cors_headers()
-            if self.path == '/api/bookings':
-                self.handle_get_bookings()
-            elif self.path.startswith('/api/bookings/'):
-                self.send_cors_headers()
-                booking_id = self.path.split('/')[-1]
-                self.handle_get_booking(booking_id)
-            elif self.path == '/api/testimonials':
-                self.send_cors_headers()
-                self.handle_get_testimonials()
-            elif self.path == '/api/menu':
-                self.send_cors_headers()
-                self.handle_get_menu()
-            elif self.path.startswith('/api/menu/category/'):
-                self.send_cors_headers()
-                category = self.path.split('/')[-1]
-                self.handle_get_menu_by_category(category)
-            elif self.path == '/api/analytics/dashboard':
-                self.send_cors_headers()
-                self.handle_get_dashboard_analytics()
-            elif self.path == '/api/users/profile':
-                self.send_cors_headers()
-                self.handle_get_user_profile()
-            elif self.path == '/api/docs':
-                self.send_cors_headers()
-                self.handle_api_docs()
-            else:
-                self.send_cors_headers()
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
+        if not self.dispatch_route():
             # Static file serving
             super().do_GET()
     
     def do_POST(self):
-        if self.path.startswith('/api/'):
-            self.send_cors_headers()
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length) if content_length > 0 else b''
-            
-            try:
-                data = json.loads(post_data.decode()) if post_data else {}
-            except json.JSONDecodeError:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Invalid JSON'}).encode())
-                return
-            
-            # API Routes
-            if self.path == '/api/auth/login':
-                self.handle_login(data)
-            elif self.path == '/api/auth/register':
-                self.handle_register(data)
-            elif self.path == '/api/bookings':
-                self.handle_create_booking(data)
-            elif self.path == '/api/testimonials':
-                self.handle_create_testimonial(data)
-            elif self.path == '/api/menu':
-                self.handle_create_menu_item(data)
-            elif self.path == '/api/contact':
-                self.handle_contact_form(data)
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
+        if not self.dispatch_route():
+            self.read_body()
+            self.send_empty_response(404)
     
     def do_PUT(self):
-        if self.path.startswith('/api/'):
-            self.send_cors_headers()
-            content_length = int(self.headers.get('Content-Length', 0))
-            put_data = self.rfile.read(content_length) if content_length > 0 else b''
-            
-            try:
-                data = json.loads(put_data.decode()) if put_data else {}
-            except json.JSONDecodeError:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Invalid JSON'}).encode())
-                return
-            
-            if self.path.startswith('/api/bookings/'):
-                self.send_cors_headers()
-                booking_id = self.path.split('/')[-1]
-                self.handle_update_booking(booking_id, data)
-            elif self.path.startswith('/api/testimonials/'):
-                self.send_cors_headers()
-                testimonial_id = self.path.split('/')[-1]
-                self.handle_update_testimonial(testimonial_id, data)
-            elif self.path.startswith('/api/menu/'):
-                self.send_cors_headers()
-                menu_id = self.path.split('/')[-1]
-                self.handle_update_menu_item(menu_id, data)
-            else:
-                self.send_cors_headers()
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
+        if not self.dispatch_route():
+            self.read_body()
+            self.send_empty_response(404)
     
     def do_DELETE(self):
-        if self.path.startswith('/api/'):
-            self.send_cors_headers()
-            if self.path.startswith('/api/bookings/'):
-                booking_id = self.path.split('/')[-1]
-                self.handle_delete_booking(booking_id)
-            elif self.path.startswith('/api/testimonials/'):
-                testimonial_id = self.path.split('/')[-1]
-                self.handle_delete_testimonial(testimonial_id)
-            elif self.path.startswith('/api/menu/'):
-                menu_id = self.path.split('/')[-1]
-                self.handle_delete_menu_item(menu_id)
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
+        if not self.dispatch_route():
+            self.read_body()
+            self.send_empty_response(404)
     
     # Handler methods
+    @rate_limited('auth')
     def handle_login(self, data):
         email = data.get('email')
         password = data.get('password')
         
         if not email or not password:
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Email and password required'}).encode())
+            self.send_json_response({'error': 'Email and password required'}, 400)
+            return
+        if not isinstance(email, str) or not isinstance(password, str):
+            self.send_json_response({'error': 'Email and password must be strings'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT id, username, email, password_hash, role FROM users WHERE email = ?', (email,))
         user = cursor.fetchone()
         conn.close()
         
-        # Simple password check (in production, use proper hashing)
-        if user and user[3] == '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.PZvO.S':  # bcrypt hash of "admin123"
+        try:
+            valid, new_hash = passwords.verify(password, user[3] if user else None)
+        except passwords.PasswordHasherBusy:
+            self.send_json_response({'error': 'Too many logins in progress, try again'}, 503,
+                                    headers={'Retry-After': '1'})
+            return
+        
+        if new_hash:
+            # Hashed at an earlier BCRYPT_ROUNDS
+            conn = db.connect()
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user[0]))
+            conn.commit()
+            conn.close()
+        
+        if valid:
             token = jwt.encode({
                 'user_id': user[0],
                 'username': user[1],
@@ -331,10 +209,7 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'exp': datetime.utcnow() + timedelta(hours=24)
             }, SECRET_KEY, algorithm='HS256')
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({
+            self.send_json_response({
                 'token': token,
                 'user': {
                     'id': user[0],
@@ -342,30 +217,61 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
                     'email': user[2],
                     'role': user[4]
                 }
-            }).encode())
+            })
         else:
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Invalid credentials'}).encode())
+            self.send_json_response({'error': 'Invalid credentials'}, 401)
     
+    @rate_limited('auth')
     def handle_register(self, data):
-        # Registration logic here
-        self.send_response(201)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'User registered successfully'}).encode())
+        if any(not isinstance(data.get(field), (str, type(None))) for field in ('username', 'email', 'password')):
+            self.send_json_response({'error': 'Username, email and password must be strings'}, 400)
+            return
+        username = (data.get('username') or '').strip()
+        email = (data.get('email') or '').strip()
+        password = data.get('password') or ''
+        
+        if not username or not email or not password:
+            self.send_json_response({'error': 'Username, email and password required'}, 400)
+            return
+        if '@' not in email:
+            self.send_json_response({'error': 'Invalid email address'}, 400)
+            return
+        if len(password) < MIN_PASSWORD_LENGTH:
+            self.send_json_response({'error': f'Password must be at least {MIN_PASSWORD_LENGTH} characters'}, 400)
+            return
+        
+        try:
+            password_hash = passwords.hash_password(password)
+        except passwords.PasswordHasherBusy:
+            self.send_json_response({'error': 'Too many registrations in progress, try again'}, 503,
+                                    headers={'Retry-After': '1'})
+            return
+        
+        conn = db.connect()
+        try:
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, 'user')
+            ''', (username, email, password_hash))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            self.send_json_response({'error': 'Username or email already registered'}, 409)
+            return
+        finally:
+            conn.close()
+        
+        self.send_json_response({
+            'message': 'User registered successfully',
+            'user': {'id': cursor.lastrowid, 'username': username, 'email': email, 'role': 'user'}
+        }, 201)
     
+    @rate_limited('writes')
     def handle_create_booking(self, data):
         required_fields = ['guest_name', 'email', 'checkin_date', 'checkout_date', 'room_type']
         if not all(field in data for field in required_fields):
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Missing required fields'}).encode())
+            self.send_json_response({'error': 'Missing required fields'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO bookings (guest_name, email, phone, checkin_date, checkout_date, 
@@ -382,54 +288,69 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         conn.commit()
         conn.close()
         
-        self.send_response(201)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({
+        self.send_json_response({
             'message': 'Booking created successfully',
             'booking_id': booking_id
-        }).encode())
+        }, 201)
     
     def handle_get_bookings(self):
-        conn = sqlite3.connect('hallulies.db')
+        try:
+            fields = pagination.parse_fields(self.query.get('fields'), BOOKING_FIELDS)
+            limit = pagination.parse_limit(self.query.get('limit'))
+            after = self.query.get('after')
+            after = pagination.decode_cursor(after) if after else None
+        except pagination.PaginationError as e:
+            self.send_json_response({'error': str(e)}, 400)
+            return
+        
+        # Filters
+        conditions = []
+        values = []
+        for param, condition in (('status', 'status = ?'), ('room_type', 'room_type = ?'),
+                                 ('from', 'checkin_date >= ?'), ('to', 'checkin_date <= ?')):
+            if self.query.get(param):
+                conditions.append(condition)
+                values.append(self.query[param])
+        if after:
+            conditions.append('(created_at, id) < (?, ?)')
+            values.extend(after)
+        
+        # created_at and id are always read so the next cursor can be built
+        columns = list(dict.fromkeys(fields + ['created_at', 'id']))
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        query = f'SELECT {", ".join(columns)} FROM bookings {where} ORDER BY created_at DESC, id DESC LIMIT ?'
+        
+        conn = db.connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM bookings ORDER BY created_at DESC')
+        # One extra row tells us whether there is a next page
+        cursor.execute(query, values + [limit + 1])
         bookings = cursor.fetchall()
         conn.close()
         
-        booking_list = []
-        for booking in bookings:
-            booking_list.append({
-                'id': booking[0],
-                'guest_name': booking[1],
-                'email': booking[2],
-                'phone': booking[3],
-                'checkin_date': booking[4],
-                'checkout_date': booking[5],
-                'room_type': booking[6],
-                'adults': booking[7],
-                'children': booking[8],
-                'special_requests': booking[9],
-                'status': booking[10],
-                'total_amount': booking[11],
-                'created_at': booking[12]
-            })
+        next_cursor = None
+        if len(bookings) > limit:
+            bookings = bookings[:limit]
+            last = dict(zip(columns, bookings[-1]))
+            next_cursor = pagination.encode_cursor(last['created_at'], last['id'])
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(booking_list).encode())
+        booking_list = [
+            {field: value for field, value in zip(columns, booking) if field in fields}
+            for booking in bookings
+        ]
+        
+        headers = pagination.next_page_headers('/api/bookings', self.query, next_cursor)
+        # Guest details: never stored by browsers or shared caches
+        headers['Cache-Control'] = 'private, no-store'
+        self.send_json_response(booking_list, headers=headers)
     
+    @rate_limited('writes')
     def handle_create_testimonial(self, data):
         required_fields = ['name', 'title', 'content', 'rating']
         if not all(field in data for field in required_fields):
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Missing required fields'}).encode())
+            self.send_json_response({'error': 'Missing required fields'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO testimonials (name, location, title, content, rating)
@@ -441,79 +362,44 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         testimonial_id = cursor.lastrowid
         conn.commit()
+        cache.invalidate('testimonials')
         conn.close()
         
-        self.send_response(201)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({
+        self.send_json_response({
             'message': 'Testimonial submitted successfully',
             'testimonial_id': testimonial_id
-        }).encode())
+        }, 201)
     
+    @conditional('testimonials', cache_control=PUBLIC_CACHE_CONTROL)
+    @cached('testimonials')
     def handle_get_testimonials(self):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM testimonials WHERE status = "approved" ORDER BY created_at DESC')
-        testimonials = cursor.fetchall()
+        cursor.execute("SELECT * FROM testimonials WHERE status = 'approved' ORDER BY created_at DESC")
+        self.send_json_list(db.fetch_batches(cursor, testimonial_to_dict))
         conn.close()
-        
-        testimonial_list = []
-        for testimonial in testimonials:
-            testimonial_list.append({
-                'id': testimonial[0],
-                'name': testimonial[1],
-                'location': testimonial[2],
-                'title': testimonial[3],
-                'content': testimonial[4],
-                'rating': testimonial[5],
-                'status': testimonial[6],
-                'created_at': testimonial[7]
-            })
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(testimonial_list).encode())
     
+    @conditional('menu_items', cache_control=PUBLIC_CACHE_CONTROL)
+    @cached('menu_items')
     def handle_get_menu(self):
-        conn = sqlite3.connect('hallulies.db')
+        category = self.query.get('category')
+        if category:
+            self.handle_get_menu_by_category(category)
+            return
+        
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM menu_items WHERE is_active = 1 ORDER BY category, name')
-        menu_items = cursor.fetchall()
+        self.send_json_list(db.fetch_batches(cursor, menu_item_to_dict))
         conn.close()
-        
-        menu_list = []
-        for item in menu_items:
-            menu_list.append({
-                'id': item[0],
-                'name': item[1],
-                'description': item[2],
-                'category': item[3],
-                'price': item[4],
-                'discounted_price': item[5],
-                'ingredients': item[6],
-                'allergens': item[7],
-                'tags': item[8],
-                'image_url': item[9],
-                'is_active': bool(item[10]),
-                'created_at': item[11]
-            })
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(menu_list).encode())
     
+    @rate_limited('writes')
     def handle_contact_form(self, data):
         # Handle contact form submission
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Message sent successfully'}).encode())
+        self.send_json_response({'message': 'Message sent successfully'})
     
     def handle_get_dashboard_analytics(self):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Get total bookings
@@ -528,11 +414,11 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         recent_bookings = cursor.fetchone()[0]
         
         # Get approved testimonials count
-        cursor.execute('SELECT COUNT(*) FROM testimonials WHERE status = "approved"')
+        cursor.execute("SELECT COUNT(*) FROM testimonials WHERE status = 'approved'")
         approved_testimonials = cursor.fetchone()[0]
         
         # Get average rating
-        cursor.execute('SELECT AVG(rating) FROM testimonials WHERE status = "approved"')
+        cursor.execute("SELECT AVG(rating) FROM testimonials WHERE status = 'approved'")
         avg_rating = cursor.fetchone()[0] or 0
         
         conn.close()
@@ -545,10 +431,22 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
             'revenue_30_days': 124560  # Mock data
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(analytics).encode())
+        self.send_json_response(analytics)
+    
+    @require_auth
+    @require_role('admin')
+    def handle_get_server_stats(self):
+        self.send_json_response({
+            'server': self.server.stats(),
+            'database': db.stats(),
+            'response_cache': cache.stats(),
+            'compression': compression.stats(),
+            'static_files': static.stats(),
+            'image_resizer': resizer.stats(),
+            'auth_tokens': TOKENS.stats(),
+            'passwords': passwords.stats(),
+            'rate_limits': ratelimit.stats()
+        })
     
     def handle_api_docs(self):
         docs = {
@@ -557,10 +455,10 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
             "endpoints": {
                 "Authentication": {
                     "POST /api/auth/login": "User login",
-                    "POST /api/auth/register": "User registration"
+                    "POST /api/auth/register": "User registration ({username, email, password}; 409 if taken)"
                 },
                 "Bookings": {
-                    "GET /api/bookings": "Get all bookings",
+                    "GET /api/bookings": "List bookings, newest first (?limit=, ?after=<X-Next-Cursor>, ?status=, ?room_type=, ?from=/?to= on check-in date, ?fields=id,guest_name,...)",
                     "POST /api/bookings": "Create new booking",
                     "GET /api/bookings/{id}": "Get specific booking",
                     "PUT /api/bookings/{id}": "Update booking",
@@ -573,7 +471,7 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
                     "DELETE /api/testimonials/{id}": "Delete testimonial"
                 },
                 "Menu": {
-                    "GET /api/menu": "Get all menu items",
+                    "GET /api/menu": "Get all menu items (optional ?category=)",
                     "POST /api/menu": "Create menu item",
                     "GET /api/menu/category/{category}": "Get menu by category",
                     "PUT /api/menu/{id}": "Update menu item",
@@ -581,6 +479,12 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
                 },
                 "Analytics": {
                     "GET /api/analytics/dashboard": "Get dashboard analytics"
+                },
+                "Images": {
+                    "GET /img/{width}/{path}": "Image under images/ resized to width (e.g. /img/640/images/room2.jpeg), AVIF/WebP per Accept"
+                },
+                "Admin": {
+                    "GET /api/admin/stats": "Serving engine and database connection statistics (admin only)"
                 }
             },
             "authentication": "Use Bearer token in Authorization header",
@@ -592,21 +496,12 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
             }
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(docs, indent=2).encode())
+        self.send_json_response(docs, indent=2)
     
     # Additional handler methods
+    @require_auth
     def handle_get_user_profile(self):
-        if not hasattr(self, 'current_user'):
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Authentication required'}).encode())
-            return
-        
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT id, username, email, role, created_at FROM users WHERE id = ?', 
                       (self.current_user['user_id'],))
@@ -623,26 +518,17 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'last_login': datetime.now().isoformat()
             }
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(user_data).encode())
+            self.send_json_response(user_data)
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'User not found'}).encode())
+            self.send_json_response({'error': 'User not found'}, 404)
     
     def handle_create_menu_item(self, data):
         required_fields = ['name', 'description', 'category', 'price']
         if not all(field in data for field in required_fields):
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Missing required fields'}).encode())
+            self.send_json_response({'error': 'Missing required fields'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO menu_items (name, description, category, price, discounted_price, 
@@ -657,57 +543,32 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         menu_id = cursor.lastrowid
         conn.commit()
+        cache.invalidate('menu_items')
         conn.close()
         
-        self.send_response(201)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({
+        self.send_json_response({
             'message': 'Menu item created successfully',
             'menu_id': menu_id
-        }).encode())
+        }, 201)
     
+    @conditional('menu_items', cache_control=PUBLIC_CACHE_CONTROL)
+    @cached('menu_items')
     def handle_get_menu_by_category(self, category):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM menu_items WHERE category = ? AND is_active = 1 ORDER BY name', (category,))
-        menu_items = cursor.fetchall()
+        self.send_json_list(db.fetch_batches(cursor, menu_item_to_dict))
         conn.close()
-        
-        menu_list = []
-        for item in menu_items:
-            menu_list.append({
-                'id': item[0],
-                'name': item[1],
-                'description': item[2],
-                'category': item[3],
-                'price': item[4],
-                'discounted_price': item[5],
-                'ingredients': item[6],
-                'allergens': item[7],
-                'tags': item[8],
-                'image_url': item[9],
-                'is_active': bool(item[10]),
-                'created_at': item[11]
-            })
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(menu_list).encode())
     
     def handle_update_booking(self, booking_id, data):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if booking exists
         cursor.execute('SELECT id FROM bookings WHERE id = ?', (booking_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Booking not found'}).encode())
+            self.send_json_response({'error': 'Booking not found'}, 404)
             return
         
         # Build update query dynamically
@@ -724,10 +585,7 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         if not update_fields:
             conn.close()
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'No valid fields to update'}).encode())
+            self.send_json_response({'error': 'No valid fields to update'}, 400)
             return
         
         update_values.append(booking_id)
@@ -737,23 +595,17 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         conn.commit()
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Booking updated successfully'}).encode())
+        self.send_json_response({'message': 'Booking updated successfully'})
     
     def handle_update_testimonial(self, testimonial_id, data):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if testimonial exists
         cursor.execute('SELECT id FROM testimonials WHERE id = ?', (testimonial_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Testimonial not found'}).encode())
+            self.send_json_response({'error': 'Testimonial not found'}, 404)
             return
         
         # Build update query
@@ -769,10 +621,7 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         if not update_fields:
             conn.close()
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'No valid fields to update'}).encode())
+            self.send_json_response({'error': 'No valid fields to update'}, 400)
             return
         
         update_values.append(testimonial_id)
@@ -780,25 +629,20 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         cursor.execute(query, update_values)
         conn.commit()
+        cache.invalidate('testimonials')
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Testimonial updated successfully'}).encode())
+        self.send_json_response({'message': 'Testimonial updated successfully'})
     
     def handle_update_menu_item(self, menu_id, data):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if menu item exists
         cursor.execute('SELECT id FROM menu_items WHERE id = ?', (menu_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Menu item not found'}).encode())
+            self.send_json_response({'error': 'Menu item not found'}, 404)
             return
         
         # Build update query
@@ -818,10 +662,7 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         if not update_fields:
             conn.close()
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'No valid fields to update'}).encode())
+            self.send_json_response({'error': 'No valid fields to update'}, 400)
             return
         
         update_values.append(menu_id)
@@ -829,97 +670,76 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
         
         cursor.execute(query, update_values)
         conn.commit()
+        cache.invalidate('menu_items')
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Menu item updated successfully'}).encode())
+        self.send_json_response({'message': 'Menu item updated successfully'})
     
     def handle_delete_booking(self, booking_id):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if booking exists
         cursor.execute('SELECT id FROM bookings WHERE id = ?', (booking_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Booking not found'}).encode())
+            self.send_json_response({'error': 'Booking not found'}, 404)
             return
         
         # Soft delete - update status instead of removing
-        cursor.execute('UPDATE bookings SET status = "cancelled" WHERE id = ?', (booking_id,))
+        cursor.execute("UPDATE bookings SET status = 'cancelled' WHERE id = ?", (booking_id,))
         conn.commit()
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Booking cancelled successfully'}).encode())
+        self.send_json_response({'message': 'Booking cancelled successfully'})
     
     def handle_delete_testimonial(self, testimonial_id):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if testimonial exists
         cursor.execute('SELECT id FROM testimonials WHERE id = ?', (testimonial_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Testimonial not found'}).encode())
+            self.send_json_response({'error': 'Testimonial not found'}, 404)
             return
         
         # Soft delete - update status instead of removing
-        cursor.execute('UPDATE testimonials SET status = "deleted" WHERE id = ?', (testimonial_id,))
+        cursor.execute("UPDATE testimonials SET status = 'deleted' WHERE id = ?", (testimonial_id,))
         conn.commit()
+        cache.invalidate('testimonials')
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Testimonial deleted successfully'}).encode())
+        self.send_json_response({'message': 'Testimonial deleted successfully'})
     
     def handle_delete_menu_item(self, menu_id):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Check if menu item exists
         cursor.execute('SELECT id FROM menu_items WHERE id = ?', (menu_id,))
         if not cursor.fetchone():
             conn.close()
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Menu item not found'}).encode())
+            self.send_json_response({'error': 'Menu item not found'}, 404)
             return
         
         # Soft delete - set is_active to False
         cursor.execute('UPDATE menu_items SET is_active = 0 WHERE id = ?', (menu_id,))
         conn.commit()
+        cache.invalidate('menu_items')
         conn.close()
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps({'message': 'Menu item deactivated successfully'}).encode())
+        self.send_json_response({'message': 'Menu item deactivated successfully'})
     
     def handle_get_booking(self, booking_id):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM bookings WHERE id = ?', (booking_id,))
         booking = cursor.fetchone()
         conn.close()
         
         if not booking:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Booking not found'}).encode())
+            self.send_json_response({'error': 'Booking not found'}, 404)
             return
         
         booking_data = {
@@ -938,23 +758,16 @@ class HalluliesAPIHandler(http.server.SimpleHTTPRequestHandler):
             'created_at': booking[12]
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(booking_data).encode())
+        self.send_json_response(booking_data)
 
 if __name__ == "__main__":
     # Initialize database
     init_database()
     
     # Start server
-    with socketserver.TCPServer(("0.0.0.0", PORT), HalluliesAPIHandler) as httpd:
-        print(f"🚀 Hallulies Hotel API Server running at http://0.0.0.0:{PORT}")
-        print("🔐 Admin login: admin@hallulies.com / admin123")
-        print("📚 API Documentation: http://0.0.0.0:8000/api/docs")
-        print("Press Ctrl+C to stop the server")
-        
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\nServer stopped.")
\ No newline at end of file
+    print(f"🚀 Hallulies Hotel API Server running at http://0.0.0.0:{PORT}")
+    print("🔐 Admin login: admin@hallulies.com / admin123")
+    print("📚 API Documentation: http://0.0.0.0:8000/api/docs")
+    print("Press Ctrl+C to stop the server")
+    
+    serving.serve(HalluliesAPIHandler, PORT)
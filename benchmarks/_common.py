@@ -0,0 +1,186 @@
+"""
+Shared helpers for the benchmark scripts
+
+Each benchmark starts the real server scripts as subprocesses inside a
+scratch directory (static files are symlinked in, the database is fresh)
+so the committed hallulies.db is never touched.
+"""
+
+import contextlib
+import http.client
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_SKIP_ENTRIES = {'.git', 'hallulies.db', 'hallulies.db-wal', 'hallulies.db-shm', 'benchmarks', '__pycache__'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start within {timeout}s')
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """Temporary working directory with the site's static files symlinked in"""
+    workdir = tempfile.mkdtemp(prefix='hallulies-bench-')
+    try:
+        for name in os.listdir(ROOT):
+            if name in _SKIP_ENTRIES:
+                continue
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+        yield workdir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def server_process(script, env=None, setup=None):
+    """Run one of the server scripts on a free port and yield (port, process).
+
+    ``setup(workdir)`` runs before the server starts, e.g. to seed the database.
+    """
+    port = free_port()
+    server_env = dict(os.environ, PORT=str(port), ENABLE_SELF_PING='false')
+    server_env.update(env or {})
+    with scratch_dir() as workdir:
+        if setup:
+            setup(workdir)
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, script)],
+            cwd=workdir, env=server_env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port)
+            yield port, proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+@contextlib.contextmanager
+def running_server(script, env=None, setup=None):
+    """Run one of the server scripts on a free port and yield the port"""
+    with server_process(script, env, setup) as (port, _):
+        yield port
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a running process (Linux /proc only)"""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def fetch(conn, method, path, body=None, headers=None):
+    """Issue one request on ``conn`` and return (status, headers, body)"""
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, response.headers, data
+
+
+def run_load(port, paths, clients, requests_per_client, keepalive=True,
+             method='GET', body=None, headers=None):
+    """Hammer the server from ``clients`` threads.
+
+    Returns a dict with total requests, elapsed seconds, requests/second,
+    error count and latency percentiles in milliseconds.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        own = []
+        failed = 0
+        start_barrier.wait()
+        for i in range(requests_per_client):
+            path = paths[(index + i) % len(paths)]
+            started = time.perf_counter()
+            try:
+                status, _, _ = fetch(conn, method, path, body, headers)
+                if status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            own.append(time.perf_counter() - started)
+            if not keepalive:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors[0])
+
+
+def summarize(latencies, elapsed, errors=0):
+    latencies = sorted(latencies)
+    total = len(latencies)
+
+    def pct(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(total - 1, int(total * p))] * 1000
+
+    return {
+        'requests': total,
+        'elapsed': elapsed,
+        'rps': total / elapsed if elapsed else 0.0,
+        'errors': errors,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+    }
+
+
+def print_table(title, columns, rows):
+    print(f'\n{title}')
+    print('-' * len(title))
+    widths = [max(len(str(c)), *(len(str(r[i])) for r in rows)) for i, c in enumerate(columns)]
+    print('  '.join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,117 @@
+"""
+Local stand-in SMTP server for the email benchmarks
+
+Speaks just enough SMTP for smtplib (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT; no STARTTLS, so run the servers with
+EMAIL_USE_TLS=false) and waits ``delay`` seconds before every reply to
+stand in for the round trips to a real provider. Received messages are
+counted and kept in ``messages``; ``drop_after`` makes it hang up on a
+session silently, as providers do with long-lived or idle ones.
+
+    with SMTPStub(delay=0.05) as smtp:
+        env = {'EMAIL_HOST': '127.0.0.1', 'EMAIL_PORT': str(smtp.port),
+               'EMAIL_USE_TLS': 'false', 'EMAIL_HOST_PASSWORD': 'x'}
+"""
+
+import socket
+import threading
+import time
+
+
+class SMTPStub:
+    def __init__(self, delay=0.0, fail_first=0, drop_after=0):
+        self.delay = delay
+        # Reject this many messages with a 451 before accepting any
+        self.fail_first = fail_first
+        # Hang up on a client after this many messages (0: never), like providers that cap sessions
+        self.drop_after = drop_after
+        self.messages = []
+        self.connections = 0
+        self.received_at = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(64)
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._sock.close()
+
+    def wait_for(self, count, timeout=60.0):
+        """Block until count messages have been received; returns whether they were"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if len(self.messages) >= count:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+            threading.Thread(target=self._session, args=(conn,), daemon=True).start()
+
+    def _reply(self, conn, line):
+        if self.delay:
+            time.sleep(self.delay)
+        conn.sendall(line.encode() + b'\r\n')
+
+    def _session(self, conn):
+        reader = conn.makefile('rb')
+        accepted = 0
+        try:
+            self._reply(conn, '220 stub ESMTP')
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                command = line.decode(errors='replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+                if verb == 'EHLO':
+                    conn.sendall(b'250-stub\r\n')
+                    self._reply(conn, '250 AUTH PLAIN LOGIN')
+                elif verb == 'HELO':
+                    self._reply(conn, '250 stub')
+                elif verb == 'AUTH':
+                    self._reply(conn, '235 Authentication successful')
+                elif verb == 'DATA':
+                    self._reply(conn, '354 End data with <CR><LF>.<CR><LF>')
+                    data = []
+                    for data_line in reader:
+                        if data_line in (b'.\r\n', b'.\n'):
+                            break
+                        data.append(data_line)
+                    with self._lock:
+                        rejected = self.fail_first > 0
+                        if rejected:
+                            self.fail_first -= 1
+                        else:
+                            self.messages.append(b''.join(data))
+                            self.received_at.append(time.perf_counter())
+                    self._reply(conn, '451 Try again later' if rejected else '250 OK')
+                    accepted += not rejected
+                    if self.drop_after and accepted >= self.drop_after:
+                        return
+                elif verb == 'QUIT':
+                    self._reply(conn, '221 Bye')
+                    return
+                else:
+                    # MAIL, RCPT, RSET, NOOP
+                    self._reply(conn, '250 OK')
+        except OSError:
+            pass
+        finally:
+            reader.close()
+            conn.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Admin notifications for a burst of contact form submissions: one email each
+vs. digests
+
+Posts --messages contact form submissions against a local stand-in SMTP
+server (see _smtp.py) with ADMIN_DIGEST_WINDOW=0 (an email per submission,
+as before) and with a --window second digest window. Reports how many SMTP
+messages and connections reached the server and how long after the burst
+the last notification was delivered.
+
+Usage: python benchmarks/bench_admin_digest.py [enhanced-api-server.py] [--messages N] [--window S]
+"""
+
+import argparse
+import json
+import time
+
+from _common import print_table, run_load, server_process
+from _smtp import SMTPStub
+
+CONTACT = json.dumps({
+    'name': 'Bench Sender',
+    'email': 'sender@example.com',
+    'phone': '+233000000000',
+    'subject': 'Venue enquiry',
+    'message': 'Is the hall free on the first Saturday of June? ' * 4,
+})
+
+
+def notifications(messages):
+    """Submissions covered by the received emails; a digest lists each under an <h3>"""
+    return sum(max(message.count(b'<h3>'), 1) for message in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='enhanced-api-server.py')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--window', type=float, default=2.0)
+    parser.add_argument('--smtp-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    rows = []
+    for label, window in (('email per submission', 0), (f'digest, {args.window:g} s window', args.window)):
+        with SMTPStub(delay=args.smtp_delay) as smtp:
+            env = {
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': str(smtp.port),
+                'EMAIL_USE_TLS': 'false',
+                'EMAIL_HOST_PASSWORD': 'bench',
+                'EMAIL_RATE_LIMIT': '0',
+                'EMAIL_OUTBOX_POLL_INTERVAL': '0.5',
+                'ADMIN_DIGEST_WINDOW': str(window),
+            }
+            with server_process(args.script, env) as (port, _):
+                result = run_load(port, ['/api/contact'], args.clients, args.messages // args.clients,
+                                  method='POST', body=CONTACT, headers={'Content-Type': 'application/json'})
+                finished = time.perf_counter()
+                deadline = finished + 60
+                while notifications(list(smtp.messages)) < result['requests'] and time.perf_counter() < deadline:
+                    time.sleep(0.05)
+                lag = smtp.received_at[-1] - finished if smtp.received_at else float('nan')
+        rows.append((label, result['requests'], f"{result['p50_ms']:.0f}", len(smtp.messages), smtp.connections,
+                     notifications(smtp.messages), f'{max(lag, 0):.2f}', result['errors']))
+
+    print_table(f'{args.script}: {args.messages} contact submissions from {args.clients} clients, '
+                f'SMTP reply delay {args.smtp_delay * 1000:.0f} ms',
+                ('mode', 'requests', 'p50 ms', 'emails', 'connections', 'notifications', 'delivered +s', 'errors'),
+                rows)
+
+
+if __name__ == '__main__':
+    main()
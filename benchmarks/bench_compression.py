@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Response compression: bytes on the wire and server cost
+
+Fetches index.html with its CSS and JS, /api/menu and a long (streamed)
+/api/testimonials with and without Accept-Encoding: gzip and reports the
+bytes received, then measures static-asset throughput with compression
+off, compressed on every request (COMPRESSION_CACHE_MAX_BYTES=0), with
+the compressed-body cache and, once build_assets.py has written dist/,
+precompressed from STATIC_ROOT=dist.
+
+Usage: python benchmarks/bench_compression.py [api-server.py] [--rows N] [--requests N]
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+
+from _common import ROOT, fetch, print_table, run_load, running_server
+from bench_keepalive import page_assets
+from bench_streaming import seed
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def page_bytes(port, paths, headers):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    received = raw = 0
+    for path in paths:
+        status, response_headers, body = fetch(conn, 'GET', path, headers=headers)
+        received += len(body)
+        if response_headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        raw += len(body)
+        if path.startswith('/api/'):
+            json.loads(body)
+    conn.close()
+    return received, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    page = ['/index.html'] + page_assets()
+    text_assets = [path for path in page if path.endswith(('.html', '.css', '.js'))]
+    lists = ['/api/menu', '/api/testimonials']
+    env = {'HTTP_KEEPALIVE': 'true'}
+
+    rows = []
+    with running_server(args.script, env, setup=seed(args.rows)) as port:
+        for label, paths in (('text assets', text_assets), ('API lists', lists)):
+            plain, _ = page_bytes(port, paths, {})
+            compressed, raw = page_bytes(port, paths, GZIP)
+            rows.append((label, f'{raw / 1024:.0f}', f'{plain / 1024:.0f}', f'{compressed / 1024:.0f}',
+                         f'{compressed / plain:.0%}'))
+    print_table(f'{args.script}: bytes per visit',
+                ('responses', 'raw KB', 'identity KB', 'gzip KB', 'ratio'), rows)
+
+    modes = [('COMPRESSION=false', {'COMPRESSION': 'false'}, text_assets),
+             ('gzip, no cache', {'COMPRESSION_CACHE_MAX_BYTES': '0'}, text_assets),
+             ('gzip, cached', {}, text_assets)]
+    manifest_path = os.path.join(ROOT, 'dist', 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        built = [path if path.endswith('.html') else '/' + manifest.get(path.lstrip('/'), path.lstrip('/'))
+                 for path in text_assets]
+        modes.append(('STATIC_ROOT=dist', {'STATIC_ROOT': 'dist'}, built))
+
+    rows = []
+    for label, extra, paths in modes:
+        with running_server(args.script, dict(env, **extra)) as port:
+            run_load(port, paths, 1, len(paths), headers=GZIP)
+            result = run_load(port, paths, 8, args.requests // 8, headers=GZIP)
+        rows.append((label, f"{result['rps']:.0f}", f"{result['p50_ms']:.1f}", f"{result['p99_ms']:.1f}",
+                     result['errors']))
+    print_table(f'{args.script}: {len(text_assets)} text assets, 8 keep-alive clients',
+                ('mode', 'req/s', 'p50 ms', 'p99 ms', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Throughput vs. concurrent clients for each serving engine
+
+Usage: python benchmarks/bench_concurrency.py [api-server.py] [--requests N] [--processes N]
+"""
+
+import argparse
+
+from _common import print_table, run_load, running_server
+
+PATHS = ['/api/menu', '/api/testimonials', '/images/eventPlace1.jpeg', '/styles.css']
+CLIENT_COUNTS = [1, 2, 4, 8, 16, 32]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--processes', type=int, default=1, help='SERVER_PROCESSES for the server')
+    args = parser.parse_args()
+
+    rows = []
+    for engine in ('single', 'threaded', 'asyncio'):
+        env = {'SERVER_ENGINE': engine, 'SERVER_PROCESSES': str(args.processes)}
+        with running_server(args.script, env) as port:
+            for clients in CLIENT_COUNTS:
+                result = run_load(port, PATHS, clients, args.requests, keepalive=False)
+                rows.append((
+                    engine, clients, f"{result['rps']:.0f}",
+                    f"{result['p50_ms']:.1f}", f"{result['p99_ms']:.1f}", result['errors'],
+                ))
+
+    print_table(f'{args.script}: throughput by concurrent clients ({args.processes} process(es))',
+                ('engine', 'clients', 'req/s', 'p50 ms', 'p99 ms', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Repeat visits with and without validators
+
+Loads index.html, its assets and the menu/testimonial APIs once to collect
+ETags, then repeats the visit the way a browser revalidates (If-None-Match)
+and the way it did before validators existed (plain GETs).
+
+Usage: python benchmarks/bench_conditional.py [api-server.py] [--visits N]
+"""
+
+import argparse
+import http.client
+import time
+
+from _common import fetch, print_table, running_server
+from bench_keepalive import page_assets
+
+API_PATHS = ['/api/menu', '/api/testimonials']
+
+
+def visit(port, paths, etags=None):
+    """One page visit over a keep-alive connection; returns (seconds, body bytes, 304s)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    started = time.perf_counter()
+    received = 0
+    not_modified = 0
+    for path in paths:
+        headers = {'If-None-Match': etags[path]} if etags and path in etags else {}
+        status, response_headers, body = fetch(conn, 'GET', path, headers=headers)
+        received += len(body)
+        not_modified += status == 304
+        if etags is not None and status == 200 and response_headers.get('ETag'):
+            etags[path] = response_headers['ETag']
+    conn.close()
+    return time.perf_counter() - started, received, not_modified
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--visits', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = ['/index.html'] + page_assets() + (API_PATHS if args.script != 'server.py' else [])
+    rows = []
+    with running_server(args.script, {'HTTP_KEEPALIVE': 'true'}) as port:
+        etags = {}
+        visit(port, paths, etags)
+        for label, validators in (('plain GET', None), ('If-None-Match', etags)):
+            results = [visit(port, paths, validators) for _ in range(args.visits)]
+            seconds = sum(result[0] for result in results) / len(results)
+            rows.append((label, len(paths), results[0][2], f'{results[0][1] / 1024:.0f}', f'{seconds * 1000:.1f}'))
+
+    print_table(f'{args.script}: repeat visit of index.html',
+                ('requests', 'per visit', '304s', 'KB received', 'visit ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-request sqlite3.connect() vs. the per-thread ConnectionManager
+
+Runs the queries behind GET /api/menu and GET /api/bookings/{id} from a few
+worker threads, once opening and closing hallulies.db around every request
+(the old handler pattern) and once through hallulies.db.ConnectionManager.
+
+Usage: python benchmarks/bench_db_pool.py [--requests N]
+"""
+
+import argparse
+import importlib.util
+import os
+import sqlite3
+import threading
+import time
+
+from _common import ROOT, print_table, scratch_dir
+from hallulies.db import ConnectionManager
+
+THREAD_COUNTS = [1, 4, 16]
+
+
+def load_api_server():
+    spec = importlib.util.spec_from_file_location('api_server', os.path.join(ROOT, 'api-server.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def handle_request(conn, booking_id):
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM menu_items WHERE is_active = 1 ORDER BY category, name')
+    cursor.fetchall()
+    cursor.execute('SELECT * FROM bookings WHERE id = ?', (booking_id,))
+    cursor.fetchone()
+    conn.close()
+
+
+def run(threads, requests, open_connection):
+    per_thread = requests // threads
+
+    def worker():
+        for i in range(per_thread):
+            handle_request(open_connection(), i % 50 + 1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return per_thread * threads / elapsed, elapsed / (per_thread * threads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=4000)
+    args = parser.parse_args()
+
+    with scratch_dir() as workdir:
+        os.chdir(workdir)
+        load_api_server().init_database()
+        conn = sqlite3.connect('hallulies.db')
+        conn.executemany(
+            "INSERT INTO bookings (guest_name, email, checkin_date, checkout_date, room_type) "
+            "VALUES (?, ?, '2025-01-01', '2025-01-03', 'deluxe')",
+            [(f'Guest {i}', f'guest{i}@example.com') for i in range(50)])
+        conn.commit()
+        conn.close()
+
+        rows = []
+        for threads in THREAD_COUNTS:
+            manager = ConnectionManager('hallulies.db')
+            fresh_rps, fresh_us = run(threads, args.requests, lambda: sqlite3.connect('hallulies.db'))
+            pooled_rps, pooled_us = run(threads, args.requests, manager.connect)
+            stats = manager.stats()
+            manager.close_all()
+            rows.append((threads, f'{fresh_rps:.0f}', f'{pooled_rps:.0f}', f'{fresh_us:.1f}',
+                         f'{pooled_us:.1f}', f'{pooled_rps / fresh_rps:.1f}x',
+                         stats['opened']))
+        os.chdir(ROOT)
+
+    print_table('Database access per request',
+                ('threads', 'connect req/s', 'pooled req/s', 'connect us', 'pooled us',
+                 'speedup', 'connections opened'), rows)
+
+
+if __name__ == '__main__':
+    main()
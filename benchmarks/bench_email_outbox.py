@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Booking creation latency: inline SMTP vs. the email outbox
+
+Creates bookings against a local stand-in SMTP server that waits --smtp-delay
+seconds before each reply (about eight round trips per message, like a real
+provider without STARTTLS). With EMAIL_OUTBOX=false the confirmation email
+is sent in the request thread before the 201, as the handlers used to;
+with the outbox the request only queues it. Reports request latency and how
+long after the last request all confirmations had been delivered. The
+"retry" row rejects the first messages with a 451 to show them retried.
+
+Usage: python benchmarks/bench_email_outbox.py [enhanced-api-server.py] [--bookings N] [--clients N]
+"""
+
+import argparse
+import json
+import time
+
+from _common import print_table, run_load, server_process
+from _smtp import SMTPStub
+
+BOOKING = json.dumps({
+    'guest_name': 'Bench Guest',
+    'email': 'guest@example.com',
+    'phone': '+233000000000',
+    'checkin_date': '2025-06-01',
+    'checkout_date': '2025-06-03',
+    'room_type': 'Deluxe Room',
+    'adults': 2,
+})
+
+MODES = [
+    ('inline', {'EMAIL_OUTBOX': 'false'}, 0),
+    ('outbox', {}, 0),
+    ('outbox, retry', {'EMAIL_RETRY_BASE_DELAY': '0.2'}, 5),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='enhanced-api-server.py')
+    parser.add_argument('--bookings', type=int, default=80)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--smtp-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    rows = []
+    for label, extra, fail_first in MODES:
+        with SMTPStub(delay=args.smtp_delay, fail_first=fail_first) as smtp:
+            env = dict({
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': str(smtp.port),
+                'EMAIL_USE_TLS': 'false',
+                'EMAIL_HOST_PASSWORD': 'bench',
+                'EMAIL_RATE_LIMIT': '0',
+            }, **extra)
+            with server_process(args.script, env) as (port, _):
+                result = run_load(port, ['/api/bookings'], args.clients, args.bookings // args.clients,
+                                  method='POST', body=BOOKING, headers={'Content-Type': 'application/json'})
+                finished = time.perf_counter()
+                delivered = smtp.wait_for(result['requests'])
+                lag = (smtp.received_at[-1] - finished) if delivered and smtp.received_at else float('nan')
+        rows.append((label, result['requests'], f"{result['rps']:.1f}", f"{result['p50_ms']:.0f}",
+                     f"{result['p99_ms']:.0f}", len(smtp.messages), f'{max(lag, 0):.2f}', result['errors']))
+
+    print_table(f'{args.script}: {args.bookings} bookings from {args.clients} clients, '
+                f'SMTP reply delay {args.smtp_delay * 1000:.0f} ms',
+                ('mode', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'emails', 'delivered +s', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Email body render cost: the old f-strings vs. compiled templates
+
+Renders each email --number times and reports microseconds per message:
+
+  f-string         the booking confirmation as the servers used to build
+                   it, a multi-kilobyte f-string with the CSS inlined and
+                   nothing escaped
+  parse per call   hallulies.templates without its cache: read, parse and
+                   compile the template (and its layout) for every message
+  compiled         templates.render(), as the servers now call it
+
+Usage: python benchmarks/bench_email_templates.py [--number N]
+"""
+
+import argparse
+import timeit
+
+from _common import print_table
+
+from hallulies import templates
+
+BOOKING = {
+    'id': 1,
+    'guest_name': 'Ama Mensah',
+    'email': 'guest@example.com',
+    'phone': '+233000000000',
+    'checkin_date': '2025-06-01',
+    'checkout_date': '2025-06-03',
+    'room_type': 'Deluxe Room',
+    'adults': 2,
+    'children': 1,
+    'special_requests': 'Late check-in, around 11 pm & a quiet room <please>',
+}
+
+TESTIMONIAL = {
+    'name': 'Kofi Boateng',
+    'location': 'Accra',
+    'title': 'Wonderful stay',
+    'content': 'The staff were lovely and the food was excellent. ' * 5,
+    'rating': 5,
+}
+
+CONTACT = {
+    'name': 'Efua Owusu',
+    'email': 'efua@example.com',
+    'phone': '+233000000001',
+    'subject': 'Wedding reception',
+    'message': 'We would like to book the venue for a reception of 120 guests in August. ' * 3,
+}
+
+
+def fstring_booking(booking_data):
+    """The booking confirmation body as send_booking_confirmation_email built it"""
+    return f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: linear-gradient(90deg, #d2691e, #8b4513); color: white; padding: 20px; text-align: center; }}
+            .content {{ padding: 20px; }}
+            .details {{ background: #f9f9f9; padding: 15px; margin: 15px 0; }}
+            .footer {{ background: #f0f0f0; padding: 15px; text-align: center; margin-top: 20px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Booking Confirmation</h1>
+                <p>Hallulies Hotel & Restaurant/Bar</p>
+            </div>
+            <div class="content">
+                <h2>Hello {booking_data['guest_name']},</h2>
+                <p>Thank you for your booking at Hallulies Hotel & Restaurant/Bar. Your reservation has been confirmed.</p>
+
+                <div class="details">
+                    <h3>Booking Details:</h3>
+                    <p><strong>Check-in:</strong> {booking_data['checkin_date']}</p>
+                    <p><strong>Check-out:</strong> {booking_data['checkout_date']}</p>
+                    <p><strong>Room Type:</strong> {booking_data['room_type']}</p>
+                    <p><strong>Guests:</strong> {booking_data['adults']} Adults, {booking_data['children']} Children</p>
+                    <p><strong>Email:</strong> {booking_data['email']}</p>
+                    <p><strong>Phone:</strong> {booking_data['phone']}</p>
+                    {f'<p><strong>Special Requests:</strong> {booking_data["special_requests"]}</p>' if booking_data.get('special_requests') else ''}
+                </div>
+
+                <p>If you have any questions or need to make changes to your reservation, please contact us at <a href="mailto:hallulies6@gmail.com">hallulies6@gmail.com</a> or call 0247533518.</p>
+
+                <p>We look forward to welcoming you!</p>
+
+                <p>Best regards,<br>The Hallulies Team</p>
+            </div>
+            <div class="footer">
+                <p>Hallulies Hotel & Restaurant/Bar<br>Asufufu-Sunyani, Ghana</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def per_message(func, number):
+    """Best of five runs, in microseconds per call"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=5000)
+    args = parser.parse_args()
+
+    templates.preload()
+    rows = [('booking', 'f-string', f'{per_message(lambda: fstring_booking(BOOKING), args.number):.1f}',
+             len(fstring_booking(BOOKING)))]
+    for label, name, context in (('booking', 'booking_confirmation.html', BOOKING),
+                                 ('testimonial', 'testimonial_notification.html', TESTIMONIAL),
+                                 ('contact', 'contact_message.html', CONTACT)):
+        uncached = per_message(lambda: templates.Template(name).render(**context), max(args.number // 20, 1))
+        compiled = per_message(lambda: templates.render(name, **context), args.number)
+        size = len(templates.render(name, **context))
+        rows.append((label, 'parse per call', f'{uncached:.1f}', size))
+        rows.append((label, 'compiled', f'{compiled:.1f}', size))
+
+    print_table(f'Email body render cost, best of 5 x {args.number}',
+                ('email', 'rendering', 'us/message', 'bytes'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+On-demand image resizing: cold bursts, single flight and cache hits
+
+For each image, N clients request the same /img/{width}/{path} variant at
+once while nothing is cached (every one of them would start a resize
+without single flight), then the same variant again from the cache. The
+server's renders / coalesced counters (GET /api/admin/stats) show how many
+resizes actually ran.
+
+Usage: python benchmarks/bench_image_resize.py [api-server.py] [--clients N] [--width W]
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+from _common import fetch, print_table, run_load, server_process
+
+IMAGES = [
+    'images/room2.jpeg',
+    'images/rooms1.jpeg',
+    'images/HALLULIES FLYER copy.jpg',
+    'images/hallulies-airbng-restaurant-bar-logo-elegant-sanss__3065.png',
+]
+
+ACCEPT = {'Accept': 'image/avif,image/webp,image/*,*/*;q=0.8'}
+
+
+def admin_stats(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    _, _, body = fetch(conn, 'POST', '/api/auth/login',
+                       json.dumps({'email': 'admin@hallulies.com', 'password': 'admin123'}),
+                       {'Content-Type': 'application/json'})
+    token = json.loads(body)['token']
+    _, _, body = fetch(conn, 'GET', '/api/admin/stats', headers={'Authorization': f'Bearer {token}'})
+    conn.close()
+    return json.loads(body)['image_resizer']
+
+
+def burst(port, path, clients):
+    """Time until all of clients identical concurrent requests are answered"""
+    results = []
+    barrier = threading.Barrier(clients + 1)
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        barrier.wait()
+        status, headers, body = fetch(conn, 'GET', path, headers=ACCEPT)
+        results.append((status, headers.get('Content-Type'), len(body)))
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--width', type=int, default=640)
+    args = parser.parse_args()
+
+    # A cache directory inside the scratch dir, not the project's images/derived/
+    env = {'HTTP_KEEPALIVE': 'true', 'IMAGE_CACHE_DIR': 'image-cache'}
+    rows = []
+    with server_process(args.script, env) as (port, _):
+        for name in IMAGES:
+            path = f'/img/{args.width}/{urllib.parse.quote(name)}'
+            before = admin_stats(port)
+            elapsed, results = burst(port, path, args.clients)
+            after = admin_stats(port)
+            statuses = {status for status, _, _ in results}
+            _, content_type, size = results[0]
+            warm = run_load(port, [path], args.clients, 20, headers=ACCEPT)
+            rows.append((name.split('/')[-1][:28], content_type, f'{size / 1024:.0f}',
+                         f'{elapsed * 1000:.0f}', after['renders'] - before['renders'],
+                         after['coalesced'] - before['coalesced'], ','.join(map(str, sorted(statuses))),
+                         f"{warm['rps']:.0f}", f"{warm['p50_ms']:.1f}"))
+        disk = admin_stats(port)['disk_cache']
+
+    print_table(f'{args.script}: {args.clients} identical requests per image at {args.width}w',
+                ('image', 'type', 'KB', 'burst ms', 'renders', 'coalesced', 'status', 'cached req/s', 'p50 ms'),
+                rows)
+    print(f"\ndisk cache: {disk['files']} files, {disk['size'] / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
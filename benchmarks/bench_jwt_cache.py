@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Bearer token verification: jwt.decode() per request vs. the verified-token cache
+
+First times verification alone (microseconds per token): jwt.decode(), a
+TokenVerifier hit, and a TokenVerifier without a cache (JWT_CACHE_SIZE=0).
+Then drives an authenticated admin endpoint (GET /api/users/profile) of
+api-server.py with the same token from every client, with and without
+the cache, and reports throughput and the verifier's hit ratio.
+
+Usage: python benchmarks/bench_jwt_cache.py [api-server.py] [--number N] [--requests N]
+"""
+
+import argparse
+import http.client
+import json
+import time
+import timeit
+
+import jwt
+
+from _common import fetch, print_table, run_load, server_process
+
+from hallulies.tokens import TokenVerifier
+
+SECRET_KEY = 'bench-secret'
+
+
+def admin_token():
+    return jwt.encode({
+        'user_id': 1,
+        'username': 'admin',
+        'email': 'admin@hallulies.com',
+        'role': 'admin',
+        'exp': int(time.time()) + 3600,
+    }, SECRET_KEY, algorithm='HS256')
+
+
+def per_token(func, number):
+    """Best of five runs, in microseconds per call"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='per client')
+    args = parser.parse_args()
+
+    token = admin_token()
+    cached = TokenVerifier(SECRET_KEY)
+    uncached = TokenVerifier(SECRET_KEY, max_entries=0)
+    cached.decode(token)
+    print_table(f'Verifying one HS256 token, best of 5 x {args.number}', ('verification', 'us/token'), [
+        ('jwt.decode()', f"{per_token(lambda: jwt.decode(token, SECRET_KEY, algorithms=['HS256']), args.number):.2f}"),
+        ('TokenVerifier, no cache', f'{per_token(lambda: uncached.decode(token), args.number):.2f}'),
+        ('TokenVerifier, cached', f'{per_token(lambda: cached.decode(token), args.number):.2f}'),
+    ])
+
+    rows = []
+    headers = {'Authorization': f'Bearer {token}'}
+    for label, size in (('jwt.decode() per request', '0'), ('verified-token cache', '1024')):
+        env = {'SECRET_KEY': SECRET_KEY, 'JWT_CACHE_SIZE': size, 'HTTP_KEEPALIVE': 'true'}
+        with server_process(args.script, env) as (port, _):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            status = fetch(conn, 'GET', '/api/users/profile', headers=headers)[0]
+            if status != 200:
+                raise SystemExit(f'GET /api/users/profile answered {status}, not 200')
+            result = run_load(port, ['/api/users/profile'], args.clients, args.requests, headers=headers)
+            ratio = json.loads(fetch(conn, 'GET', '/api/admin/stats', headers=headers)[2])['auth_tokens']['hit_ratio']
+            conn.close()
+        rows.append((label, result['requests'], f"{result['rps']:.0f}", f"{result['p50_ms']:.2f}",
+                     f"{result['p99_ms']:.2f}", f'{ratio:.3f}', result['errors']))
+
+    print_table(f'{args.script}: GET /api/users/profile, {args.clients} clients x {args.requests}',
+                ('mode', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'hit ratio', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
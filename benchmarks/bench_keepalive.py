@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Page-load latency for index.html with and without HTTP/1.1 keep-alive
+
+Emulates a browser: fetch index.html, then every local stylesheet, script
+and image it references over a small pool of connections (6 by default,
+like most browsers). Without keep-alive each asset pays for a new TCP
+connection.
+
+Usage: python benchmarks/bench_keepalive.py [server.py] [--loads N] [--connections N]
+"""
+
+import argparse
+import http.client
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+
+from _common import ROOT, fetch, print_table, running_server, summarize
+
+ASSET_PATTERN = re.compile(r'(?:src|href)="([^"#:?]+\.(?:css|js|jpe?g|png|webp|gif|svg))"', re.I)
+
+
+def page_assets():
+    with open(os.path.join(ROOT, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    assets = []
+    for ref in ASSET_PATTERN.findall(html):
+        path = '/' + urllib.parse.quote(ref.lstrip('/'))
+        if path not in assets:
+            assets.append(path)
+    return assets
+
+
+def load_page(port, assets, connections, keepalive, latencies):
+    """Fetch index.html plus its assets; returns wall-clock seconds"""
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    t0 = time.perf_counter()
+    fetch(conn, 'GET', '/index.html')
+    latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+    pending = queue.Queue()
+    for asset in assets:
+        pending.put(asset)
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while True:
+            try:
+                path = pending.get_nowait()
+            except queue.Empty:
+                break
+            t0 = time.perf_counter()
+            fetch(conn, 'GET', path)
+            latencies.append(time.perf_counter() - t0)
+            if not keepalive:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='server.py')
+    parser.add_argument('--loads', type=int, default=20, help='page loads per mode')
+    parser.add_argument('--connections', type=int, default=6, help='parallel connections per page load')
+    args = parser.parse_args()
+
+    assets = page_assets()
+    rows = []
+    for keepalive in (False, True):
+        env = {'HTTP_KEEPALIVE': 'true' if keepalive else 'false'}
+        with running_server(args.script, env) as port:
+            load_page(port, assets, args.connections, keepalive, [])  # warm up
+            latencies = []
+            page_times = [load_page(port, assets, args.connections, keepalive, latencies)
+                          for _ in range(args.loads)]
+        result = summarize(latencies, sum(page_times))
+        rows.append((
+            'on' if keepalive else 'off', len(assets) + 1,
+            f'{sum(page_times) / len(page_times) * 1000:.1f}',
+            f"{result['mean_ms']:.2f}", f"{result['p95_ms']:.2f}",
+        ))
+
+    print_table(f'{args.script}: index.html page load ({args.connections} connections)',
+                ('keep-alive', 'requests/page', 'page ms', 'request mean ms', 'request p95 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
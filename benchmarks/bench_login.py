@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Login throughput under concurrency, and what it does to everyone else
+
+--login-clients clients log in as the sample admin (a real bcrypt check at
+BCRYPT_ROUNDS) while --menu-clients clients read GET /api/menu, on
+api-server.py with:
+
+  unbounded        PASSWORD_HASH_WORKERS = WORKER_THREADS: every login
+                   hashes at once, as if bcrypt ran in the request thread
+  bounded          the default pool (2 hashing threads, 16 waiting)
+  bounded, queue 2 logins beyond 2 running + 2 waiting get a 503
+
+Reports successful logins per second, login latency (503s included), the
+503s, and the latency of the menu requests running alongside.
+
+Usage: python benchmarks/bench_login.py [api-server.py] [--logins N] [--rounds N]
+"""
+
+import argparse
+import http.client
+import json
+import threading
+
+from _common import fetch, print_table, run_load, server_process
+
+LOGIN = json.dumps({'email': 'admin@hallulies.com', 'password': 'admin123'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--login-clients', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=5, help='per client')
+    parser.add_argument('--menu-clients', type=int, default=2)
+    parser.add_argument('--menu-requests', type=int, default=200, help='per client')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_ROUNDS')
+    args = parser.parse_args()
+
+    modes = [
+        ('unbounded', {'PASSWORD_HASH_WORKERS': '16', 'PASSWORD_HASH_QUEUE': '64'}),
+        ('bounded', {}),
+        ('bounded, queue 2', {'PASSWORD_HASH_QUEUE': '2'}),
+    ]
+    rows = []
+    for label, extra in modes:
+        env = dict({'BCRYPT_ROUNDS': str(args.rounds), 'WORKER_THREADS': '16', 'HTTP_KEEPALIVE': 'true'}, **extra)
+        with server_process(args.script, env) as (port, _):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            status = fetch(conn, 'POST', '/api/auth/login', LOGIN, {'Content-Type': 'application/json'})[0]
+            conn.close()
+            if status != 200:
+                raise SystemExit(f'Admin login answered {status}, not 200')
+            results = {}
+
+            def menu():
+                results['menu'] = run_load(port, ['/api/menu'], args.menu_clients, args.menu_requests)
+
+            reader = threading.Thread(target=menu)
+            reader.start()
+            logins = run_load(port, ['/api/auth/login'], args.login_clients, args.logins, method='POST',
+                              body=LOGIN, headers={'Content-Type': 'application/json'})
+            reader.join()
+        menu_result = results['menu']
+        succeeded = logins['requests'] - logins['errors']
+        rows.append((label, succeeded, logins['errors'], f"{succeeded / logins['elapsed']:.1f}",
+                     f"{logins['p50_ms']:.0f}", f"{logins['p99_ms']:.0f}",
+                     f"{menu_result['p50_ms']:.1f}", f"{menu_result['p99_ms']:.1f}"))
+
+    print_table(f'{args.script}: {args.login_clients} clients x {args.logins} logins at cost {args.rounds}, '
+                f'{args.menu_clients} clients reading /api/menu',
+                ('mode', 'logins', '503s', 'logins/s', 'login p50 ms', 'login p99 ms', 'menu p50 ms', 'menu p99 ms'),
+                rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Seeking in a large file: Range requests vs. whole downloads
+
+Simulates a PDF viewer jumping to N pages of images/banner portrait
+annex.pdf: each jump either fetches one 64 KB Range (206) or, as before
+Range support, downloads the whole file again.
+
+Usage: python benchmarks/bench_ranges.py [server.py] [--seeks N]
+"""
+
+import argparse
+import http.client
+import os
+import random
+import time
+import urllib.parse
+
+from _common import ROOT, fetch, print_table, running_server
+
+FILE = 'images/banner portrait annex.pdf'
+CHUNK = 64 * 1024
+
+
+def seek_all(port, path, offsets, ranged):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    received = 0
+    started = time.perf_counter()
+    for offset in offsets:
+        headers = {'Range': f'bytes={offset}-{offset + CHUNK - 1}'} if ranged else {}
+        status, _, body = fetch(conn, 'GET', path, headers=headers)
+        assert status == (206 if ranged else 200), status
+        received += len(body)
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return elapsed, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='server.py')
+    parser.add_argument('--seeks', type=int, default=50)
+    args = parser.parse_args()
+
+    size = os.path.getsize(os.path.join(ROOT, FILE))
+    offsets = [random.randrange(0, size - CHUNK) for _ in range(args.seeks)]
+    path = '/' + urllib.parse.quote(FILE)
+    rows = []
+    with running_server(args.script, {'HTTP_KEEPALIVE': 'true'}) as port:
+        for label, ranged in (('full downloads', False), ('Range requests', True)):
+            elapsed, received = seek_all(port, path, offsets, ranged)
+            rows.append((label, f'{received / 1024 / 1024:.1f}', f'{elapsed / args.seeks * 1000:.2f}'))
+
+    print_table(f'{args.script}: {args.seeks} seeks in a {size / 1024 / 1024:.1f} MB PDF',
+                ('mode', 'MB received', 'ms per seek'), rows)
+
+
+if __name__ == '__main__':
+    main()
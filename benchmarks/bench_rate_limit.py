@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Per-client rate limiting of the write endpoints
+
+First the limiter itself: microseconds per check against one busy client
+and against --clients distinct ones, and how many buckets are left after
+that many one-off clients (idle buckets are swept, so it stays bounded).
+
+Then a bot floods POST /api/bookings from one address while a guest books
+from another (told apart with X-Forwarded-For and
+RATE_LIMIT_TRUST_FORWARDED=true), with RATE_LIMIT=false and with the
+default limits. Reports how many of each got through, the 429s, and the
+guest's latency.
+
+Usage: python benchmarks/bench_rate_limit.py [enhanced-api-server.py] [--bot-requests N]
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+import timeit
+from collections import Counter
+
+from _common import fetch, print_table, server_process
+
+from hallulies.ratelimit import KeyedRateLimiter
+
+BOOKING = json.dumps({
+    'guest_name': 'Bench Guest',
+    'email': 'guest@example.com',
+    'phone': '+233000000000',
+    'checkin_date': '2025-06-01',
+    'checkout_date': '2025-06-03',
+    'room_type': 'Deluxe Room',
+    'adults': 2,
+})
+
+
+def per_check(func, number):
+    """Best of five runs, in microseconds per call"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def limiter_rows(clients):
+    busy = KeyedRateLimiter(1000.0, 10)
+    one_key = per_check(lambda: busy.try_acquire('10.0.0.1'), 50000)
+
+    # Each address is seen once; a bucket is full again (and swept) after burst / rate = 10 ms
+    churn = KeyedRateLimiter(1000.0, 10, max_keys=clients)
+    addresses = iter(range(10 ** 9))
+    started = time.perf_counter()
+    for _ in range(clients):
+        churn.try_acquire(next(addresses))
+    many_keys = (time.perf_counter() - started) / clients * 1e6
+    stats = churn.stats()
+    return [
+        ('one client', f'{one_key:.2f}', busy.stats()['clients'], 0),
+        (f'{clients} one-off clients', f'{many_keys:.2f}', stats['clients'], stats['swept']),
+    ]
+
+
+def post(port, address, count, statuses, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/json', 'X-Forwarded-For': address}
+    for _ in range(count):
+        started = time.perf_counter()
+        status = fetch(conn, 'POST', '/api/bookings', BOOKING, headers)[0]
+        latencies.append(time.perf_counter() - started)
+        statuses[status] += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='enhanced-api-server.py')
+    parser.add_argument('--clients', type=int, default=100000)
+    parser.add_argument('--bot-requests', type=int, default=1000)
+    parser.add_argument('--guest-requests', type=int, default=5)
+    args = parser.parse_args()
+
+    print_table('KeyedRateLimiter.try_acquire()', ('keys', 'us/check', 'buckets kept', 'swept'),
+                limiter_rows(args.clients))
+
+    rows = []
+    for label, enabled in (('no limit', 'false'), ('rate limited', 'true')):
+        env = {'RATE_LIMIT': enabled, 'RATE_LIMIT_TRUST_FORWARDED': 'true', 'HTTP_KEEPALIVE': 'true'}
+        with server_process(args.script, env) as (port, _):
+            bot, guest = Counter(), Counter()
+            bot_latencies, guest_latencies = [], []
+            flood = threading.Thread(target=post, args=(port, '203.0.113.7', args.bot_requests, bot, bot_latencies))
+            started = time.perf_counter()
+            flood.start()
+            for _ in range(args.guest_requests):
+                post(port, '198.51.100.20', 1, guest, guest_latencies)
+                time.sleep(0.05)
+            flood.join()
+            elapsed = time.perf_counter() - started
+        guest_latencies.sort()
+        rows.append((label, bot[201], bot[429], guest[201], guest[429], f'{bot[201] / elapsed:.0f}',
+                     f'{guest_latencies[len(guest_latencies) // 2] * 1000:.1f}'))
+
+    print_table(f'{args.script}: bot sends {args.bot_requests} bookings, guest {args.guest_requests}',
+                ('mode', 'bot 201', 'bot 429', 'guest 201', 'guest 429', 'bot writes/s', 'guest p50 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Throughput of the read-mostly endpoints with the response cache on and off
+
+Seeds a realistic menu and testimonial wall, then drives GET /api/menu,
+/api/menu/category/{category} and /api/testimonials with RESPONSE_CACHE
+false vs. true.
+
+Usage: python benchmarks/bench_response_cache.py [--clients N] [--requests N]
+"""
+
+import argparse
+import os
+import sqlite3
+
+from _common import print_table, run_load, running_server
+from hallulies import migrations
+
+PATHS = ['/api/menu', '/api/menu/category/mains', '/api/menu/category/appetizers', '/api/testimonials']
+
+
+def seed(workdir):
+    conn = sqlite3.connect(os.path.join(workdir, 'hallulies.db'))
+    migrations.migrate(conn, verbose=False)
+    conn.executemany(
+        "INSERT INTO menu_items (name, description, category, price, ingredients, tags) "
+        "VALUES (?, 'House special', ?, 40, 'Seasonal produce', 'chef')",
+        ((f'Dish {i}', ('appetizers', 'mains', 'desserts', 'drinks')[i % 4]) for i in range(60)))
+    conn.executemany(
+        "INSERT INTO testimonials (name, location, title, content, rating, status) "
+        "VALUES (?, 'Accra', 'Great stay', 'Lovely rooms and very friendly staff.', 5, 'approved')",
+        ((f'Guest {i}',) for i in range(40)))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per client')
+    args = parser.parse_args()
+
+    rows = []
+    for enabled in (False, True):
+        env = {'RESPONSE_CACHE': str(enabled).lower(), 'HTTP_KEEPALIVE': 'true'}
+        with running_server('api-server.py', env, setup=seed) as port:
+            run_load(port, PATHS, args.clients, 20)  # warm up
+            result = run_load(port, PATHS, args.clients, args.requests)
+        rows.append(('on' if enabled else 'off', f"{result['rps']:.0f}", f"{result['p50_ms']:.2f}",
+                     f"{result['p95_ms']:.2f}", result['errors']))
+
+    print_table(f'api-server.py read endpoints, {args.clients} clients',
+                ('cache', 'req/s', 'p50 ms', 'p95 ms', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Dispatch cost of the compiled Router vs. an if/elif chain as routes grow
+
+The if/elif baseline mirrors the old do_GET: compare self.path against
+literals and startswith() prefixes one after another, pulling ids out with
+split('/')[-1]. Half of the synthetic routes are static, half take an id.
+
+Usage: python benchmarks/bench_router.py [--iterations N]
+"""
+
+import argparse
+import timeit
+
+from _common import print_table
+from hallulies.router import Router
+
+ROUTE_COUNTS = [10, 20, 50, 100, 200, 500]
+
+
+def build(count):
+    routes = []
+    chain = []
+    for i in range(count // 2):
+        routes.append(('GET', f'/api/resource{i}', f'list_{i}'))
+        routes.append(('GET', f'/api/resource{i}/{{item_id:int}}', f'get_{i}'))
+        chain.append((f'/api/resource{i}', f'list_{i}', False))
+        chain.append((f'/api/resource{i}/', f'get_{i}', True))
+    return Router(routes), chain
+
+
+def if_elif_dispatch(chain, path):
+    for literal, handler, is_prefix in chain:
+        if is_prefix:
+            if path.startswith(literal):
+                return handler, {'item_id': path.split('/')[-1]}
+        elif path == literal:
+            return handler, {}
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = []
+    for count in ROUTE_COUNTS:
+        router, chain = build(count)
+        last = count // 2 - 1
+        # A mix of early, middle and late routes, static and parameterized
+        paths = [
+            '/api/resource0', f'/api/resource{last // 2}/42', f'/api/resource{last}',
+            f'/api/resource{last}/7?fields=id', '/api/missing',
+        ]
+
+        def run_router():
+            for path in paths:
+                router.resolve('GET', path)
+
+        def run_chain():
+            for path in paths:
+                if_elif_dispatch(chain, path.partition('?')[0])
+
+        router_us = timeit.timeit(run_router, number=args.iterations) / (args.iterations * len(paths)) * 1e6
+        chain_us = timeit.timeit(run_chain, number=args.iterations) / (args.iterations * len(paths)) * 1e6
+        rows.append((count, f'{chain_us:.2f}', f'{router_us:.2f}', f'{chain_us / router_us:.1f}x'))
+
+    print_table('Dispatch cost per request (microseconds)',
+                ('routes', 'if/elif', 'Router', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
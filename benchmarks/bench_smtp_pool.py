@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+SMTP throughput: a connection per message vs. pooled sessions and batches
+
+Sends --messages emails from --workers threads (like the outbox workers)
+through hallulies.mail.Mailer to a local stand-in SMTP server that waits
+--smtp-delay seconds before every reply:
+
+  per message   connect, login, send, quit for every email (the old send_email)
+  pooled        authenticated sessions reused across send() calls
+  batched       send_many() of --batch messages per session checkout
+  dropped       batched, but the server hangs up after every 7 messages
+  rate limited  batched, held to --rate messages per minute
+
+Usage: python benchmarks/bench_smtp_pool.py [--messages N] [--workers N] [--batch N]
+"""
+
+import argparse
+import os
+import threading
+import time
+
+# Unlimited unless a mode sets its own bucket; read when hallulies.mail is imported
+os.environ['EMAIL_RATE_LIMIT'] = '0'
+
+from _common import print_table
+from _smtp import SMTPStub
+
+from hallulies.mail import Mailer
+from hallulies.ratelimit import TokenBucket
+
+
+def run(mailer, messages, workers, batch):
+    """Send messages from workers threads; returns (seconds, failures)"""
+    chunks = [messages[i:i + batch] for i in range(0, len(messages), batch)]
+    failures = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not chunks:
+                    return
+                chunk = chunks.pop()
+            if batch == 1:
+                errors = []
+                for message in chunk:
+                    try:
+                        mailer.send(*message)
+                        errors.append(None)
+                    except Exception as e:
+                        errors.append(e)
+            else:
+                errors = mailer.send_many(chunk)
+            with lock:
+                failures[0] += sum(error is not None for error in errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=20)
+    parser.add_argument('--smtp-delay', type=float, default=0.02)
+    parser.add_argument('--rate', type=float, default=600)
+    args = parser.parse_args()
+
+    body = '<html><body>' + '<p>Booking details</p>' * 50 + '</body></html>'
+    messages = [(f'guest{i}@example.com', f'Booking Confirmation #{i}', body) for i in range(args.messages)]
+    modes = [
+        ('per message', {'pool_size': 0}, 1, 0, None),
+        ('pooled', {}, 1, 0, None),
+        ('batched', {}, args.batch, 0, None),
+        ('dropped', {}, args.batch, 7, None),
+        (f'rate limited ({args.rate:.0f}/min)', {}, args.batch, 0, args.rate),
+    ]
+
+    rows = []
+    for label, options, batch, drop_after, rate in modes:
+        with SMTPStub(delay=args.smtp_delay, drop_after=drop_after) as smtp:
+            mailer = Mailer('127.0.0.1', smtp.port, 'bench@example.com', 'bench', use_tls=False,
+                            pool_size=options.get('pool_size', args.workers))
+            if rate:
+                mailer.rate = TokenBucket(rate / 60, 10)
+            elapsed, failures = run(mailer, messages, args.workers, batch)
+            mailer.close()
+            stats = mailer.stats()
+            rows.append((label, f'{args.messages / elapsed:.1f}', f'{elapsed:.1f}', smtp.connections,
+                         stats['reconnects'], len(smtp.messages), failures))
+
+    print_table(f'{args.messages} messages, {args.workers} workers, SMTP reply delay {args.smtp_delay * 1000:.0f} ms',
+                ('mode', 'msgs/s', 'seconds', 'connections', 'reconnects', 'delivered', 'failed'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Mixed readers and writers on hallulies.db: rollback journal vs. WAL
+
+Reader threads run the GET /api/menu query and a bookings count while
+writer threads insert bookings and commit, for a fixed duration. The
+"default" row uses SQLite's stock settings (DELETE journal, synchronous
+FULL, no mmap); "tuned" uses the SQLITE_* values the servers start with.
+
+Usage: python benchmarks/bench_sqlite_wal.py [--readers N] [--writers N] [--seconds S]
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from _common import ROOT, print_table, scratch_dir, summarize
+from bench_db_pool import load_api_server
+from hallulies import db
+from hallulies.db import ConnectionManager
+
+PROFILES = [
+    ('default', dict(journal_mode='DELETE', synchronous='FULL', mmap_size=0, cache_size=-2000)),
+    ('tuned', dict()),
+]
+
+
+def run(manager, readers, writers, seconds):
+    stop = threading.Event()
+    read_latencies, write_latencies = [], []
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                conn = manager.connect()
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM menu_items WHERE is_active = 1 ORDER BY category, name')
+                cursor.fetchall()
+                cursor.execute('SELECT COUNT(*) FROM bookings')
+                cursor.fetchone()
+                conn.close()
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+                continue
+            read_latencies.append(time.perf_counter() - t0)
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                conn = manager.connect()
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO bookings (guest_name, email, checkin_date, checkout_date, room_type) "
+                    "VALUES (?, ?, '2025-01-01', '2025-01-03', 'deluxe')",
+                    (f'Guest {i}', f'guest{i}@example.com'))
+                conn.commit()
+                conn.close()
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+                continue
+            write_latencies.append(time.perf_counter() - t0)
+
+    threads = ([threading.Thread(target=reader) for _ in range(readers)] +
+               [threading.Thread(target=writer) for _ in range(writers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return summarize(read_latencies, seconds), summarize(write_latencies, seconds), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    api_server = load_api_server()
+    rows = []
+    for name, settings in PROFILES:
+        with scratch_dir() as workdir:
+            os.chdir(workdir)
+            api_server.init_database()
+            db.close_all()
+            manager = ConnectionManager('hallulies.db', **settings)
+            reads, writes, errors = run(manager, args.readers, args.writers, args.seconds)
+            mode = manager.stats()['journal_mode']
+            manager.close_all()
+            os.chdir(ROOT)
+        rows.append((name, mode, f"{reads['rps']:.0f}", f"{reads['p95_ms']:.2f}",
+                     f"{writes['rps']:.0f}", f"{writes['p95_ms']:.2f}", errors))
+
+    print_table(f'{args.readers} readers / {args.writers} writers for {args.seconds:g}s',
+                ('profile', 'journal', 'reads/s', 'read p95 ms', 'writes/s', 'write p95 ms', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Static files: plain copy vs. sendfile() and the hot-file cache
+
+Serves what a page visit pulls in, small files (HTML, CSS, JS, small
+images) and large ones (room and venue JPEGs, the flyer), under three
+configurations and reports throughput, latency and the server CPU time
+spent per request:
+
+  copy       STATIC_SENDFILE=false STATIC_CACHE_MAX_BYTES=0 (shutil.copyfileobj)
+  sendfile   STATIC_CACHE_MAX_BYTES=0
+  default    hot files from memory, large ones with sendfile()
+
+Usage: python benchmarks/bench_static.py [server.py] [--clients N] [--requests N]
+"""
+
+import argparse
+import os
+import urllib.parse
+
+from _common import ROOT, print_table, run_load, server_process
+
+SMALL_FILES = [
+    'index.html',
+    'styles.css',
+    'script.js',
+    'components/search-system.js',
+    'images/signboardTheBuilding.jpeg',
+    'images/happy-kids-studying-and-learning-vector.webp',
+]
+
+LARGE_FILES = [
+    'images/room2.jpeg',
+    'images/rooms1.jpeg',
+    'images/room3.jpeg',
+    'images/sittingPlace1.jpeg',
+    'images/HALLULIES FLYER copy.jpg',
+]
+
+MODES = [
+    ('copy', {'STATIC_SENDFILE': 'false', 'STATIC_CACHE_MAX_BYTES': '0'}),
+    ('sendfile', {'STATIC_CACHE_MAX_BYTES': '0'}),
+    ('default', {}),
+]
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='server.py')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    env = {'HTTP_KEEPALIVE': 'true'}
+    for group, files in (('small', SMALL_FILES), ('large', LARGE_FILES)):
+        paths = ['/' + urllib.parse.quote(name) for name in files]
+        mean_size = sum(os.path.getsize(os.path.join(ROOT, name)) for name in files) / len(files)
+        rows = []
+        for label, extra in MODES:
+            with server_process(args.script, dict(env, **extra)) as (port, proc):
+                run_load(port, paths, 1, len(paths))
+                cpu_before = cpu_seconds(proc.pid)
+                result = run_load(port, paths, args.clients, args.requests // args.clients)
+                cpu = cpu_seconds(proc.pid) - cpu_before
+            rows.append((label, f"{result['rps']:.0f}", f"{result['rps'] * mean_size / 1024 / 1024:.0f}",
+                         f"{result['p50_ms']:.1f}", f"{result['p99_ms']:.1f}",
+                         f"{cpu / result['requests'] * 1e6:.0f}", result['errors']))
+
+        print_table(f'{args.script}: {len(files)} {group} files (mean {mean_size / 1024:.0f} KB), '
+                    f'{args.clients} keep-alive clients',
+                    ('mode', 'req/s', 'MB/s', 'p50 ms', 'p99 ms', 'CPU us/req', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
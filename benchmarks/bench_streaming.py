@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Buffered vs. streamed JSON for a large GET /api/testimonials
+
+Seeds the scratch database with approved testimonials, then compares
+JSON_STREAMING=false (build the whole list and one json.dumps) with the
+default streaming path: time to first byte, total time and how much the
+server's peak RSS grew while answering.
+
+Usage: python benchmarks/bench_streaming.py [api-server.py] [--rows N] [--requests N]
+"""
+
+import argparse
+import http.client
+import os
+import sqlite3
+import time
+
+from _common import peak_rss_mb, print_table, server_process
+from hallulies import migrations
+
+CONTENT = 'Wonderful stay, the staff went out of their way to help us. ' * 6
+
+
+def seed(rows):
+    def setup(workdir):
+        conn = sqlite3.connect(os.path.join(workdir, 'hallulies.db'))
+        migrations.migrate(conn, verbose=False)
+        conn.executemany(
+            "INSERT INTO testimonials (name, location, title, content, rating, status) "
+            "VALUES (?, 'Accra', 'Great stay', ?, 5, 'approved')",
+            ((f'Guest {i}', CONTENT) for i in range(rows)))
+        conn.commit()
+        conn.close()
+    return setup
+
+
+def timed_get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    started = time.perf_counter()
+    conn.request('GET', path)
+    response = conn.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - started
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - started
+    conn.close()
+    return ttfb, total, size, response.getheader('Transfer-Encoding') or 'identity'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('script', nargs='?', default='api-server.py')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for streaming in (False, True):
+        for keepalive in (False, True):
+            env = {'JSON_STREAMING': str(streaming).lower(), 'HTTP_KEEPALIVE': str(keepalive).lower(),
+                   # Touched mmap pages and a fresh page cache per worker thread
+                   # count towards RSS; keep them out of the comparison
+                   'SQLITE_MMAP_SIZE': '0', 'WORKER_THREADS': '1'}
+            with server_process(args.script, env, setup=seed(args.rows)) as (port, proc):
+                timed_get(port, '/api/menu')  # warm up
+                baseline = peak_rss_mb(proc.pid)
+                results = [timed_get(port, '/api/testimonials') for _ in range(args.requests)]
+                growth = peak_rss_mb(proc.pid) - baseline
+            ttfb = min(result[0] for result in results)
+            total = min(result[1] for result in results)
+            rows.append(('streamed' if streaming else 'buffered', 'HTTP/1.1' if keepalive else 'HTTP/1.0',
+                         results[0][3], f'{results[0][2] / 1e6:.1f}', f'{ttfb * 1000:.1f}',
+                         f'{total * 1000:.1f}', f'{growth:.1f}'))
+
+    print_table(f'{args.script}: GET /api/testimonials with {args.rows} rows',
+                ('mode', 'protocol', 'encoding', 'MB', 'TTFB ms', 'total ms', 'peak RSS growth MB'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, minified and precompressed static assets
+
+    python build_assets.py            # writes dist/
+    STATIC_ROOT=dist python server.py
+
+Every local stylesheet and script referenced from the site's HTML pages is
+minified and written to dist/ under a content-hashed name
+(styles.css -> styles.3f2a1b4c5d.css), the pages are written to dist/ with
+their references rewritten, and dist/manifest.json maps original names to
+hashed ones. Each built file also gets .gz (and, with the brotli module,
+.br) siblings, so the server never compresses them at request time.
+
+Files that are not built (images, PDFs, config.js) keep being served from
+the project root; hashed names are served with an immutable Cache-Control
+(see hallulies/static.py).
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from hallulies.compression import COMPRESSION_MIN_SIZE, brotli
+from hallulies.static import MANIFEST_NAME
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Generated per request by server.py from environment variables
+EXCLUDE = {'config.js'}
+
+ASSET_REFERENCE = re.compile(r'''(?P<attr>\b(?:href|src)=)(?P<quote>["'])(?P<path>[^"'?#]+\.(?:css|js))(?P=quote)''')
+
+# After these characters a "/" starts a regular expression, not a division
+REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'delete', 'throw')
+
+# Spaces next to these can go without changing how the code is tokenized
+JS_TIGHT = set('{}()[];,:=<>!&|?*')
+CSS_TIGHT = set('{};,>')
+# Line breaks only after / before these, so no automatic semicolon is lost
+JS_BREAK_AFTER = set('{([,;=:')
+JS_BREAK_BEFORE = set(')]},;')
+
+
+def read_quoted(source, i):
+    """Index just past the string or regex literal that starts at source[i]"""
+    quote = source[i]
+    in_class = False
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote == '/' and char == '[':
+            in_class = True
+        elif quote == '/' and char == ']':
+            in_class = False
+        elif char == quote and not in_class:
+            return i + 1
+        elif char == '\n' and quote != '`':
+            break
+        i += 1
+    raise ValueError(f'Unterminated literal at offset {i}')
+
+
+def collapse(pieces, tight, break_after=(), break_before=()):
+    """Join code pieces, squeezing whitespace runs and dropping the needless ones.
+
+    A run containing a line break stays a line break unless the neighbouring
+    characters are in break_after / break_before.
+    """
+    out = []
+    pending = None
+    for kind, text in pieces:
+        if kind == 'space':
+            if pending != '\n':
+                pending = '\n' if '\n' in text else ' '
+            continue
+        if pending and out:
+            previous = out[-1][-1]
+            if pending == '\n' and previous not in break_after and text[0] not in break_before:
+                out.append('\n')
+            elif previous not in tight and text[0] not in tight:
+                out.append(' ')
+        pending = None
+        out.append(text)
+    return ''.join(out)
+
+
+def minify_js(source):
+    """Drop comments and redundant whitespace, keeping the line breaks automatic semicolons need"""
+    pieces = []
+    i = 0
+    # One entry per open "{": True if it opened a template literal's ${...}
+    braces = []
+    last = ''
+    while i < len(source):
+        char = source[i]
+        if char.isspace():
+            j = i
+            while j < len(source) and source[j].isspace():
+                j += 1
+            pieces.append(('space', source[i:j]))
+            i = j
+        elif source.startswith('//', i):
+            j = source.find('\n', i)
+            i = len(source) if j == -1 else j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            if j == -1:
+                raise ValueError(f'Unterminated comment at offset {i}')
+            pieces.append(('space', '\n' if '\n' in source[i:j] else ' '))
+            i = j + 2
+        elif char in '\'"' or (char == '/' and (not last or last in REGEX_PREFIX or last in REGEX_KEYWORDS)):
+            j = read_quoted(source, i)
+            pieces.append(('code', source[i:j]))
+            last, i = source[i:j], j
+        elif char == '`' or (char == '}' and braces and braces[-1]):
+            if char == '}':
+                braces.pop()
+            j = i + 1
+            while j < len(source):
+                if source[j] == '\\':
+                    j += 2
+                elif source[j] == '`':
+                    j += 1
+                    break
+                elif source.startswith('${', j):
+                    j += 2
+                    braces.append(True)
+                    break
+                else:
+                    j += 1
+            else:
+                raise ValueError(f'Unterminated template literal at offset {i}')
+            pieces.append(('code', source[i:j]))
+            last, i = source[i:j], j
+        else:
+            if char == '{':
+                braces.append(False)
+            elif char == '}' and braces:
+                braces.pop()
+            j = i + 1
+            if char.isalnum() or char in '_$':
+                while j < len(source) and (source[j].isalnum() or source[j] in '_$'):
+                    j += 1
+            pieces.append(('code', source[i:j]))
+            last, i = source[i:j], j
+    return collapse(pieces, JS_TIGHT, JS_BREAK_AFTER, JS_BREAK_BEFORE).strip() + '\n'
+
+
+def minify_css(source):
+    """Drop comments, redundant whitespace and the last semicolon of each block"""
+    pieces = []
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char.isspace():
+            j = i
+            while j < len(source) and source[j].isspace():
+                j += 1
+            pieces.append(('space', ' '))
+            i = j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            if j == -1:
+                raise ValueError(f'Unterminated comment at offset {i}')
+            pieces.append(('space', ' '))
+            i = j + 2
+        elif char in '\'"':
+            j = read_quoted(source, i)
+            pieces.append(('code', source[i:j]))
+            i = j
+        else:
+            pieces.append(('code', char))
+            i += 1
+    return outside_strings(collapse(pieces, CSS_TIGHT).strip(), tighten_css) + '\n'
+
+
+def tighten_css(css):
+    # "a: b" -> "a:b" is only safe inside declarations, never in selectors (":hover")
+    css = re.sub(r'([{;][-\w]+):\s+', r'\1:', css)
+    return css.replace(';}', '}')
+
+
+def outside_strings(source, transform):
+    """source with transform applied to the text between its quoted strings, never to the strings"""
+    out = []
+    start = i = 0
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+        elif source[i] in '\'"':
+            j = read_quoted(source, i)
+            out.extend((transform(source[start:i]), source[i:j]))
+            start = i = j
+        else:
+            i += 1
+    out.append(transform(source[start:]))
+    return ''.join(out)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def fingerprint(relative_path, content):
+    stem, ext = os.path.splitext(relative_path)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}'
+
+
+def write(out_dir, relative_path, content):
+    path = os.path.join(out_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    written = [relative_path]
+    if len(content) < COMPRESSION_MIN_SIZE:
+        return written
+    # Highest levels: this runs once per build, not once per request
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(relative_path + suffix)
+    return written
+
+
+def local_reference(page, reference):
+    """Project-relative path of an asset referenced from page, or None if it is not ours"""
+    if reference.startswith(('http:', 'https:', '//', 'data:')):
+        return None
+    base = ROOT if reference.startswith('/') else os.path.dirname(os.path.join(ROOT, page))
+    path = os.path.normpath(os.path.join(base, reference.lstrip('/')))
+    relative = os.path.relpath(path, ROOT).replace(os.sep, '/')
+    if relative.startswith('../') or relative in EXCLUDE or not os.path.isfile(path):
+        return None
+    return relative
+
+
+def build(out_dir, verbose=True):
+    """Build every HTML page in the project root and its assets into out_dir; returns the manifest"""
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    pages = sorted(name for name in os.listdir(ROOT) if name.endswith('.html'))
+    manifest = {}
+    sizes = []
+
+    def asset(relative):
+        if relative not in manifest:
+            with open(os.path.join(ROOT, relative), 'rb') as f:
+                original = f.read()
+            minified = MINIFIERS[os.path.splitext(relative)[1]](original.decode('utf-8')).encode('utf-8')
+            manifest[relative] = fingerprint(relative, minified)
+            write(out_dir, manifest[relative], minified)
+            sizes.append((relative, len(original), len(minified)))
+        return manifest[relative]
+
+    def rewrite(page, match):
+        relative = local_reference(page, match.group('path'))
+        if relative is None:
+            return match.group(0)
+        hashed = asset(relative)
+        reference = '/' + hashed if match.group('path').startswith('/') else os.path.relpath(
+            hashed, os.path.dirname(page) or '.').replace(os.sep, '/')
+        return f"{match.group('attr')}{match.group('quote')}{reference}{match.group('quote')}"
+
+    for page in pages:
+        with open(os.path.join(ROOT, page), encoding='utf-8') as f:
+            html = f.read()
+        html = ASSET_REFERENCE.sub(lambda match: rewrite(page, match), html)
+        write(out_dir, page, html.encode('utf-8'))
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    if verbose:
+        for relative, original, minified in sizes:
+            print(f"📦 {relative} -> {manifest[relative]} ({original} -> {minified} bytes)")
+        print(f"✅ Built {len(pages)} pages and {len(manifest)} assets into {out_dir}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, minified and precompressed static assets')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'dist'), help='output directory (default: dist/)')
+    args = parser.parse_args()
+    build(os.path.abspath(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,61 @@
-from PIL import Image, ImageDraw, ImageFont
+#!/usr/bin/env python3
+"""
+Responsive image derivatives for everything under images/
+
+    python generate_placeholders.py                 # derive new and changed images
+    python generate_placeholders.py --force         # derive everything again
+    python generate_placeholders.py --placeholders  # also create missing placeholder images
+
+Each source image is resized to IMAGE_WIDTHS and written as IMAGE_FORMATS
+(AVIF and WebP where Pillow supports them) plus its own format into
+images/derived/, one source per worker process. images/derived/manifest.json
+records the srcset of every source (see hallulies/images.py); sources whose
+content hash and settings are unchanged since the last run are skipped.
+"""
+
+import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from hallulies import images
+from hallulies.images import Image
+
+if Image is not None:
+    from PIL import ImageDraw, ImageFont
 
-# Create images directory if it doesn't exist
-os.makedirs('images', exist_ok=True)
 
 def create_placeholder_image(width, height, filename, text=None):
     # Create a new image with a background color
     img = Image.new('RGB', (width, height), color=(73, 109, 137))
-    
+
     # Create a draw object
     d = ImageDraw.Draw(img)
-    
+
     # Add text if provided
     if text:
         # Try to use default font, fallback to basic if not available
         try:
             font = ImageFont.truetype("arial.ttf", 36)
-        except:
+        except OSError:
             font = ImageFont.load_default()
-        
+
         # Calculate text position to center it
         text_width = d.textlength(text, font=font) if hasattr(d, 'textlength') else len(text) * 10
         text_x = (width - text_width) // 2
         text_y = (height - 36) // 2
-        
+
         d.text((text_x, text_y), text, fill=(255, 255, 255), font=font)
     else:
         # Draw a simple shape as placeholder
         d.rectangle([width//4, height//4, 3*width//4, 3*height//4], outline=(255, 255, 255), width=3)
-    
+
     # Save the image
-    img.save(f'images/{filename}')
+    img.save(os.path.join(images.IMAGES_DIR, filename))
+
 
-# Create all required placeholder images
+# Placeholder images for pages whose photos are not in the repository yet
 placeholders = [
     (800, 600, 'hallulies-logo.png', 'Hallulies Logo'),
     (800, 600, 'room1.1otherview.jpeg', 'Luxury Room'),
@@ -45,9 +68,112 @@ placeholders = [
     (1200, 800, 'hero-bg.jpg', 'Hero Background')
 ]
 
-# Create all placeholder images
-for width, height, filename, text in placeholders:
-    create_placeholder_image(width, height, filename, text)
-    print(f"Created placeholder: {filename}")
 
-print("All placeholder images created successfully!")
\ No newline at end of file
+def create_missing_placeholders():
+    os.makedirs(images.IMAGES_DIR, exist_ok=True)
+    for width, height, filename, text in placeholders:
+        # Never overwrite a real photo with a placeholder
+        if not os.path.exists(os.path.join(images.IMAGES_DIR, filename)):
+            create_placeholder_image(width, height, filename, text)
+            print(f"Created placeholder: {filename}")
+
+
+def find_sources():
+    """Derivable images under images/, outside images/derived/"""
+    sources = []
+    for directory, subdirectories, filenames in os.walk(images.IMAGES_DIR):
+        if os.path.abspath(directory) == os.path.abspath(images.DERIVED_DIR):
+            subdirectories[:] = []
+            continue
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if images.source_format(filename):
+                sources.append(os.path.join(directory, filename).replace(os.sep, '/'))
+    return sources
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'images': {}}
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate responsive image derivatives')
+    parser.add_argument('--widths', default=','.join(map(str, images.IMAGE_WIDTHS)),
+                        help='comma-separated target widths in pixels')
+    parser.add_argument('--formats', default=','.join(images.IMAGE_FORMATS),
+                        help='comma-separated modern formats (avif, webp)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--force', action='store_true', help='derive unchanged sources as well')
+    parser.add_argument('--placeholders', action='store_true', help='create missing placeholder images first')
+    args = parser.parse_args()
+
+    if Image is None:
+        raise SystemExit("❌ Pillow is not installed (pip install Pillow)")
+    if args.placeholders:
+        create_missing_placeholders()
+
+    widths = [int(width) for width in args.widths.split(',')]
+    formats = images.available_formats([name.strip() for name in args.formats.split(',') if name.strip()])
+    signature = images.settings_signature(widths, formats)
+    manifest_path = os.path.join(images.DERIVED_DIR, images.MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    entries = manifest.setdefault('images', {})
+
+    sources = find_sources()
+    for removed in set(entries) - set(sources):
+        remove_files(entries.pop(removed).get('files', []))
+
+    pending = {}
+    for source in sources:
+        source_hash = images.file_hash(source)
+        entry = entries.get(source)
+        if (not args.force and entry and entry.get('hash') == source_hash and entry.get('settings') == signature
+                and all(os.path.exists(path) for path in entry.get('files', []))):
+            continue
+        pending[source] = source_hash
+
+    print(f"🖼️  {len(sources)} images, {len(pending)} to derive ({', '.join(formats)} + original) "
+          f"with {args.workers} workers")
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(images.derive, source, source_hash, widths, formats): source
+            for source, source_hash in pending.items()
+        }
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {source}: {e}")
+                continue
+            entry['settings'] = signature
+            old_files = set(entries.get(source, {}).get('files', []))
+            remove_files(old_files - set(entry['files']))
+            entries[source] = entry
+            print(f"✅ {source} ({entry['width']}x{entry['height']}, {len(entry['files'])} files)")
+
+    os.makedirs(images.DERIVED_DIR, exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"📄 Wrote {manifest_path} in {time.perf_counter() - started:.1f}s"
+          + (f", {failed} failed" if failed else ''))
+
+
+if __name__ == '__main__':
+    main()
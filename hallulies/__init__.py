@@ -0,0 +1,4 @@
+"""
+Shared server infrastructure for the Hallulies HTTP servers
+(api-server.py, enhanced-api-server.py, simple-api-server.py and server.py)
+"""
@@ -0,0 +1,255 @@
+"""
+asyncio serving engine (SERVER_ENGINE=asyncio)
+
+The event loop owns every connection: accepting, reading request heads and
+bodies, idle keep-alive waits and writing responses. Only the handler call
+itself (SQLite queries, send_email, JSON encoding) runs on a bounded
+executor, so an idle connection costs a coroutine rather than a thread.
+
+Requests are dispatched through the very same handler class the socketserver
+engines use: each request gets a fresh handler instance whose rfile is an
+in-memory buffer, and BaseHTTPRequestHandler.handle_one_request() does the
+parsing and do_GET/do_POST/... dispatch exactly as it does on a socket.
+
+The handler's wfile collects output and hands it to the event loop every
+ASYNC_WRITE_BUFFER bytes, waiting for the transport to drain, so streamed
+JSON lists and large static files go out piece by piece with bounded
+memory. A response that fits in the buffer is written by the loop in one
+go once the handler returns. Files are copied through Python: there is no
+socket for sendfile() on the executor thread.
+
+Request bodies must carry a Content-Length; Transfer-Encoding (chunked
+uploads) is answered with 411 Length Required.
+"""
+
+import asyncio
+import io
+import os
+import socket
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from hallulies.serving import MAX_QUEUED_REQUESTS, WORKER_THREADS, _OVERLOADED_RESPONSE
+
+IDLE_TIMEOUT = float(os.environ.get('ASYNC_IDLE_TIMEOUT', 15))
+WRITE_BUFFER = int(os.environ.get('ASYNC_WRITE_BUFFER', 64 * 1024))
+MAX_HEADER_BYTES = 64 * 1024
+
+_BAD_REQUEST_RESPONSE = (
+    b'HTTP/1.0 400 Bad Request\r\n'
+    b'Content-Length: 0\r\n'
+    b'Connection: close\r\n'
+    b'\r\n'
+)
+
+_LENGTH_REQUIRED_RESPONSE = (
+    b'HTTP/1.0 411 Length Required\r\n'
+    b'Content-Length: 0\r\n'
+    b'Connection: close\r\n'
+    b'\r\n'
+)
+
+
+def _body_length(head):
+    """(body length, None) for a raw request head, or (None, error response)"""
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'transfer-encoding':
+            return None, _LENGTH_REQUIRED_RESPONSE
+        if name == b'content-length':
+            try:
+                length = int(value.strip())
+            except ValueError:
+                return None, _BAD_REQUEST_RESPONSE
+            if length < 0:
+                return None, _BAD_REQUEST_RESPONSE
+    return length, None
+
+
+class _TransportWriter:
+    """wfile of a handler running on the executor.
+
+    Output is buffered; once WRITE_BUFFER bytes have gathered they are
+    written to the transport on the event loop and the handler thread waits
+    for the drain. Whatever is left when the handler returns is taken by
+    the caller with remaining().
+    """
+
+    def __init__(self, loop, writer, limit=WRITE_BUFFER):
+        self._loop = loop
+        self._writer = writer
+        self._limit = limit
+        self._buffer = bytearray()
+        # Bytes already handed to the transport
+        self.sent = 0
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._limit:
+            self._push()
+        return len(data)
+
+    def flush(self):
+        # handle_one_request() flushes after every request; the rest goes out
+        # with remaining() without another trip to the loop
+        pass
+
+    def _push(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        self.sent += len(data)
+        asyncio.run_coroutine_threadsafe(self._send(data), self._loop).result()
+
+    async def _send(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def remaining(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class AsyncHTTPServer:
+    """Event-loop HTTP server exposing the same surface as socketserver.TCPServer"""
+
+    def __init__(self, server_address, handler_class, workers=None, max_queued=None,
+                 idle_timeout=None, reuse_port=False):
+        self.RequestHandlerClass = handler_class
+        self.workers = workers or WORKER_THREADS
+        self.max_queued = max_queued or MAX_QUEUED_REQUESTS
+        self.idle_timeout = idle_timeout or IDLE_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='aio-worker')
+        self._loop = None
+        self._stop = None
+        self.in_flight = 0
+        self.open_connections = 0
+        self.requests = 0
+        self.rejected = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.bind(server_address)
+        self.socket.listen(1024)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def server_close(self):
+        self.socket.close()
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            'engine': 'asyncio',
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'max_queued': self.max_queued,
+            'open_connections': self.open_connections,
+            'requests': self.requests,
+            'rejected': self.rejected,
+        }
+
+    def describe(self):
+        return f'asyncio ({self.workers} executor threads, queue limit {self.max_queued})'
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket,
+                                            limit=MAX_HEADER_BYTES)
+        async with server:
+            await self._stop.wait()
+
+    async def _handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+        self.open_connections += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                length, error = _body_length(head)
+                if error is not None:
+                    writer.write(error)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout) if length else b''
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                if self.in_flight >= self.workers + self.max_queued:
+                    self.rejected += 1
+                    writer.write(_OVERLOADED_RESPONSE)
+                    break
+
+                self.in_flight += 1
+                try:
+                    response, close = await self._loop.run_in_executor(
+                        self._executor, self._run_handler, head + body, client_address, writer)
+                finally:
+                    self.in_flight -= 1
+                self.requests += 1
+
+                writer.write(response)
+                await writer.drain()
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.open_connections -= 1
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def _run_handler(self, raw_request, client_address, writer):
+        """Run one request through the handler class; returns (rest of the response, close?)"""
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.server = self
+        handler.request = None
+        handler.connection = None
+        handler.client_address = client_address
+        handler.directory = os.getcwd()
+        handler.rfile = io.BytesIO(raw_request)
+        handler.wfile = _TransportWriter(self._loop, writer)
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except ConnectionError:
+            return b'', True
+        except Exception:
+            self.handle_error(client_address)
+            if handler.wfile.sent:
+                # Part of the response is out; all we can do is cut it short
+                return b'', True
+            return (b'HTTP/1.0 500 Internal Server Error\r\n'
+                    b'Content-Length: 0\r\nConnection: close\r\n\r\n'), True
+        return handler.wfile.remaining(), handler.close_connection
+
+    def handle_error(self, client_address):
+        print('-' * 40, file=sys.stderr)
+        print(f'Exception occurred during processing of request from {client_address}', file=sys.stderr)
+        traceback.print_exc()
+        print('-' * 40, file=sys.stderr)
@@ -0,0 +1,186 @@
+"""
+In-process cache of encoded GET responses, invalidated by table tags
+
+    class Handler(RoutingMixin, CachingMixin, ResponseMixin, SimpleHTTPRequestHandler):
+        @cached('menu_items')
+        def handle_get_menu(self):
+            ...                                   # runs only on a miss
+
+        def handle_update_menu_item(self, menu_id, data):
+            ...
+            conn.commit()
+            cache.invalidate('menu_items')        # before the response goes out
+
+A miss runs the handler as usual; the body it sends through send_body() is
+stored under the request path together with the handler's tags. Entries are
+evicted least-recently-used once RESPONSE_CACHE_MAX_BYTES is exceeded and
+expire after RESPONSE_CACHE_TTL seconds. Responses streamed by
+send_json_list() are never cached.
+
+Invalidation only reaches this process. Under @conditional (see
+hallulies/conditional.py) the key also includes the ETag, which is derived
+from the database's table version counters, so a write made by another
+process is never served from here. Handlers cached without @conditional can
+serve a stale body for at most RESPONSE_CACHE_TTL seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'true').lower() == 'true'
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+
+CacheEntry = namedtuple('CacheEntry', 'body content_type headers tags expires size')
+
+
+class ResponseCache:
+    """Thread-safe LRU of response bodies with per-tag invalidation"""
+
+    def __init__(self, max_bytes=None, ttl=None, enabled=None):
+        self.max_bytes = RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.enabled = RESPONSE_CACHE if enabled is None else enabled
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generations(self, tags):
+        """Snapshot of the tags' invalidation counters, taken before computing a response"""
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def put(self, key, body, content_type, headers, tags, generations=None):
+        """Store a response unless it is too big or a tag was invalidated meanwhile"""
+        size = len(body)
+        if not self.enabled or size > self.max_bytes // 4:
+            return False
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            if generations is not None and generations != tuple(self._generations.get(tag, 0) for tag in tags):
+                # A write landed while this response was being built
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(body, content_type, dict(headers or {}), tuple(tags), expires, size)
+            self.size += size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self.stores += 1
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_default = ResponseCache()
+
+
+def invalidate(*tags):
+    _default.invalidate(*tags)
+
+
+def stats():
+    return _default.stats()
+
+
+def cached(*tags):
+    """Serve a GET handler's response from the cache, keyed by request path (and ETag)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            if not _default.enabled or self._response_capture is not None:
+                # Disabled, or called from another @cached handler
+                return f(self, *args, **kwargs)
+            key = (self.path, getattr(self, 'response_etag', None))
+            entry = _default.get(key)
+            if entry is not None:
+                self.send_body(entry.body, 200, entry.content_type, dict(entry.headers, **{'X-Cache': 'HIT'}))
+                return
+            self._response_capture = (key, tags, _default.generations(tags))
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                self._response_capture = None
+        return wrapper
+    return decorator
+
+
+class CachingMixin:
+    """Stores the body of a @cached handler's 200 response on its way out"""
+
+    _response_capture = None
+
+    def send_body(self, body, status_code=200, content_type='application/json', headers=None):
+        capture = self._response_capture
+        if capture is not None:
+            self._response_capture = None
+            if status_code == 200:
+                key, tags, generations = capture
+                _default.put(key, body, content_type, headers, tags, generations)
+                headers = dict(headers or {}, **{'X-Cache': 'MISS'})
+        super().send_body(body, status_code, content_type, headers)
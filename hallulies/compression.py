@@ -0,0 +1,126 @@
+"""
+Content-Encoding negotiation (gzip, and brotli when the module is installed)
+
+ResponseMixin.send_body(), send_json_list() and StaticFileMixin compress
+text and JSON responses of at least COMPRESSION_MIN_SIZE bytes with the
+best coding the client's Accept-Encoding allows. Responses that carry an
+ETag are cacheable, so their compressed bodies are kept in an LRU keyed by
+(ETag, coding) and each is compressed once per version.
+
+A compressed representation gets its own ETag ("<etag>-gzip"); conditional
+requests strip that suffix again before comparing (see etag_matches() in
+hallulies/conditional.py).
+"""
+
+import gzip
+import os
+import zlib
+
+from hallulies.cache import ResponseCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION = os.environ.get('COMPRESSION', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESSION_CACHE_MAX_BYTES = int(os.environ.get('COMPRESSION_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+
+# In order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+_cache = ResponseCache(max_bytes=COMPRESSION_CACHE_MAX_BYTES, ttl=0, enabled=COMPRESSION)
+
+
+def compressible(content_type):
+    return COMPRESSION and (content_type or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate(accept_encoding, encodings=None):
+    """Best of encodings (default: the supported ones) allowed by an Accept-Encoding header, or None"""
+    if not COMPRESSION or not accept_encoding:
+        return None
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities['gzip' if coding == 'x-gzip' else coding] = quality
+    best, best_quality = None, 0.0
+    for coding in ENCODINGS if encodings is None else encodings:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_LEVEL, mtime=0)
+
+
+def cached_compress(key, encoding, load):
+    """Compressed body for key (an ETag), calling load() for the raw bytes only on a miss"""
+    entry = _cache.get((key, encoding))
+    if entry is not None:
+        return entry.body
+    body = compress(load(), encoding)
+    _cache.put((key, encoding), body, None, None, ())
+    return body
+
+
+def variant_etag(etag, encoding):
+    """ETag of the compressed representation ("abc" becomes "abc-gzip")"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def base_etag(etag):
+    for encoding in ('br', 'gzip'):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class StreamCompressor:
+    """Incremental compressor; every compress() returns output the client can decode at once"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def stats():
+    return dict(_cache.stats(), encodings=list(ENCODINGS), min_size=COMPRESSION_MIN_SIZE)
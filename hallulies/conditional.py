@@ -0,0 +1,150 @@
+"""
+Validators and conditional GET handling (ETag / Last-Modified / 304)
+
+API lists get their validators from the table_versions table, which
+triggers bump on every insert, update and delete (migration 6), so a 304
+costs one indexed lookup and the handler never runs:
+
+    @conditional('menu_items', cache_control='public, max-age=60')
+    @cached('menu_items')
+    def handle_get_menu(self):
+        ...
+
+Because every process reads the same counters, an edit made through any
+worker (or any other script) changes the ETag everywhere at once.
+Static files use a hash of their content (see hallulies/static.py).
+"""
+
+import datetime
+import email.utils
+import hashlib
+import os
+from functools import wraps
+
+from hallulies import db
+from hallulies.compression import base_etag
+
+API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 60))
+
+# Render sets RENDER_GIT_COMMIT per deploy; mixing it into API ETags means a
+# deploy that changes a response's shape does not 304 into the old one
+ETAG_SALT = os.environ.get('RENDER_GIT_COMMIT', '')
+
+# Public lists (menu, testimonials): browsers may reuse them briefly, then revalidate
+PUBLIC_CACHE_CONTROL = f'public, max-age={API_CACHE_MAX_AGE}'
+
+
+def http_date(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def make_etag(*parts):
+    """Strong ETag from the parts that determine the response bytes"""
+    digest = hashlib.sha1('\0'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(header, etag):
+    """If-None-Match comparison (weak, per RFC 9110 13.1.2).
+
+    The compressed representations' ETags ("abc-gzip") match their base ETag.
+    """
+    return matching_etag(header, etag) is not None
+
+
+def matching_etag(header, etag):
+    """The If-None-Match entry that matches etag, or None"""
+    if header.strip() == '*':
+        return etag
+    opaque = base_etag(etag[2:] if etag.startswith('W/') else etag)
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if base_etag(candidate) == opaque:
+            return candidate
+    return None
+
+
+def not_modified(headers, etag, last_modified=None):
+    """True if the request's validators say the client's copy is current.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    without it, at one-second resolution.
+    """
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since is None or last_modified is None:
+        return False
+    since = parse_http_date(if_modified_since)
+    return since is not None and int(last_modified) <= since
+
+
+def if_range_matches(headers, etag, last_modified):
+    """False if an If-Range header says the client's partial copy is outdated.
+
+    An entity tag must match strongly; a date must equal Last-Modified.
+    """
+    if_range = headers.get('If-Range')
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag and not etag.startswith('W/')
+    return parse_http_date(if_range) == int(last_modified)
+
+
+def parse_http_date(value):
+    """Epoch seconds of an HTTP date, or None if it does not parse"""
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def table_versions(tables):
+    """[(version, updated_at epoch seconds)] for each table, from table_versions"""
+    conn = db.connect()
+    cursor = conn.cursor()
+    placeholders = ', '.join('?' * len(tables))
+    cursor.execute(
+        f"SELECT name, version, CAST(strftime('%s', updated_at) AS INTEGER) "
+        f"FROM table_versions WHERE name IN ({placeholders})", tables)
+    found = {name: (version, updated) for name, version, updated in cursor.fetchall()}
+    conn.close()
+    return [found.get(table, (0, 0)) for table in tables]
+
+
+def conditional(*tables, cache_control='no-cache'):
+    """Answer 304 from the tables' version counters before the handler runs"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            if self.response_etag is not None:
+                # Called from another @conditional handler
+                return f(self, *args, **kwargs)
+            versions = table_versions(tables)
+            etag = make_etag(ETAG_SALT, type(self).__name__, self.path, *(version for version, _ in versions))
+            last_modified = max(updated or 0 for _, updated in versions)
+            validators = {'ETag': etag, 'Cache-Control': cache_control}
+            if last_modified:
+                validators['Last-Modified'] = http_date(last_modified)
+            if not_modified(self.headers, etag, last_modified):
+                self.send_not_modified(validators)
+                return
+            # Versions are read before the body is built: a write in between
+            # gives a newer body under the older ETag, never the reverse
+            self.response_etag = etag
+            self.response_headers = validators
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                self.response_etag = None
+                self.response_headers = None
+        return wrapper
+    return decorator
@@ -0,0 +1,270 @@
+"""
+Per-thread SQLite connections for the Hallulies API handlers
+
+Handlers used to open hallulies.db, run one or two statements and close it
+again, paying for the file open, schema parse and statement compilation on
+every request. ConnectionManager keeps one long-lived connection per worker
+thread instead, each with a statement cache of DB_CACHED_STATEMENTS entries,
+so repeated queries skip the SQL compiler.
+
+    conn = db.connect()
+    cursor = conn.cursor()
+    ...
+    conn.commit()
+    conn.close()   # hands the connection back, it stays open for the thread
+
+close() on a pooled connection rolls back anything left uncommitted and
+returns it to the thread; it is only really closed by close_all() or after
+a failure. A connection that has been idle for DB_HEALTH_CHECK_INTERVAL
+seconds, or that raised a sqlite3.DatabaseError, is checked with SELECT 1
+on the next checkout and reopened if the check fails.
+
+The first connection switches the database to SQLITE_JOURNAL_MODE (WAL by
+default) so readers keep going while a booking insert is being committed;
+WAL sticks to the database file, any other mode is set on every connection.
+Every connection then gets synchronous, busy_timeout, mmap_size and
+cache_size from the SQLITE_* settings below.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'hallulies.db')
+DB_CACHED_STATEMENTS = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 5))
+DB_FETCH_BATCH_SIZE = int(os.environ.get('DB_FETCH_BATCH_SIZE', 500))
+DB_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_HEALTH_CHECK_INTERVAL', 30))
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+# Negative values are KiB, positive values pages (SQLite convention). Every
+# worker thread has its own connection, so this is paid WORKER_THREADS times
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -4000))
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class PooledCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except sqlite3.DatabaseError:
+            self.connection.suspect = True
+            raise
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() returns it to its thread"""
+
+    manager = None
+    last_used = 0.0
+    suspect = False
+
+    def close(self):
+        if self.manager is None:
+            super().close()
+            return
+        self.manager.release(self)
+
+    def really_close(self):
+        super().close()
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except sqlite3.DatabaseError:
+            self.suspect = True
+            raise
+
+    def commit(self):
+        try:
+            super().commit()
+        except sqlite3.DatabaseError:
+            self.suspect = True
+            raise
+
+
+class ConnectionManager:
+    """One persistent connection per thread, opened on first use"""
+
+    def __init__(self, path=None, cached_statements=None, timeout=None, health_check_interval=None,
+                 journal_mode=None, synchronous=None, mmap_size=None, cache_size=None):
+        self.path = path or DATABASE_PATH
+        self.cached_statements = cached_statements or DB_CACHED_STATEMENTS
+        self.timeout = DB_BUSY_TIMEOUT if timeout is None else timeout
+        self.health_check_interval = (DB_HEALTH_CHECK_INTERVAL if health_check_interval is None
+                                      else health_check_interval)
+        self.journal_mode = (journal_mode or SQLITE_JOURNAL_MODE).upper()
+        self.synchronous = (synchronous or SQLITE_SYNCHRONOUS).upper()
+        self.mmap_size = SQLITE_MMAP_SIZE if mmap_size is None else mmap_size
+        self.cache_size = SQLITE_CACHE_SIZE if cache_size is None else cache_size
+        if self.journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unknown SQLITE_JOURNAL_MODE '{self.journal_mode}'")
+        if self.synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown SQLITE_SYNCHRONOUS '{self.synchronous}'")
+        self.active_journal_mode = None
+        self._configure_lock = threading.Lock()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self.opened = 0
+        self.checkouts = 0
+        self.reconnects = 0
+        self.failed_health_checks = 0
+        self.rollbacks = 0
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not share its parent's SQLite handles
+            os.register_at_fork(after_in_child=self._forget_inherited)
+
+    def _open(self):
+        if self.active_journal_mode is None:
+            # The journal mode can only be switched while no other connection
+            # has the database open, so the first open happens alone
+            with self._configure_lock:
+                return self._open_unlocked()
+        return self._open_unlocked()
+
+    def _open_unlocked(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, factory=PooledConnection,
+                               cached_statements=self.cached_statements, check_same_thread=False)
+        conn.manager = self
+        self._configure(conn)
+        with self._lock:
+            self.opened += 1
+            self._connections[threading.get_ident()] = conn
+        return conn
+
+    def _configure(self, conn):
+        """Apply the journal mode (once per database for WAL) and per-connection pragmas"""
+        # WAL is stored in the database file; the other modes only last as
+        # long as the connection, so every connection has to ask for them
+        if self.active_journal_mode != 'WAL':
+            mode = conn.execute(f'PRAGMA journal_mode = {self.journal_mode}').fetchone()[0]
+            # In-memory databases only report "memory"
+            self.active_journal_mode = mode.upper()
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+
+    def _healthy(self, conn):
+        try:
+            sqlite3.Connection.execute(conn, 'SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            if self._connections.get(threading.get_ident()) is conn:
+                del self._connections[threading.get_ident()]
+        try:
+            conn.really_close()
+        except sqlite3.Error:
+            pass
+
+    def connect(self):
+        """Check out this thread's connection, (re)opening it if needed"""
+        conn = getattr(self._local, 'conn', None)
+        now = time.monotonic()
+        if conn is not None and (conn.suspect or now - conn.last_used > self.health_check_interval):
+            if not self._healthy(conn):
+                with self._lock:
+                    self.failed_health_checks += 1
+                    self.reconnects += 1
+                self._discard(conn)
+                conn = None
+            else:
+                conn.suspect = False
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        if conn.in_transaction:
+            # A previous handler raised before committing
+            conn.rollback()
+            with self._lock:
+                self.rollbacks += 1
+        conn.last_used = now
+        with self._lock:
+            self.checkouts += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection to its thread, rolling back uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self.rollbacks += 1
+        except sqlite3.Error:
+            conn.suspect = True
+        conn.last_used = time.monotonic()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.really_close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def _forget_inherited(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._configure_lock = threading.Lock()
+        self._connections = {}
+
+    def stats(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        with self._lock:
+            # Connections of threads that have exited are gone with their thread-local
+            for ident in [ident for ident in self._connections if ident not in alive]:
+                del self._connections[ident]
+            return {
+                'path': self.path,
+                'journal_mode': self.active_journal_mode,
+                'synchronous': self.synchronous,
+                'connections': len(self._connections),
+                'cached_statements': self.cached_statements,
+                'opened': self.opened,
+                'checkouts': self.checkouts,
+                'reuse_ratio': round(1 - self.opened / self.checkouts, 4) if self.checkouts else 0.0,
+                'reconnects': self.reconnects,
+                'failed_health_checks': self.failed_health_checks,
+                'rollbacks': self.rollbacks,
+            }
+
+
+def fetch_batches(cursor, convert, size=None):
+    """Yield lists of convert(row) pulled from ``cursor`` with fetchmany()"""
+    size = size or DB_FETCH_BATCH_SIZE
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield [convert(row) for row in rows]
+
+
+_default = ConnectionManager()
+
+
+def connect():
+    """This thread's connection to DATABASE_PATH"""
+    return _default.connect()
+
+
+def stats():
+    return _default.stats()
+
+
+def close_all():
+    _default.close_all()
@@ -0,0 +1,168 @@
+"""
+Admin notification digests (the admin_notifications table, see migration 8)
+
+Every testimonial and contact submission used to queue its own email to
+the admin, so a burst of spam turned into as many SMTP transactions. Admin
+notifications go through notify() in the request's transaction:
+
+    digest.notify(conn, EMAIL_HOST_USER, subject, 'contact_message', context)
+    conn.commit()
+
+Digests are off by default (ADMIN_DIGEST_WINDOW=0): each notification is
+queued as its own email at once, as before. With a window set, they are
+buffered in admin_notifications. Once the oldest buffered notification is
+ADMIN_DIGEST_WINDOW seconds old, the thread started by start() moves
+everything buffered for a recipient (at most ADMIN_DIGEST_MAX_ITEMS per
+message) into the email outbox as one digest, in one transaction, so the
+admin gets at most one email per window and no notification waits longer
+than the window (plus EMAIL_OUTBOX_POLL_INTERVAL).
+
+notify() renders the template's '<template>_details.html' fragment for the
+digest, or the full '<template>.html' message when urgent=True or
+ADMIN_DIGEST_WINDOW=0; those skip the buffer and are queued right away.
+The buffer is in the database, so a restart loses nothing and several
+server processes share one digest.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from hallulies import db, outbox, templates
+
+ADMIN_DIGEST_WINDOW = float(os.environ.get('ADMIN_DIGEST_WINDOW', 0))
+ADMIN_DIGEST_MAX_ITEMS = int(os.environ.get('ADMIN_DIGEST_MAX_ITEMS', 100))
+
+_flusher = None
+_lock = threading.Lock()
+_digests = 0
+_digested = 0
+_errors = 0
+
+
+def notify(conn, to_email, subject, template, context, urgent=False):
+    """Queue an admin notification in conn's transaction, for the next digest unless urgent"""
+    if urgent or ADMIN_DIGEST_WINDOW <= 0:
+        return outbox.enqueue(conn, to_email, subject, templates.render(f'{template}.html', **context))
+    conn.execute('''
+        INSERT INTO admin_notifications (to_email, kind, subject, details_html, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (to_email, template, subject, templates.render(f'{template}_details.html', **context), time.time()))
+    return None
+
+
+def _plural(count, noun):
+    return f"{count} {noun}{'' if count == 1 else 's'}"
+
+
+def _message(rows):
+    """(subject, body_html) of the digest of rows (id, kind, subject, details_html, created_at)"""
+    entries = ''.join(
+        templates.render('admin_digest_item.html', subject=subject, details=templates.Markup(details),
+                         received=datetime.fromtimestamp(created_at).strftime('%Y-%m-%d %H:%M'))
+        for _, _, subject, details, created_at in rows)
+    body_html = templates.render('admin_digest.html', summary=_plural(len(rows), 'new notification'),
+                                 since=datetime.fromtimestamp(rows[0][4]).strftime('%Y-%m-%d %H:%M'),
+                                 items=templates.Markup(entries))
+    if len(rows) == 1:
+        return rows[0][2], body_html
+    counts = {}
+    for row in rows:
+        counts[row[1]] = counts.get(row[1], 0) + 1
+    kinds = ', '.join(_plural(count, kind.replace('_', ' ')) for kind, count in sorted(counts.items()))
+    return f'Hallulies digest: {kinds}', body_html
+
+
+def flush(conn):
+    """Move due notifications into the outbox as digests.
+
+    Returns the seconds until the oldest buffered notification is due, or
+    None when nothing is buffered.
+    """
+    global _digests, _digested
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        oldest = conn.execute('SELECT created_at FROM admin_notifications ORDER BY id LIMIT 1').fetchone()
+        if oldest is None or oldest[0] + ADMIN_DIGEST_WINDOW > now:
+            conn.rollback()
+            return None if oldest is None else oldest[0] + ADMIN_DIGEST_WINDOW - now
+        recipients = [row[0] for row in conn.execute('SELECT DISTINCT to_email FROM admin_notifications')]
+        digested = 0
+        for to_email in recipients:
+            rows = conn.execute('''
+                SELECT id, kind, subject, details_html, created_at FROM admin_notifications
+                WHERE to_email = ? ORDER BY id LIMIT ?
+            ''', (to_email, ADMIN_DIGEST_MAX_ITEMS)).fetchall()
+            subject, body_html = _message(rows)
+            outbox.enqueue(conn, to_email, subject, body_html)
+            conn.executemany('DELETE FROM admin_notifications WHERE id = ?', [(row[0],) for row in rows])
+            digested += len(rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    outbox.wake()
+    with _lock:
+        _digests += len(recipients)
+        _digested += digested
+    # Look again right away, in case more than ADMIN_DIGEST_MAX_ITEMS were buffered
+    return 0
+
+
+def _work():
+    global _errors
+    failures = 0
+    while True:
+        conn = db.connect()
+        try:
+            wait = flush(conn)
+            failures = 0
+        except Exception as e:
+            # The thread must outlive a bad row or a bug; flush() left the
+            # notifications buffered, so they go out with a later digest
+            failures += 1
+            with _lock:
+                _errors += 1
+            if isinstance(e, sqlite3.Error):
+                print(f"❌ Admin digest: {e}")
+            else:
+                print(f"❌ Admin digest error (failure {failures} in a row):", file=sys.stderr)
+                traceback.print_exc()
+            wait = min(outbox.EMAIL_OUTBOX_POLL_INTERVAL * 2 ** (failures - 1), outbox.SEND_LEASE)
+        finally:
+            conn.close()
+        if wait is None:
+            # Nothing buffered; look again for notifications from this or other processes
+            wait = outbox.EMAIL_OUTBOX_POLL_INTERVAL
+        time.sleep(max(wait, 0.05))
+
+
+def start():
+    """Send digests from a background thread (nothing to do with ADMIN_DIGEST_WINDOW=0)"""
+    global _flusher
+    if ADMIN_DIGEST_WINDOW <= 0 or _flusher is not None:
+        return
+    _flusher = threading.Thread(target=_work, name='admin-digest', daemon=True)
+    _flusher.start()
+
+
+def stats():
+    conn = db.connect()
+    try:
+        buffered, oldest = conn.execute('SELECT COUNT(*), MIN(created_at) FROM admin_notifications').fetchone()
+    finally:
+        conn.close()
+    with _lock:
+        return {
+            'window_seconds': ADMIN_DIGEST_WINDOW,
+            'buffered': buffered,
+            'oldest_buffered_seconds': round(time.time() - oldest) if oldest else 0,
+            'digests_sent': _digests,
+            'notifications_digested': _digested,
+            'errors': _errors,
+        }
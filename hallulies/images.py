@@ -0,0 +1,161 @@
+"""
+Responsive image derivatives (resized WebP/AVIF/original-format variants)
+
+generate_placeholders.py runs derive() for every image under images/ in a
+process pool and records the results in images/derived/manifest.json:
+
+    {"images": {"images/room2.jpeg": {
+        "hash": "<sha256 of the source>", "width": 1600, "height": 1200,
+        "sources": [{"type": "image/avif", "srcset": "images/derived/room2.jpeg-320w.avif 320w, ..."},
+                    {"type": "image/webp", "srcset": "..."},
+                    {"type": "image/jpeg", "srcset": "..."}],
+        "files": [...]}}}
+
+"sources" maps straight onto <picture><source type=... srcset=...>, the
+last entry being the fallback for <img srcset>. Pillow is optional: without
+it nothing is derived and the originals are served as they are.
+"""
+
+import hashlib
+import io
+import os
+import urllib.parse
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+IMAGES_DIR = 'images'
+DERIVED_DIR = os.path.join(IMAGES_DIR, 'derived')
+MANIFEST_NAME = 'manifest.json'
+
+SOURCE_EXTENSIONS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.webp': 'webp'}
+
+IMAGE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_WIDTHS', '320,640,960,1280,1920').split(',')]
+IMAGE_FORMATS = [name.strip() for name in os.environ.get('IMAGE_FORMATS', 'avif,webp').split(',') if name.strip()]
+
+# Encoder settings per output format
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 78, 'method': 4},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+}
+
+# Derivative file names under DERIVED_DIR (part of settings_signature(), so
+# a change re-derives everything under the new names)
+DERIVED_NAMES = '{name}-{width}w.{fmt}'
+
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+def available_formats(formats=None):
+    """The requested modern formats this Pillow build can encode"""
+    if Image is None:
+        return []
+    return [name for name in (IMAGE_FORMATS if formats is None else formats) if features.check(name)]
+
+
+def source_format(path):
+    return SOURCE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def settings_signature(widths, formats):
+    """Changes whenever a derivative of an unchanged source would come out differently or elsewhere"""
+    return hashlib.sha1(repr((sorted(widths), formats, SAVE_OPTIONS, DERIVED_NAMES)).encode()).hexdigest()[:12]
+
+
+def target_widths(source_width, widths):
+    """Configured widths below the source's, plus the source width if it is not larger than all of them"""
+    chosen = sorted(width for width in set(widths) if width < source_width)
+    if source_width <= max(widths):
+        chosen.append(source_width)
+    return chosen
+
+
+def derived_path(source, width, fmt, derived_dir=DERIVED_DIR, images_dir=IMAGES_DIR):
+    """images/events/hall.jpeg -> images/derived/events/hall.jpeg-640w.webp
+
+    The source's extension stays in the name, so hall.jpeg and hall.webp
+    never write (or clean up) each other's derivatives.
+    """
+    relative = os.path.relpath(source, images_dir)
+    return os.path.join(derived_dir, DERIVED_NAMES.format(name=relative, width=width, fmt=fmt))
+
+
+def load(path, width=None):
+    """Open an image upright (EXIF orientation applied) and fully decoded.
+
+    With a width, JPEGs are decoded at the smallest scale (1/2, 1/4, 1/8)
+    that still leaves both sides at least that wide, which is much faster.
+    """
+    with Image.open(path) as image:
+        if width is not None:
+            # Both sides, as the EXIF orientation may swap them
+            image.draft(None, (width, width))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def resize(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def encode(image, fmt):
+    """Bytes of image in fmt; JPEG drops the alpha channel"""
+    alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    mode = 'RGBA' if alpha and fmt != 'jpeg' else 'RGB'
+    if image.mode != mode:
+        image = image.convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, fmt.upper(), **SAVE_OPTIONS.get(fmt, {}))
+    return buffer.getvalue()
+
+
+def render(source, width, fmt):
+    """Bytes of source scaled down to width in fmt; runs in a worker process"""
+    return encode(resize(load(source, width), width), fmt)
+
+
+def derive(source, source_hash, widths, formats, derived_dir=DERIVED_DIR, images_dir=IMAGES_DIR):
+    """Write every width x format variant of source; returns its manifest entry.
+
+    Runs in a worker process, so it takes and returns plain data only.
+    """
+    image = load(source)
+    outputs = formats + [fmt for fmt in [source_format(source)] if fmt not in formats]
+    sources, files = [], []
+    for fmt in outputs:
+        srcset = []
+        for width in target_widths(image.width, widths):
+            path = derived_path(source, width, fmt, derived_dir, images_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = encode(resize(image, width), fmt)
+            # Written under a temporary name so a reader never sees half a file
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+            url = urllib.parse.quote(path.replace(os.sep, '/'))
+            srcset.append(f'{url} {width}w')
+            files.append(path.replace(os.sep, '/'))
+        sources.append({'type': CONTENT_TYPES[fmt], 'srcset': ', '.join(srcset)})
+    return {
+        'hash': source_hash,
+        'width': image.width,
+        'height': image.height,
+        'sources': sources,
+        'files': files,
+    }
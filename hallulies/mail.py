@@ -0,0 +1,226 @@
+"""
+SMTP delivery for the Hallulies servers
+
+    MAILER = mail.Mailer(EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, EMAIL_USE_TLS)
+    MAILER.send('guest@example.com', 'Booking Confirmation', '<html>...</html>')
+    errors = MAILER.send_many([(to_email, subject, body_html), ...])
+
+Connecting, STARTTLS and login cost several round trips, so a Mailer keeps
+up to EMAIL_SESSION_POOL_SIZE authenticated sessions open and sends every
+message over one of them. A session is replaced after
+EMAIL_SESSION_MAX_MESSAGES messages or EMAIL_SESSION_IDLE_TIMEOUT idle
+seconds (servers drop idle clients); one the server dropped anyway is
+noticed on the next command and the message is retried on a fresh session.
+
+Messages to one SMTP host are held to EMAIL_RATE_LIMIT per minute (bursts
+of EMAIL_RATE_BURST), shared by every Mailer and thread of the process, so
+the provider does not throttle or block the account.
+
+send() raises on failure (smtplib.SMTPException, OSError) so that the
+outbox workers (hallulies/outbox.py) can retry; request handlers never call
+it directly. STARTTLS is only used when use_tls is set, and the login is
+skipped without a password.
+"""
+
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from hallulies.ratelimit import TokenBucket
+
+EMAIL_TIMEOUT = float(os.environ.get('EMAIL_TIMEOUT', 30))
+EMAIL_SESSION_POOL_SIZE = int(os.environ.get('EMAIL_SESSION_POOL_SIZE', 2))
+EMAIL_SESSION_MAX_MESSAGES = int(os.environ.get('EMAIL_SESSION_MAX_MESSAGES', 100))
+EMAIL_SESSION_IDLE_TIMEOUT = float(os.environ.get('EMAIL_SESSION_IDLE_TIMEOUT', 60))
+EMAIL_RATE_LIMIT = float(os.environ.get('EMAIL_RATE_LIMIT', 60))
+EMAIL_RATE_BURST = int(os.environ.get('EMAIL_RATE_BURST', 10))
+
+# The connection is gone, not just this message refused
+DROPPED = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# One bucket per SMTP host
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def rate_limiter(host):
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(EMAIL_RATE_LIMIT / 60, EMAIL_RATE_BURST)
+        return _buckets[host]
+
+
+class Session:
+    """An authenticated SMTP connection and its usage"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        # Taken from the pool rather than just connected
+        self.reused = False
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class Mailer:
+    def __init__(self, host, port, user, password, use_tls=True, timeout=None, pool_size=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = EMAIL_TIMEOUT if timeout is None else timeout
+        self.rate = rate_limiter(host)
+        # 0 closes every session after use, i.e. one connection per send_many()
+        self.pool_size = EMAIL_SESSION_POOL_SIZE if pool_size is None else pool_size
+        self._idle = queue.LifoQueue(maxsize=max(self.pool_size, 1))
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reconnects = 0
+        self.messages = 0
+        self.failures = 0
+        self.rate_limited_seconds = 0.0
+
+    @property
+    def enabled(self):
+        """Sending needs the account's (app) password"""
+        return bool(self.password)
+
+    def message(self, to_email, subject, body_html):
+        msg = MIMEMultipart()
+        msg['From'] = self.user
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body_html, 'html'))
+        return msg
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+            if self.password:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self.connects += 1
+        return Session(smtp)
+
+    def _checkout(self):
+        """An idle pooled session that is still worth using, else a new one"""
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - session.last_used < EMAIL_SESSION_IDLE_TIMEOUT:
+                session.reused = True
+                return session
+            session.close()
+
+    def _checkin(self, session):
+        if session.sent >= EMAIL_SESSION_MAX_MESSAGES or self.pool_size <= 0:
+            session.close()
+            return
+        session.last_used = time.monotonic()
+        try:
+            self._idle.put_nowait(session)
+        except queue.Full:
+            session.close()
+
+    def send_many(self, messages):
+        """Send (to_email, subject, body_html) messages over one session; a list of None or the error per message"""
+        errors = []
+        session = None
+        unreachable = None
+        try:
+            for to_email, subject, body_html in messages:
+                if unreachable is not None:
+                    # No point connecting again for every message of the batch
+                    errors.append(unreachable)
+                    continue
+                waited = self.rate.acquire()
+                text = self.message(to_email, subject, body_html).as_string()
+                for _ in range(2):
+                    if session is None:
+                        try:
+                            session = self._checkout()
+                        except (smtplib.SMTPException, OSError) as e:
+                            error = unreachable = e
+                            break
+                    used = session.reused or session.sent > 0
+                    try:
+                        session.smtp.sendmail(self.user, to_email, text)
+                    except DROPPED as e:
+                        error = e
+                        session.smtp.close()
+                        session = None
+                        if not used:
+                            break
+                        # Dropped by the server (idle timeout, restart): once more on a new session
+                        with self._lock:
+                            self.reconnects += 1
+                        continue
+                    except smtplib.SMTPException as e:
+                        # Refused sender, recipient or message; sendmail() has reset the session
+                        error = e
+                        if session.smtp.sock is None:
+                            session = None
+                        break
+                    except OSError as e:
+                        error = e
+                        session.smtp.close()
+                        session = None
+                        break
+                    session.sent += 1
+                    error = None
+                    break
+                with self._lock:
+                    self.rate_limited_seconds += waited
+                    if error is None:
+                        self.messages += 1
+                    else:
+                        self.failures += 1
+                errors.append(error)
+        finally:
+            if session is not None:
+                self._checkin(session)
+        return errors
+
+    def send(self, to_email, subject, body_html):
+        error = self.send_many([(to_email, subject, body_html)])[0]
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Quit the pooled sessions"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'connects': self.connects,
+                'reconnects': self.reconnects,
+                'messages': self.messages,
+                'failures': self.failures,
+                'idle_sessions': self._idle.qsize(),
+                'rate_limit_per_minute': EMAIL_RATE_LIMIT,
+                'rate_limited_seconds': round(self.rate_limited_seconds, 1),
+            }
@@ -0,0 +1,244 @@
+"""
+Versioned schema migrations for hallulies.db
+
+Each migration is (version, description, statements) and runs at most once:
+applied versions are recorded in the schema_migrations table. All three
+API servers call migrate() from init_database(), so a database created by
+any of them ends up with the same schema, seed data and indexes.
+
+Never edit a migration that has shipped; append a new one instead.
+"""
+
+import sqlite3
+
+# Not actually a hash of admin123: the servers used to compare it verbatim
+# instead of checking the password. Migration 9 replaces it.
+ADMIN_PASSWORD_HASH = '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.PZvO.S'
+# bcrypt (cost 12) of the sample admin's password, admin123
+SAMPLE_ADMIN_PASSWORD_HASH = '$2b$12$8wxQjvcByGbVz29OKaOtCeFsbUxnuaXYXXO3.DrfKcMLyynPFmL36'
+
+SAMPLE_MENU_ITEMS = [
+    ('Bruschetta Trio', 'Fresh tomatoes, basil, garlic on ciabatta', 'appetizers', 35.0, 26.0, 'Ciabatta bread, tomatoes, basil, garlic, olive oil', 'Gluten', 'vegetarian,gluten-free', ''),
+    ('Seared Scallops', 'Pan-seared Atlantic scallops with cauliflower purée', 'appetizers', 45.0, 34.0, 'Atlantic scallops, cauliflower, pancetta, truffle oil', 'Milk', 'seafood,gluten-free', ''),
+    ('Herb-Crusted Rack of Lamb', 'New Zealand lamb with rosemary crust and mint jus', 'mains', 85.0, 68.0, 'New Zealand lamb, fresh herbs, mint, root vegetables', 'Milk,Gluten', 'meat', ''),
+    ('Wild Mushroom Risotto', 'Creamy arborio rice with wild forest mushrooms', 'mains', 42.0, None, 'Arborio rice, wild mushrooms, vegetable stock, white wine', 'Milk', 'vegetarian,vegan,gluten-free', '')
+]
+
+MIGRATIONS = [
+    (1, 'Create users, bookings, testimonials and menu_items', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guest_name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            phone TEXT,
+            checkin_date DATE NOT NULL,
+            checkout_date DATE NOT NULL,
+            room_type TEXT NOT NULL,
+            adults INTEGER DEFAULT 1,
+            children INTEGER DEFAULT 0,
+            special_requests TEXT,
+            status TEXT DEFAULT 'pending',
+            total_amount REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS testimonials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            location TEXT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            discounted_price REAL,
+            ingredients TEXT,
+            allergens TEXT,
+            tags TEXT,
+            image_url TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, 'Seed the admin user and sample menu', [
+        # Sample admin user (password: admin123)
+        ('''
+        INSERT OR IGNORE INTO users (username, email, password_hash, role)
+        VALUES (?, ?, ?, ?)
+        ''', ('admin', 'admin@hallulies.com', ADMIN_PASSWORD_HASH, 'admin')),
+        # menu_items has no unique key, so "INSERT OR IGNORE" used to add the
+        # samples again on every start
+        *[('''
+        INSERT INTO menu_items (name, description, category, price, discounted_price, ingredients, allergens, tags, image_url)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM menu_items WHERE name = ?1 AND category = ?3)
+        ''', item) for item in SAMPLE_MENU_ITEMS],
+    ]),
+    (3, 'Remove sample menu items duplicated by earlier restarts', [
+        ('''
+        DELETE FROM menu_items
+        WHERE EXISTS (
+            SELECT 1 FROM menu_items AS original
+            WHERE original.id < menu_items.id
+              AND original.name = menu_items.name
+              AND original.category = menu_items.category
+              AND original.description IS menu_items.description
+              AND original.price = menu_items.price
+        )
+        AND name IN ({})
+        '''.format(', '.join('?' * len(SAMPLE_MENU_ITEMS))), [item[0] for item in SAMPLE_MENU_ITEMS]),
+    ]),
+    (4, 'Index the list queries', [
+        # GET /api/bookings and the dashboard's 30-day count
+        'CREATE INDEX IF NOT EXISTS idx_bookings_created_at ON bookings (created_at DESC)',
+        # GET /api/testimonials only ever lists approved ones, newest first
+        '''
+        CREATE INDEX IF NOT EXISTS idx_testimonials_approved_created_at
+        ON testimonials (created_at DESC) WHERE status = 'approved'
+        ''',
+        # GET /api/menu and /api/menu/category/{category}
+        '''
+        CREATE INDEX IF NOT EXISTS idx_menu_items_active_category_name
+        ON menu_items (category, name) WHERE is_active = 1
+        ''',
+    ]),
+    (5, 'Index bookings for keyset pagination', [
+        # GET /api/bookings pages on (created_at, id); id breaks ties between
+        # bookings created in the same second
+        'DROP INDEX IF EXISTS idx_bookings_created_at',
+        'CREATE INDEX IF NOT EXISTS idx_bookings_created_at_id ON bookings (created_at DESC, id DESC)',
+        # ?status= is the usual admin filter (e.g. pending bookings)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_bookings_status_created_at_id
+        ON bookings (status, created_at DESC, id DESC)
+        ''',
+    ]),
+    # Writes to these tables bump their row in table_versions (ETags of the
+    # public menu and testimonial lists)
+    (6, 'Track table versions for ETags', [
+        '''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        *[(
+            'INSERT OR IGNORE INTO table_versions (name) VALUES (?)', (table,)
+        ) for table in ('menu_items', 'testimonials')],
+        *[f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_version_after_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE name = '{table}';
+        END
+        ''' for table in ('menu_items', 'testimonials') for event in ('INSERT', 'UPDATE', 'DELETE')],
+    ]),
+    # Emails written by the request handlers, sent by hallulies/outbox.py
+    (7, 'Create the email outbox', [
+        '''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body_html TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        ''',
+        # Sent and dead messages stay in the table but out of the workers' index
+        '''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (next_attempt_at) WHERE status IN ('pending', 'sending')
+        ''',
+    ]),
+    (8, 'Create the admin notification digest buffer', [
+        '''
+        CREATE TABLE IF NOT EXISTS admin_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            details_html TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    # Only while the admin still has the seeded placeholder, never a password set since
+    (9, 'Give the sample admin a real bcrypt hash of admin123', [
+        ('UPDATE users SET password_hash = ? WHERE email = ? AND password_hash = ?',
+         (SAMPLE_ADMIN_PASSWORD_HASH, 'admin@hallulies.com', ADMIN_PASSWORD_HASH)),
+    ]),
+]
+
+
+def applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def migrate(conn, migrations=None, verbose=True):
+    """Apply pending migrations in version order; returns the versions applied.
+
+    Each migration runs in its own IMMEDIATE transaction, so two servers
+    starting against the same file cannot both apply it.
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration[0])
+    done = applied_versions(conn)
+    applied = []
+    for version, description, statements in migrations:
+        if version in done:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+                conn.rollback()
+                continue
+            for statement in statements:
+                if isinstance(statement, tuple):
+                    conn.execute(*statement)
+                else:
+                    conn.execute(statement)
+            conn.execute('INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                         (version, description))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+        if verbose:
+            print(f"🗄️  Applied migration {version}: {description}")
+    return applied
@@ -0,0 +1,215 @@
+"""
+Durable email outbox (the email_outbox table, see migration 7)
+
+Request handlers used to send their notification emails inline, so a guest
+waited for the SMTP connect, STARTTLS, login and transfer before getting a
+201. Now they only write the message into the outbox, in the same
+transaction as the booking or testimonial it belongs to:
+
+    outbox.enqueue(conn, data['email'], subject, body_html)
+    conn.commit()
+    outbox.wake()      # after the commit, so a worker can see the row
+
+EMAIL_OUTBOX_WORKERS background threads started by start() claim up to
+EMAIL_BATCH_SIZE due messages at a time and send each batch over one pooled
+SMTP session (hallulies/mail.py), recording the outcomes in one
+transaction. A failed attempt is retried after
+EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1) seconds (with jitter, at most
+EMAIL_RETRY_MAX_DELAY); after EMAIL_MAX_ATTEMPTS the message is marked
+'dead' and left for an admin. A message whose worker died while sending is
+claimed again once its SEND_LEASE has run out. A worker that hits an
+error (database or otherwise) logs it, backs off and keeps going; the
+count is reported as worker_errors.
+
+Claims are made in an IMMEDIATE transaction, so several server processes
+can share one outbox without sending a message twice. Workers run in the
+process that called start(); with SERVER_PROCESSES > 1 that is the
+supervisor, which picks up mail queued by the workers within
+EMAIL_OUTBOX_POLL_INTERVAL seconds.
+
+EMAIL_OUTBOX=false sends queued messages from wake() in the request thread
+instead, as before (still recorded in the outbox).
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+from hallulies import db
+
+EMAIL_OUTBOX = os.environ.get('EMAIL_OUTBOX', 'true').lower() == 'true'
+EMAIL_OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', 2))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 5))
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 8))
+EMAIL_RETRY_BASE_DELAY = float(os.environ.get('EMAIL_RETRY_BASE_DELAY', 30))
+EMAIL_RETRY_MAX_DELAY = float(os.environ.get('EMAIL_RETRY_MAX_DELAY', 3600))
+
+# Seconds a claimed message belongs to its worker
+SEND_LEASE = 300
+
+STATUSES = ('pending', 'sending', 'sent', 'dead')
+
+_send_many = None
+_wakeup = threading.Event()
+_workers = []
+_local = threading.local()
+# Worker loop failures (database errors and unexpected exceptions)
+_worker_errors = 0
+_worker_errors_lock = threading.Lock()
+
+
+def enqueue(conn, to_email, subject, body_html):
+    """Add a message in conn's current transaction; returns its id"""
+    cursor = conn.execute('''
+        INSERT INTO email_outbox (to_email, subject, body_html, next_attempt_at)
+        VALUES (?, ?, ?, ?)
+    ''', (to_email, subject, body_html, time.time()))
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = []
+    pending.append(cursor.lastrowid)
+    return cursor.lastrowid
+
+
+def wake():
+    """Hand the messages this thread enqueued (and committed) to the workers"""
+    pending, _local.pending = getattr(_local, 'pending', None) or [], []
+    if EMAIL_OUTBOX or _send_many is None:
+        _wakeup.set()
+        return
+    if not pending:
+        return
+    conn = db.connect()
+    try:
+        messages = claim(conn, len(pending), pending)
+        if messages:
+            deliver(conn, messages)
+    finally:
+        conn.close()
+
+
+def retry_delay(attempts):
+    delay = min(EMAIL_RETRY_MAX_DELAY, EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    # Jitter, so messages that failed together are not retried together
+    return random.uniform(delay / 2, delay)
+
+
+def claim(conn, limit=1, message_ids=None):
+    """Lease up to limit due messages (of message_ids, if given) to the caller.
+
+    Returns a list of (id, to_email, subject, body_html, attempts).
+    """
+    now = time.time()
+    query = '''
+        SELECT id, to_email, subject, body_html, attempts FROM email_outbox
+        WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+    '''
+    params = [now]
+    if message_ids is not None:
+        query += f' AND id IN ({", ".join("?" * len(message_ids))})'
+        params += message_ids
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(query + ' ORDER BY next_attempt_at LIMIT ?', params + [limit]).fetchall()
+        conn.executemany('''
+            UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?
+            WHERE id = ?
+        ''', [(now + SEND_LEASE, row[0]) for row in rows])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return [row[:4] + (row[4] + 1,) for row in rows]
+
+
+def deliver(conn, messages):
+    """Send claimed messages over one SMTP session and record the outcomes; returns how many were sent"""
+    errors = _send_many([message[1:4] for message in messages])
+    now = time.time()
+    sent = []
+    for (message_id, to_email, _, _, attempts), error in zip(messages, errors):
+        if error is None:
+            sent.append((message_id,))
+            continue
+        error = f'{type(error).__name__}: {error}'[:1000]
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            conn.execute("UPDATE email_outbox SET status = 'dead', last_error = ? WHERE id = ?", (error, message_id))
+            print(f"❌ Email {message_id} to {to_email} failed {attempts} times, giving up: {error}")
+        else:
+            conn.execute('''
+                UPDATE email_outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?
+            ''', (now + retry_delay(attempts), error, message_id))
+            print(f"⚠️  Email {message_id} to {to_email} failed (attempt {attempts}/{EMAIL_MAX_ATTEMPTS}): {error}")
+    conn.executemany('''
+        UPDATE email_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?
+    ''', sent)
+    conn.commit()
+    return len(sent)
+
+
+def _work():
+    global _worker_errors
+    failures = 0
+    while True:
+        # Cleared before looking for work: a wake() from here on is either
+        # seen by this claim or makes the wait below return at once
+        _wakeup.clear()
+        conn = db.connect()
+        try:
+            messages = claim(conn, EMAIL_BATCH_SIZE)
+            if messages:
+                deliver(conn, messages)
+            failures = 0
+        except Exception as e:
+            # Whatever went wrong, the worker carries on; messages it had
+            # claimed are sent again once their SEND_LEASE has run out
+            failures += 1
+            with _worker_errors_lock:
+                _worker_errors += 1
+            if isinstance(e, sqlite3.Error):
+                print(f"❌ Email outbox: {e}")
+            else:
+                print(f"❌ Email outbox worker error (failure {failures} in a row):", file=sys.stderr)
+                traceback.print_exc()
+        finally:
+            # Rolls back whatever the failure left uncommitted
+            conn.close()
+        if failures:
+            time.sleep(min(EMAIL_OUTBOX_POLL_INTERVAL * 2 ** (failures - 1), SEND_LEASE))
+        elif not messages:
+            _wakeup.wait(EMAIL_OUTBOX_POLL_INTERVAL)
+
+
+def start(send_many, workers=None):
+    """Send queued messages from background threads.
+
+    send_many([(to_email, subject, body_html), ...]) returns None or the
+    error for each message (see Mailer.send_many() in hallulies/mail.py).
+    """
+    global _send_many
+    _send_many = send_many
+    if not EMAIL_OUTBOX:
+        return
+    for _ in range(EMAIL_OUTBOX_WORKERS if workers is None else workers):
+        worker = threading.Thread(target=_work, name='email-outbox', daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stats():
+    conn = db.connect()
+    try:
+        counts = dict(conn.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status').fetchall())
+        oldest = conn.execute('''
+            SELECT (julianday('now') - julianday(MIN(created_at))) * 86400 FROM email_outbox
+            WHERE status IN ('pending', 'sending')
+        ''').fetchone()[0]
+    finally:
+        conn.close()
+    return dict({status: counts.get(status, 0) for status in STATUSES},
+                workers=len(_workers), worker_errors=_worker_errors, oldest_unsent_seconds=round(oldest or 0))
@@ -0,0 +1,139 @@
+"""
+bcrypt password hashing on a bounded pool of worker threads
+
+    password_hash = passwords.hash_password(password)          # registration
+    valid, new_hash = passwords.verify(password, stored_hash)  # login
+
+A bcrypt check at cost 12 is a few hundred milliseconds of CPU. bcrypt
+releases the GIL, so it runs on PASSWORD_HASH_WORKERS threads of its own:
+a burst of logins is worked off that many at a time while the request
+workers keep serving everything else. At most PASSWORD_HASH_QUEUE more
+requests wait for a hashing thread; beyond that PasswordHasherBusy is
+raised, and the handlers answer 503 with Retry-After rather than queueing
+CPU work faster than it can be done.
+
+New hashes use BCRYPT_ROUNDS. verify() returns a new hash when the stored
+one has a different cost, so the handler can store it and passwords move
+to the current cost as users log in. An unknown user is checked against a
+dummy hash, so the response time does not tell whether an email has an
+account.
+
+bcrypt only looks at the first 72 bytes of a password; longer ones are cut
+there explicitly (bcrypt 5 refuses them).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+
+MAX_PASSWORD_BYTES = 72
+
+_executor = None
+_executor_lock = threading.Lock()
+# Running plus waiting jobs
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+_dummy_hash = None
+_stats_lock = threading.Lock()
+_counts = {'hashes': 0, 'verifications': 0, 'rehashes': 0, 'rejected': 0}
+_in_flight = 0
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+        return _executor
+
+
+def _count(name):
+    with _stats_lock:
+        _counts[name] += 1
+
+
+def _run(func, *args):
+    """func(*args) on a hashing thread; raises PasswordHasherBusy when the queue is full"""
+    global _in_flight
+    if not _slots.acquire(blocking=False):
+        _count('rejected')
+        raise PasswordHasherBusy()
+    with _stats_lock:
+        _in_flight += 1
+    try:
+        return _pool().submit(func, *args).result()
+    finally:
+        with _stats_lock:
+            _in_flight -= 1
+        _slots.release()
+
+
+def _check(password):
+    # Checked in the caller's thread, before a hashing slot is taken
+    if not isinstance(password, str):
+        raise TypeError(f'password must be a str, not {type(password).__name__}')
+
+
+def _secret(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password):
+    _count('hashes')
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+
+def cost(password_hash):
+    """The bcrypt cost of a '$2b$12$...' hash, None if it is not one"""
+    parts = password_hash.split('$')
+    return int(parts[2]) if len(parts) == 4 and parts[2].isdigit() else None
+
+
+def _verify(password, password_hash):
+    global _dummy_hash
+    _count('verifications')
+    if password_hash is None:
+        if _dummy_hash is None:
+            _dummy_hash = _hash('not a password')
+        bcrypt.checkpw(_secret(password), _dummy_hash.encode())
+        return False, None
+    try:
+        valid = bcrypt.checkpw(_secret(password), password_hash.encode())
+    except ValueError:
+        # Not a bcrypt hash
+        return False, None
+    if valid and cost(password_hash) != BCRYPT_ROUNDS:
+        _count('rehashes')
+        return True, _hash(password)
+    return valid, None
+
+
+def hash_password(password):
+    """A bcrypt hash of password at BCRYPT_ROUNDS; raises PasswordHasherBusy"""
+    _check(password)
+    return _run(_hash, password)
+
+
+def verify(password, password_hash):
+    """(valid, new_hash): new_hash is set when the password is right but was hashed at another cost.
+
+    password_hash is None for an unknown user. Raises PasswordHasherBusy, and
+    TypeError if password is not a str (handlers check JSON input first).
+    """
+    _check(password)
+    return _run(_verify, password, password_hash)
+
+
+def stats():
+    with _stats_lock:
+        counts = dict(_counts, in_flight=_in_flight)
+    return dict(counts, rounds=BCRYPT_ROUNDS, workers=PASSWORD_HASH_WORKERS, queue_limit=PASSWORD_HASH_QUEUE)
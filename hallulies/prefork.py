@@ -0,0 +1,169 @@
+"""
+Pre-fork process model (SERVER_PROCESSES > 1)
+
+A supervisor forks N worker processes. Each worker opens its own listening
+socket on PORT with SO_REUSEPORT, so the kernel spreads new connections
+across them, and runs the engine selected by SERVER_ENGINE. JSON encoding
+and SQLite reads then scale past a single interpreter's GIL.
+
+The supervisor restarts workers that die and prints per-worker request
+counters every PREFORK_STATS_INTERVAL seconds, on SIGUSR1 and at shutdown.
+Counters live in shared memory so any worker can report them too.
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', 1))
+STATS_INTERVAL = int(os.environ.get('PREFORK_STATS_INTERVAL', 60))
+RESTART_BACKOFF = 1.0
+
+# Shared request counters, one slot per worker (set up by run())
+_counters = None
+_worker_slot = None
+
+
+def supported():
+    return hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+
+def worker_request_counts():
+    """Request counts per worker slot, or None when not running pre-forked"""
+    if _counters is None:
+        return None
+    return list(_counters)
+
+
+def _counting_handler(handler_class, counters, slot):
+    """Subclass ``handler_class`` so every handled request bumps the worker's slot"""
+    lock = threading.Lock()
+
+    def handle_one_request(self):
+        self.raw_requestline = b''
+        handler_class.handle_one_request(self)
+        if self.raw_requestline:
+            with lock:
+                counters[slot] += 1
+
+    return type(handler_class.__name__, (handler_class,), {'handle_one_request': handle_one_request})
+
+
+def _worker_main(handler_class, port, host, slot):
+    from hallulies.serving import create_server
+
+    global _worker_slot
+    _worker_slot = slot
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+
+    counting_class = _counting_handler(handler_class, _counters, slot)
+    with create_server(counting_class, port, host, reuse_port=True) as httpd:
+        httpd.serve_forever()
+
+
+class Supervisor:
+    def __init__(self, handler_class, port, host, processes):
+        self.handler_class = handler_class
+        self.port = port
+        self.host = host
+        self.processes = processes
+        self.children = {}
+        self.restarts = 0
+        self.stopping = False
+        self.show_stats = False
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _worker_main(self.handler_class, self.port, self.host, slot)
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 0
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.children[pid] = (slot, time.monotonic())
+
+    def print_stats(self):
+        counts = worker_request_counts()
+        per_worker = ', '.join(f'w{slot}: {count}' for slot, count in enumerate(counts))
+        print(f"📊 Requests per worker: {per_worker} | total: {sum(counts)} | restarts: {self.restarts}")
+        sys.stdout.flush()
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def request_stats(self, signum=None, frame=None):
+        self.show_stats = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGUSR1, self.request_stats)
+
+        for slot in range(self.processes):
+            self.spawn(slot)
+        print(f"🧩 Pre-fork supervisor {os.getpid()} started {self.processes} workers (SO_REUSEPORT)")
+
+        next_stats = time.monotonic() + STATS_INTERVAL
+        while not self.stopping:
+            self.reap()
+            if self.show_stats or (STATS_INTERVAL > 0 and time.monotonic() >= next_stats):
+                self.show_stats = False
+                next_stats = time.monotonic() + STATS_INTERVAL
+                self.print_stats()
+            time.sleep(0.2)
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + 10
+        while self.children and time.monotonic() < deadline:
+            self.reap(respawn=False)
+            time.sleep(0.1)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        self.print_stats()
+        print("\nServer stopped.")
+
+    def reap(self, respawn=True):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started = self.children.pop(pid, (None, 0))
+            if slot is None or not respawn or self.stopping:
+                continue
+            print(f"💥 Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            self.restarts += 1
+            if time.monotonic() - started < RESTART_BACKOFF:
+                time.sleep(RESTART_BACKOFF)
+            self.spawn(slot)
+
+
+def run(handler_class, port, host='0.0.0.0', processes=None):
+    """Start the supervisor and block until SIGINT/SIGTERM"""
+    global _counters
+    from hallulies.serving import SERVER_ENGINE
+
+    processes = processes or SERVER_PROCESSES
+    _counters = multiprocessing.RawArray('Q', processes)
+    print(f"⚙️  Engine: {SERVER_ENGINE} x {processes} processes")
+    Supervisor(handler_class, port, host, processes).run()
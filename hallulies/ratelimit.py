@@ -0,0 +1,191 @@
+"""
+Token-bucket rate limiting
+
+A bucket holds up to ``burst`` tokens and gains ``rate`` tokens per second;
+each event takes one. Short bursts pass at once, sustained traffic is held
+to the rate.
+
+    bucket = TokenBucket(rate=1.0, burst=10)
+    bucket.acquire()              # blocks until a token is available
+    allowed, wait = bucket.try_acquire()
+
+Write and auth endpoints are limited per client IP and route with
+@rate_limited; a client that runs out gets a 429 with Retry-After:
+
+    class Handler(RoutingMixin, ResponseMixin, SimpleHTTPRequestHandler):
+        @rate_limited('auth')
+        def handle_login(self, data):
+            ...
+
+The 'auth' rule allows RATE_LIMIT_AUTH requests per minute (bursts of
+RATE_LIMIT_AUTH_BURST), 'writes' RATE_LIMIT_WRITES (RATE_LIMIT_WRITES_BURST).
+Each route keeps a bucket per client in a KeyedRateLimiter: buckets are
+kept least recently used first, and those idle long enough to have filled
+up again (i.e. no different from a new one) are dropped from that end as
+clients are checked, so memory follows the number of recently active
+clients. RATE_LIMIT_MAX_CLIENTS caps it per route regardless.
+
+Limits are per process. Behind a proxy that sets X-Forwarded-For (Render
+does), set RATE_LIMIT_TRUST_FORWARDED=true or every client shares the
+proxy's buckets. The client is then the address the proxies appended, counted
+RATE_LIMIT_TRUSTED_PROXIES entries from the right: anything further left
+came from the client itself and could change with every request.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+RATE_LIMIT = os.environ.get('RATE_LIMIT', 'true').lower() == 'true'
+RATE_LIMIT_AUTH = float(os.environ.get('RATE_LIMIT_AUTH', 10))
+RATE_LIMIT_AUTH_BURST = int(os.environ.get('RATE_LIMIT_AUTH_BURST', 5))
+RATE_LIMIT_WRITES = float(os.environ.get('RATE_LIMIT_WRITES', 30))
+RATE_LIMIT_WRITES_BURST = int(os.environ.get('RATE_LIMIT_WRITES_BURST', 10))
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 10000))
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+RATE_LIMIT_TRUSTED_PROXIES = max(1, int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 1)))
+
+# Rule name: (requests per minute, burst)
+RULES = {
+    'auth': (RATE_LIMIT_AUTH, RATE_LIMIT_AUTH_BURST),
+    'writes': (RATE_LIMIT_WRITES, RATE_LIMIT_WRITES_BURST),
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; a rate of 0 or less means unlimited"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """(True, 0) and take the tokens if they are there, else (False, seconds until they will be)"""
+        if self.rate <= 0:
+            return True, 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Take the tokens, sleeping until the bucket has them; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            allowed, wait = self.try_acquire(tokens)
+            if allowed:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class KeyedRateLimiter:
+    """A TokenBucket per key, e.g. per client IP; a rate of 0 or less means unlimited"""
+
+    def __init__(self, rate, burst=1, max_keys=None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = RATE_LIMIT_MAX_CLIENTS if max_keys is None else max_keys
+        # Seconds for an empty bucket to fill up again
+        self.refill_time = self.burst / rate if rate > 0 else 0.0
+        # Least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.swept = 0
+        self.evicted = 0
+
+    def try_acquire(self, key, tokens=1):
+        """(True, 0) if key may go ahead, else (False, seconds until it may)"""
+        if self.rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            # Full again, so no different from a new bucket
+            while self._buckets:
+                oldest = next(iter(self._buckets.values()))
+                if now - oldest.updated < self.refill_time:
+                    break
+                self._buckets.popitem(last=False)
+                self.swept += 1
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+        allowed, wait = bucket.try_acquire(tokens)
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return allowed, wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                'per_minute': round(self.rate * 60, 2),
+                'burst': self.burst,
+                'clients': len(self._buckets),
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'swept': self.swept,
+                'evicted': self.evicted,
+            }
+
+
+# Handler qualified name ("Handler.handle_login"): KeyedRateLimiter
+_limiters = {}
+
+
+def client_ip(handler):
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = handler.headers.get('X-Forwarded-For')
+        addresses = [address.strip() for address in forwarded.split(',')] if forwarded else []
+        if addresses:
+            # Each trusted proxy appends the address it was connected from
+            return addresses[max(len(addresses) - RATE_LIMIT_TRUSTED_PROXIES, 0)]
+    return (handler.client_address or ('',))[0]
+
+
+def rate_limited(rule):
+    """Answer 429 with Retry-After once the client has used up its bucket for this handler"""
+    per_minute, burst = RULES[rule]
+
+    def decorator(f):
+        limiter = _limiters[f.__qualname__] = KeyedRateLimiter(per_minute / 60, burst)
+
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            if RATE_LIMIT:
+                allowed, wait = limiter.try_acquire(client_ip(self))
+                if not allowed:
+                    self.send_json_response({'error': 'Too many requests, try again later'}, 429,
+                                            headers={'Retry-After': str(math.ceil(wait))})
+                    return
+            return f(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stats():
+    limiters = {name: limiter.stats() for name, limiter in _limiters.items()}
+    return {
+        'enabled': RATE_LIMIT,
+        'rejected': sum(limiter['rejected'] for limiter in limiters.values()),
+        'routes': limiters,
+    }
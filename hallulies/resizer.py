@@ -0,0 +1,304 @@
+"""
+On-demand image resizing: GET /img/{width}/{path}
+
+Menu items point at images of any size (image_url), so next to the
+build-time derivatives of generate_placeholders.py the API server resizes
+images under images/ when they are first requested:
+
+    <img src="/img/640/images/room2.jpeg">
+
+The width is rounded up to the next of IMAGE_RESIZE_WIDTHS (so arbitrary
+widths cannot fill the cache) and never exceeds the source's; the format is
+AVIF or WebP when the Accept header allows it, else the source's own.
+
+Decoding and encoding run in a pool of IMAGE_RESIZE_WORKERS processes, off
+the request threads and the GIL. Results are written to IMAGE_CACHE_DIR,
+keyed by source path, mtime, size, width, format and encoder settings, and
+evicted least-recently-used once the directory exceeds IMAGE_CACHE_MAX_BYTES.
+Concurrent requests for a variant that is being rendered wait for that one
+render instead of starting their own (single flight).
+
+Recency and single flight are tracked per process; with SERVER_PROCESSES > 1
+each worker process may render a variant once and keeps its own view of the
+cache directory (files written by the others are picked up when requested).
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as RenderTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from hallulies import images, static
+from hallulies.conditional import not_modified
+
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(images.DERIVED_DIR, 'resized'))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+IMAGE_RESIZE_WIDTHS = sorted(int(width) for width in os.environ.get(
+    'IMAGE_RESIZE_WIDTHS', ','.join(map(str, images.IMAGE_WIDTHS))).split(','))
+IMAGE_RESIZE_WORKERS = int(os.environ.get('IMAGE_RESIZE_WORKERS', 2))
+IMAGE_RESIZE_TIMEOUT = float(os.environ.get('IMAGE_RESIZE_TIMEOUT', 30))
+
+# Offered to clients whose Accept header lists them, in order of preference
+MODERN_FORMATS = images.available_formats(['avif', 'webp'])
+
+
+class DiskCache:
+    """Size-capped directory of files, evicted least-recently-used"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # name -> size, least recently used first
+        self._entries = None
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _load(self):
+        """Index the files already on disk, oldest first (recency is not kept across restarts)"""
+        found = []
+        for directory, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, filename))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime_ns, filename, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(found))
+        self.size = sum(self._entries.values())
+
+    def get(self, name):
+        """Contents of a cached file, or None"""
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+            entry = static.hot_file(path, stat)
+            if entry is not None:
+                body = entry.body
+            else:
+                with open(path, 'rb') as f:
+                    body = f.read()
+        except OSError:
+            body = None
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            if body is None:
+                # Evicted, possibly by another process
+                self.size -= self._entries.pop(name, 0)
+                self.misses += 1
+                return None
+            if name not in self._entries:
+                # Written by another process
+                self._entries[name] = len(body)
+                self.size += len(body)
+            self._entries.move_to_end(name)
+            self.hits += 1
+        return body
+
+    def put(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so a reader never sees half a file
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            self.size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self.stores += 1
+            evicted = []
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(self.path(old_name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            return {
+                'directory': self.directory,
+                'files': len(self._entries),
+                'size': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+
+_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Cache name -> Future of the render in progress
+_inflight = {}
+_inflight_lock = threading.Lock()
+_counters = {'renders': 0, 'coalesced': 0, 'failures': 0}
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the server process has threads (and locks) of its own
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_RESIZE_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _reset_pool(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def source_path(path):
+    """File a request path names if it is a resizable image under images/, else None"""
+    root = os.path.realpath(images.IMAGES_DIR)
+    full = os.path.realpath(path.lstrip('/'))
+    if not full.startswith(root + os.sep) or full.startswith(os.path.realpath(images.DERIVED_DIR) + os.sep):
+        return None
+    if not images.source_format(full) or not os.path.isfile(full):
+        return None
+    return full
+
+
+def snap_width(width):
+    """Smallest configured width not below width (the largest one for anything wider)"""
+    for allowed in IMAGE_RESIZE_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return IMAGE_RESIZE_WIDTHS[-1]
+
+
+def output_format(source, accept):
+    """AVIF or WebP if the Accept header lists it and Pillow can encode it, else the source's format"""
+    accept = accept or ''
+    for fmt in MODERN_FORMATS:
+        if images.CONTENT_TYPES[fmt] in accept:
+            return fmt
+    return images.source_format(source)
+
+
+def cache_name(source, stat, width, fmt):
+    key = f'{source}\0{stat.st_mtime_ns}\0{stat.st_size}\0{width}\0{images.settings_signature([width], [fmt])}'
+    return f'{hashlib.sha1(key.encode()).hexdigest()}.{fmt}'
+
+
+def resized(source, width, fmt, name):
+    """Bytes of the variant, from the disk cache or rendered once however many requests want it"""
+    body = _cache.get(name)
+    if body is not None:
+        return body
+
+    with _inflight_lock:
+        future = _inflight.get(name)
+        leader = future is None
+        if leader:
+            future = _inflight[name] = Future()
+        else:
+            _counters['coalesced'] += 1
+    if not leader:
+        return future.result(timeout=IMAGE_RESIZE_TIMEOUT)
+
+    try:
+        # The previous leader may have finished between our cache miss and now
+        body = _cache.get(name)
+        if body is None:
+            pool = _pool()
+            try:
+                body = pool.submit(images.render, source, width, fmt).result(timeout=IMAGE_RESIZE_TIMEOUT)
+            except BrokenProcessPool:
+                _reset_pool(pool)
+                raise
+            with _inflight_lock:
+                _counters['renders'] += 1
+            _cache.put(name, body)
+        future.set_result(body)
+        return body
+    except BaseException as e:
+        with _inflight_lock:
+            _counters['failures'] += 1
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[name]
+
+
+def stats():
+    with _inflight_lock:
+        counters = dict(_counters, in_progress=len(_inflight))
+    return dict(counters, disk_cache=_cache.stats(), widths=IMAGE_RESIZE_WIDTHS, workers=IMAGE_RESIZE_WORKERS,
+                formats=MODERN_FORMATS)
+
+
+class ResizedImageMixin:
+    """Route handler for GET /img/{width:int}/{path:path}"""
+
+    def handle_resized_image(self, width, path):
+        source = source_path(path)
+        if source is None:
+            self.send_json_response({'error': 'Image not found'}, 404)
+            return
+        if images.Image is None:
+            # Without Pillow the original is the only size there is
+            self.send_response(302)
+            self.send_header('Location', '/' + urllib.parse.quote(path.lstrip('/')))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        stat = os.stat(source)
+        width = snap_width(width)
+        fmt = output_format(source, self.headers.get('Accept'))
+        name = cache_name(source, stat, width, fmt)
+        headers = {
+            'ETag': f'"{name[:20]}"',
+            'Last-Modified': self.date_time_string(stat.st_mtime),
+            'Cache-Control': f'public, max-age={static.STATIC_MAX_AGE}',
+            'Vary': 'Accept',
+        }
+        if not_modified(self.headers, headers['ETag'], stat.st_mtime):
+            self.send_not_modified(headers)
+            return
+
+        try:
+            body = resized(source, width, fmt, name)
+        except RenderTimeout:
+            self.send_json_response({'error': 'Image is still being resized, try again'}, 503,
+                                    headers={'Retry-After': '1'})
+            return
+        except Exception as e:
+            print(f"❌ Resizing {source} to {width}w {fmt} failed: {e}")
+            self.send_json_response({'error': 'Image could not be resized'}, 422)
+            return
+        self.send_body(body, 200, images.CONTENT_TYPES[fmt], headers)
@@ -0,0 +1,211 @@
+"""
+Shared response path for the Hallulies request handlers
+
+Every handler class mixes in ResponseMixin ahead of SimpleHTTPRequestHandler
+so that all API responses go through send_body(), which always sets
+Content-Length. That is what makes HTTP/1.1 persistent connections safe:
+the client can find the end of each response without the server closing
+the socket.
+
+HTTP_KEEPALIVE=true switches the handlers to HTTP/1.1; idle persistent
+connections are dropped after KEEPALIVE_TIMEOUT seconds.
+
+List endpoints hand send_json_list() an iterator of row batches instead of
+a finished list. A result that fits in the first batch is sent as usual;
+a longer one is encoded and written batch by batch as it comes off the
+cursor, so the full list, its JSON string and the encoded bytes never exist
+at the same time. Streamed responses use Transfer-Encoding: chunked on
+HTTP/1.1 and end with the connection close on HTTP/1.0. On the asyncio
+engine the pieces reach the socket every ASYNC_WRITE_BUFFER bytes rather
+than batch by batch (hallulies/aioserver.py). JSON_STREAMING=false turns
+streaming off.
+
+Text and JSON bodies are compressed per Accept-Encoding on the way out
+(see hallulies/compression.py), streamed lists included.
+"""
+
+import itertools
+import json
+import os
+
+from hallulies import compression
+from hallulies.conditional import matching_etag
+
+HTTP_KEEPALIVE = os.environ.get('HTTP_KEEPALIVE', 'false').lower() == 'true'
+KEEPALIVE_TIMEOUT = float(os.environ.get('KEEPALIVE_TIMEOUT', 15))
+JSON_STREAMING = os.environ.get('JSON_STREAMING', 'true').lower() == 'true'
+
+
+class ResponseMixin:
+    protocol_version = 'HTTP/1.1' if HTTP_KEEPALIVE else 'HTTP/1.0'
+    timeout = KEEPALIVE_TIMEOUT if HTTP_KEEPALIVE else None
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body of the next response on a persistent connection waits ~40ms for
+    # a delayed ACK
+    disable_nagle_algorithm = True
+    # Validators and Cache-Control added to this request's 2xx response
+    # (set by @conditional, see hallulies/conditional.py)
+    response_headers = None
+    response_etag = None
+
+    def parse_request(self):
+        """BaseHTTPRequestHandler.parse_request(), also checking how the body is framed.
+
+        Bodies are read by Content-Length only: a malformed or negative one
+        gets a 400 and a Transfer-Encoding body a 411, before any handler
+        runs, and the connection is closed since the body cannot be skipped.
+        """
+        if not super().parse_request():
+            return False
+        if 'Transfer-Encoding' in self.headers:
+            error, status_code = 'Length Required', 411
+        elif self.content_length() is None:
+            error, status_code = 'Invalid Content-Length', 400
+        else:
+            return True
+        self.close_connection = True
+        self.send_json_response({'error': error}, status_code, headers={'Connection': 'close'})
+        return False
+
+    def content_length(self):
+        """The request's Content-Length, 0 if absent, None if invalid"""
+        value = self.headers.get('Content-Length')
+        if not value:
+            return 0
+        try:
+            length = int(value)
+        except ValueError:
+            return None
+        return length if length >= 0 else None
+
+    def read_body(self):
+        """Read the request body (if any) so the connection can be reused"""
+        content_length = self.content_length()
+        return self.rfile.read(content_length) if content_length else b''
+
+    def send_body(self, body, status_code=200, content_type='application/json', headers=None):
+        """Send a complete response with an exact Content-Length"""
+        headers = self._merge_headers(status_code, headers)
+        body = self._encode_body(body, status_code, content_type, headers)
+        self.send_response(status_code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_json_response(self, data, status_code=200, indent=None, headers=None):
+        """Send JSON response with proper headers"""
+        self.send_body(json.dumps(data, indent=indent).encode(), status_code, headers=headers)
+
+    def send_json_list(self, batches, status_code=200, headers=None):
+        """Send a JSON array from an iterator of item batches, streaming long ones"""
+        batches = iter(batches)
+        first = next(batches, [])
+        second = next(batches, None) if JSON_STREAMING else None
+        if second is None:
+            items = list(first)
+            if not JSON_STREAMING:
+                for batch in batches:
+                    items.extend(batch)
+            self.send_json_response(items, status_code, headers=headers)
+            return
+
+        chunked = self.protocol_version >= 'HTTP/1.1' and self.request_version >= 'HTTP/1.1'
+        headers = self._merge_headers(status_code, headers)
+        encoding = self.accepted_encoding('application/json', headers)
+        compressor = None
+        if encoding:
+            compressor = compression.StreamCompressor(encoding)
+            self._set_content_encoding(headers, encoding)
+        self.send_response(status_code)
+        self.send_header('Content-type', 'application/json')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # No length up front: the end of the body is the end of the connection
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        write = self._write_chunk if chunked else self.wfile.write
+        if compressor is not None:
+            raw_write = write
+
+            def write(data):
+                data = compressor.compress(data)
+                if data:
+                    raw_write(data)
+        try:
+            separator = b'['
+            for batch in itertools.chain((first, second), batches):
+                if not batch:
+                    continue
+                write(separator + b','.join(json.dumps(item).encode() for item in batch))
+                separator = b','
+            write(b']' if separator == b',' else b'[]')
+            if compressor is not None:
+                raw_write(compressor.finish())
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Exception:
+            # Headers are out; all we can do is cut the response short
+            self.close_connection = True
+            raise
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _merge_headers(self, status_code, headers):
+        if self.response_headers and 200 <= status_code < 300:
+            return dict(self.response_headers, **(headers or {}))
+        return dict(headers or {})
+
+    def accepted_encoding(self, content_type, headers, encodings=None):
+        """Coding to compress this response with, or None; adds Vary for compressible types"""
+        if not compression.compressible(content_type) or 'Content-Encoding' in headers:
+            return None
+        headers['Vary'] = 'Accept-Encoding'
+        return compression.negotiate(self.headers.get('Accept-Encoding'), encodings)
+
+    def _set_content_encoding(self, headers, encoding):
+        headers['Content-Encoding'] = encoding
+        if 'ETag' in headers:
+            headers['ETag'] = compression.variant_etag(headers['ETag'], encoding)
+
+    def _encode_body(self, body, status_code, content_type, headers):
+        """Compress body in place of the original if the client accepts it"""
+        encoding = self.accepted_encoding(content_type, headers)
+        if not encoding or status_code != 200 or len(body) < compression.COMPRESSION_MIN_SIZE:
+            return body
+        etag = headers.get('ETag')
+        if etag:
+            body = compression.cached_compress(etag, encoding, lambda: body)
+        else:
+            body = compression.compress(body, encoding)
+        self._set_content_encoding(headers, encoding)
+        return body
+
+    def send_not_modified(self, headers):
+        """304 carrying the validators; no body, so nothing to frame"""
+        if 'ETag' in headers:
+            # Echo the representation the client has (e.g. the gzip variant)
+            etag = matching_etag(self.headers.get('If-None-Match', ''), headers['ETag'])
+            headers = dict(headers, ETag=etag or headers['ETag'])
+        if compression.COMPRESSION and 'Vary' not in headers:
+            headers = dict(headers, Vary='Accept-Encoding')
+        self.send_response(304)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def send_empty_response(self, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
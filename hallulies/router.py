@@ -0,0 +1,195 @@
+"""
+Precompiled route table for the Hallulies API handlers
+
+Routes are declared once as (method, pattern, handler method name):
+
+    ROUTES = Router([
+        ('GET', '/api/menu', 'handle_get_menu'),
+        ('GET', '/api/bookings/{booking_id:int}', 'handle_get_booking'),
+    ])
+
+Static paths resolve with a single dict lookup. Parameterized routes are
+bucketed by method and by their leading literal path segments ("/api/bookings"),
+and each bucket is folded into one compiled regular expression, so resolving
+a path costs a couple of dict lookups and one regex match over a handful of
+alternatives however many routes exist. The query string is split off and
+parsed once per request.
+
+Placeholders: {name} matches one path segment, {name:int} up to 18 digits
+(passed as int; longer numbers would overflow SQLite's INTEGER, so they do
+not match and the request gets a 404) and {name:path} the rest of the path
+including slashes.
+"""
+
+import json
+import re
+import urllib.parse
+from collections import namedtuple
+
+RouteMatch = namedtuple('RouteMatch', 'handler params path query allowed')
+
+# Leading literal segments used to bucket parameterized routes
+_BUCKET_DEPTH = 2
+_PLACEHOLDER = re.compile(r'\{(\w+)(?::(\w+))?\}')
+_CONVERTERS = {
+    None: (r'[^/]+', urllib.parse.unquote),
+    'str': (r'[^/]+', urllib.parse.unquote),
+    'int': (r'\d{1,18}', int),
+    'path': (r'.+', urllib.parse.unquote),
+}
+
+
+class Router:
+    def __init__(self, routes=()):
+        self._exact = {}
+        self._dynamic = {}
+        self._compiled = {}
+        self._methods_by_path = {}
+        for method, pattern, handler in routes:
+            self.add(method, pattern, handler)
+
+    def add(self, method, pattern, handler):
+        method = method.upper()
+        if not _PLACEHOLDER.search(pattern):
+            self._exact[(method, pattern)] = handler
+            self._methods_by_path.setdefault(pattern, set()).add(method)
+        else:
+            self._dynamic.setdefault(method, []).append((pattern, handler))
+            self._compiled.pop(method, None)
+
+    def __len__(self):
+        return len(self._exact) + sum(len(routes) for routes in self._dynamic.values())
+
+    @staticmethod
+    def _bucket_key(pattern):
+        key = []
+        for segment in pattern.split('/')[1:_BUCKET_DEPTH + 1]:
+            if '{' in segment:
+                break
+            key.append(segment)
+        return tuple(key)
+
+    def _compile(self, method):
+        """Fold the parameterized routes of ``method`` into one regex per bucket"""
+        buckets = {}
+        for pattern, handler in self._dynamic.get(method, ()):
+            buckets.setdefault(self._bucket_key(pattern), []).append((pattern, handler))
+        compiled = {key: self._compile_bucket(routes) for key, routes in buckets.items()}
+        self._compiled[method] = compiled
+        return compiled
+
+    @staticmethod
+    def _compile_bucket(routes):
+        alternatives = []
+        targets = []
+        for index, (pattern, handler) in enumerate(routes):
+            converters = {}
+            regex = ''
+            position = 0
+            for placeholder in _PLACEHOLDER.finditer(pattern):
+                name, kind = placeholder.groups()
+                if kind not in _CONVERTERS:
+                    raise ValueError(f"Unknown converter '{kind}' in route {pattern}")
+                part, convert = _CONVERTERS[kind]
+                regex += re.escape(pattern[position:placeholder.start()])
+                regex += f'(?P<r{index}_{name}>{part})'
+                converters[f'r{index}_{name}'] = (name, convert)
+                position = placeholder.end()
+            regex += re.escape(pattern[position:])
+            alternatives.append(f'(?P<r{index}>{regex})')
+            targets.append((handler, converters))
+        return re.compile('|'.join(alternatives)), targets
+
+    def _match_dynamic(self, method, path):
+        buckets = self._compiled[method] if method in self._compiled else self._compile(method)
+        if not buckets:
+            return None
+        segments = path.split('/', _BUCKET_DEPTH + 1)[1:_BUCKET_DEPTH + 1]
+        for depth in range(len(segments), -1, -1):
+            bucket = buckets.get(tuple(segments[:depth]))
+            if bucket is None:
+                continue
+            regex, targets = bucket
+            match = regex.fullmatch(path)
+            if match is None:
+                continue
+            handler, converters = targets[int(match.lastgroup[1:])]
+            params = {}
+            for group, (name, convert) in converters.items():
+                params[name] = convert(match.group(group))
+            return handler, params
+        return None
+
+    def _allowed_methods(self, path):
+        allowed = set(self._methods_by_path.get(path, ()))
+        for method in self._dynamic:
+            if self._match_dynamic(method, path):
+                allowed.add(method)
+        return allowed
+
+    def resolve(self, method, raw_path):
+        """Resolve a request line to a RouteMatch, or None if no route has that path.
+
+        A path served only under other methods gives a RouteMatch whose
+        handler is None and whose ``allowed`` lists those methods.
+        """
+        path, _, query_string = raw_path.partition('?')
+        query = dict(urllib.parse.parse_qsl(query_string, keep_blank_values=True)) if query_string else {}
+
+        handler = self._exact.get((method, path))
+        if handler is not None:
+            return RouteMatch(handler, {}, path, query, None)
+        found = self._match_dynamic(method, path)
+        if found is not None:
+            return RouteMatch(found[0], found[1], path, query, None)
+
+        allowed = self._allowed_methods(path)
+        if allowed:
+            return RouteMatch(None, {}, path, query, sorted(allowed))
+        return None
+
+
+class RoutingMixin:
+    """Dispatches requests through the handler class's ``routes`` table"""
+
+    routes = Router()
+    api_prefix = '/api/'
+    query = {}
+
+    def dispatch_route(self):
+        """Run the matching handler method.
+
+        Returns False when nothing matched and the path is outside
+        ``api_prefix`` so the caller can fall back (e.g. to static files).
+        """
+        match = self.routes.resolve(self.command, self.path)
+        if match is None:
+            if not self.path.startswith(self.api_prefix):
+                return False
+            self.read_body()
+            self.send_json_response({'error': 'API endpoint not found'}, 404)
+            return True
+
+        self.query = match.query
+        if match.handler is None:
+            self.read_body()
+            self.send_json_response({'error': 'Method not allowed'}, 405,
+                                    headers={'Allow': ', '.join(match.allowed)})
+            return True
+
+        kwargs = dict(match.params)
+        if self.command in ('POST', 'PUT', 'PATCH'):
+            body = self.read_body()
+            try:
+                data = json.loads(body.decode()) if body else {}
+            except (ValueError, UnicodeDecodeError):
+                data = None
+            if not isinstance(data, dict):
+                self.send_json_response({'error': 'Invalid JSON'}, 400)
+                return True
+            kwargs['data'] = data
+        else:
+            self.read_body()
+
+        getattr(self, match.handler)(**kwargs)
+        return True
@@ -0,0 +1,179 @@
+"""
+Serving engines for the Hallulies HTTP servers
+
+SERVER_ENGINE selects how connections are handled:
+  single   - one request at a time (plain socketserver.TCPServer)
+  threaded - bounded pool of worker threads with a queue-depth limit
+  asyncio  - event loop owns the connections, handlers run on an executor
+             (see hallulies/aioserver.py)
+
+Every engine dispatches through the same handler class. SERVER_PROCESSES > 1
+runs the chosen engine in several pre-forked worker processes that share the
+port via SO_REUSEPORT (see hallulies/prefork.py).
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+
+from hallulies.responses import HTTP_KEEPALIVE
+
+SERVER_ENGINE = os.environ.get('SERVER_ENGINE', 'threaded').lower()
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 16))
+MAX_QUEUED_REQUESTS = int(os.environ.get('MAX_QUEUED_REQUESTS', 64))
+
+ENGINES = ('single', 'threaded', 'asyncio')
+
+_OVERLOADED_BODY = json.dumps({'error': 'Server busy, please retry shortly'}).encode()
+_OVERLOADED_RESPONSE = (
+    b'HTTP/1.0 503 Service Unavailable\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Content-Length: ' + str(len(_OVERLOADED_BODY)).encode() + b'\r\n'
+    b'Retry-After: 1\r\n'
+    b'Connection: close\r\n'
+    b'\r\n' + _OVERLOADED_BODY
+)
+
+
+class BoundedThreadPoolServer(socketserver.TCPServer):
+    """TCPServer that hands accepted connections to a fixed pool of worker threads.
+
+    Connections wait in a queue of at most ``max_queued`` entries; once it is
+    full new connections get an immediate 503 instead of piling up.
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=None, max_queued=None,
+                 bind_and_activate=True):
+        self.workers = workers or WORKER_THREADS
+        self.max_queued = max_queued or MAX_QUEUED_REQUESTS
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.busy_workers = 0
+        self.accepted = 0
+        self.rejected = 0
+        super().__init__(server_address, handler_class, bind_and_activate)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'http-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address))
+        except queue.Full:
+            self.reject_request(request)
+            return
+        with self._lock:
+            self.accepted += 1
+
+    def reject_request(self, request):
+        """Answer with 503 and close when the queue is full"""
+        with self._lock:
+            self.rejected += 1
+        try:
+            request.settimeout(1)
+            request.sendall(_OVERLOADED_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            request, client_address = item
+            with self._lock:
+                self.busy_workers += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._lock:
+                    self.busy_workers -= 1
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            return {
+                'engine': 'threaded',
+                'workers': self.workers,
+                'busy_workers': self.busy_workers,
+                'queued': self._queue.qsize(),
+                'max_queued': self.max_queued,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+            }
+
+    def describe(self):
+        return f'threaded ({self.workers} workers, queue limit {self.max_queued})'
+
+
+class SingleThreadServer(socketserver.TCPServer):
+    """The original one-request-at-a-time server"""
+
+    def stats(self):
+        return {'engine': 'single'}
+
+    def describe(self):
+        return 'single (one request at a time)'
+
+
+def create_server(handler_class, port, host='0.0.0.0', engine=None, reuse_port=False):
+    """Build the server selected by SERVER_ENGINE (or ``engine``)"""
+    engine = (engine or SERVER_ENGINE).lower()
+    if engine == 'asyncio':
+        from hallulies.aioserver import AsyncHTTPServer
+        return AsyncHTTPServer((host, port), handler_class, reuse_port=reuse_port)
+    if engine == 'single':
+        server = SingleThreadServer((host, port), handler_class, bind_and_activate=False)
+    elif engine == 'threaded':
+        server = BoundedThreadPoolServer((host, port), handler_class, bind_and_activate=False)
+    else:
+        raise ValueError(f"Unknown SERVER_ENGINE '{engine}', expected one of: {', '.join(ENGINES)}")
+
+    try:
+        if reuse_port:
+            server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.server_bind()
+        server.server_activate()
+    except Exception:
+        server.server_close()
+        raise
+    return server
+
+
+def serve(handler_class, port, host='0.0.0.0'):
+    """Run the configured engine (and process model) until interrupted"""
+    from hallulies import prefork
+
+    if prefork.SERVER_PROCESSES > 1 and prefork.supported():
+        prefork.run(handler_class, port, host)
+        return
+    if prefork.SERVER_PROCESSES > 1:
+        print("⚠️  SERVER_PROCESSES ignored: pre-fork needs os.fork and SO_REUSEPORT")
+
+    with create_server(handler_class, port, host) as httpd:
+        print(f"⚙️  Engine: {httpd.describe()}")
+        if HTTP_KEEPALIVE and isinstance(httpd, SingleThreadServer):
+            print("⚠️  HTTP_KEEPALIVE with the single engine: one idle connection blocks everyone else")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nServer stopped.")
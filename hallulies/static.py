@@ -0,0 +1,360 @@
+"""
+Static file responses for the Hallulies handlers
+
+StaticFileMixin replaces SimpleHTTPRequestHandler.send_head() so that every
+file goes out with a strong ETag (a hash of its content, recomputed only
+when size or mtime change), Last-Modified and a Cache-Control policy, and a
+matching If-None-Match / If-Modified-Since gets a 304 without the file being
+read. Directory redirects and listings are left to SimpleHTTPRequestHandler.
+
+Text assets (HTML, CSS, JS, SVG) are compressed per Accept-Encoding; the
+compressed bodies are cached under the file's ETag (hallulies/compression.py).
+
+Files up to STATIC_CACHE_MAX_FILE_SIZE (stylesheets, scripts, logos, the
+room photos) are kept in memory together with their headers, within a
+STATIC_CACHE_MAX_BYTES budget; a changed mtime or size makes the next
+request read the file again. Larger files are handed to the kernel with
+sendfile() instead of being copied through Python (threaded engines; the
+asyncio engine copies them through its transport writer in bounded pieces,
+see hallulies/aioserver.py).
+
+Range requests (PDF viewers seeking, resumed image downloads) get 206
+Partial Content for one range or multipart/byteranges for several, of the
+identity representation and only while If-Range still matches; files are
+advertised with Accept-Ranges: bytes.
+
+Policies: HTML revalidates on every load (no-cache) so new deployments show
+up at once; other assets may be reused for STATIC_MAX_AGE seconds.
+
+With STATIC_ROOT set to the output of build_assets.py (e.g. dist), files
+found there are served in place of the project's own: the rewritten HTML
+pages and the minified assets, whose content-hashed names (listed in its
+manifest.json) are cached for a year as immutable. Their prebuilt .br / .gz
+siblings are sent as they are instead of compressing at request time.
+"""
+
+import hashlib
+import io
+import json
+import os
+import secrets
+import socket
+import threading
+import urllib.parse
+from collections import namedtuple
+from http import HTTPStatus
+
+from hallulies import compression
+from hallulies.cache import CacheEntry, ResponseCache
+from hallulies.conditional import if_range_matches, not_modified
+
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+STATIC_CACHE_MAX_BYTES = int(os.environ.get('STATIC_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+STATIC_CACHE_MAX_FILE_SIZE = int(os.environ.get('STATIC_CACHE_MAX_FILE_SIZE', 512 * 1024))
+STATIC_SENDFILE = os.environ.get('STATIC_SENDFILE', 'true').lower() == 'true'
+
+STATIC_ROOT = os.path.abspath(os.environ['STATIC_ROOT']) if os.environ.get('STATIC_ROOT') else None
+
+HTML_CACHE_CONTROL = 'no-cache'
+# Content-hashed names never change content; a new build means new names
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+MANIFEST_NAME = 'manifest.json'
+
+# Prebuilt siblings written by build_assets.py, in order of preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+# A Range header asking for more pieces than this is ignored (full 200)
+MAX_RANGES = 16
+
+FileInfo = namedtuple('FileInfo', 'mtime_ns size etag')
+
+_file_info = {}
+_file_info_lock = threading.Lock()
+
+# Small files with their content type and headers, tagged with their path
+_hot_files = ResponseCache(max_bytes=STATIC_CACHE_MAX_BYTES, ttl=0, enabled=STATIC_CACHE_MAX_BYTES > 0)
+
+
+def file_etag(path, stat, f):
+    """Strong ETag for an open file, cached until its size or mtime change"""
+    info = _file_info.get(path)
+    if info is not None and info.mtime_ns == stat.st_mtime_ns and info.size == stat.st_size:
+        return info.etag
+    digest = hashlib.sha1()
+    for block in iter(lambda: f.read(64 * 1024), b''):
+        digest.update(block)
+    f.seek(0)
+    etag = f'"{digest.hexdigest()[:20]}"'
+    with _file_info_lock:
+        _file_info[path] = FileInfo(stat.st_mtime_ns, stat.st_size, etag)
+    return etag
+
+
+def hot_file(path, stat, describe=None):
+    """Cached CacheEntry of a small file, read on a miss; None if the file is too big to cache.
+
+    describe(path, stat, etag) supplies the entry's content type and headers.
+    """
+    if not _hot_files.enabled or stat.st_size > STATIC_CACHE_MAX_FILE_SIZE:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    entry = _hot_files.get(key)
+    if entry is not None:
+        return entry
+    # Drop the previous version of the file, if any
+    _hot_files.invalidate(path)
+    with open(path, 'rb') as f:
+        body = f.read()
+    content_type, headers = None, {}
+    if describe is not None:
+        content_type, headers = describe(path, stat, f'"{hashlib.sha1(body).hexdigest()[:20]}"')
+    _hot_files.put(key, body, content_type, headers, (path,))
+    return CacheEntry(body, content_type, headers, (path,), None, len(body))
+
+
+def parse_ranges(header, size):
+    """Sorted, merged (start, end) inclusive byte ranges of a Range header.
+
+    None means the header is ignored (another unit, malformed, too many
+    ranges); [] means none of its ranges is satisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    specs = [part.strip() for part in spec.split(',') if part.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for part in specs:
+        first, dash, last = (value.strip() for value in part.partition('-'))
+        if not dash or not (first or last) or not (first + last).isdigit():
+            return None
+        if not first:
+            # "-500": the last 500 bytes
+            if int(last) == 0:
+                continue
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size:
+            ranges.append((start, end))
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class ByteRanges:
+    """Body of a 206 response: (part head, offset, length) slices of a file or bytes"""
+
+    def __init__(self, source, parts, trailer=b''):
+        self.source = source
+        self.parts = parts
+        self.trailer = trailer
+
+    def close(self):
+        if not isinstance(self.source, bytes):
+            self.source.close()
+
+
+def stats():
+    return dict(_hot_files.stats(), max_file_size=STATIC_CACHE_MAX_FILE_SIZE, sendfile=STATIC_SENDFILE)
+
+
+def load_manifest(root):
+    """Hashed asset paths (relative to root) listed in a build_assets.py manifest"""
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as f:
+            return set(json.load(f).values())
+    except (OSError, ValueError):
+        return set()
+
+
+_fingerprinted = load_manifest(STATIC_ROOT) if STATIC_ROOT else set()
+
+
+def built_path(path):
+    """path relative to STATIC_ROOT if it lies inside it, else None"""
+    if STATIC_ROOT is None or not path.startswith(STATIC_ROOT + os.sep):
+        return None
+    return os.path.relpath(path, STATIC_ROOT).replace(os.sep, '/')
+
+
+class StaticFileMixin:
+    def translate_path(self, path):
+        translated = super().translate_path(path)
+        if STATIC_ROOT is not None:
+            built = os.path.join(STATIC_ROOT, os.path.relpath(translated, self.directory))
+            if os.path.isfile(built) or os.path.isfile(os.path.join(built, 'index.html')):
+                return built + ('/' if translated.endswith('/') else '')
+        return translated
+
+    def cache_control_for(self, path):
+        if path.endswith(('.html', '.htm')):
+            return HTML_CACHE_CONTROL
+        if built_path(path) in _fingerprinted:
+            return IMMUTABLE_CACHE_CONTROL
+        return f'public, max-age={STATIC_MAX_AGE}'
+
+    def precompressed_variants(self, path):
+        """{coding: sibling path} of the prebuilt compressed files next to path"""
+        if built_path(path) is None:
+            return {}
+        return {encoding: path + suffix for encoding, suffix in PRECOMPRESSED if os.path.isfile(path + suffix)}
+
+    def describe_file(self, path, stat, etag):
+        """Content type and validator headers of a file response"""
+        return self.guess_type(path), {
+            'ETag': etag,
+            'Last-Modified': self.date_time_string(stat.st_mtime),
+            'Cache-Control': self.cache_control_for(path),
+            'Accept-Ranges': 'bytes',
+        }
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, 'index.html')
+            if not urllib.parse.urlsplit(self.path).path.endswith('/') or not os.path.isfile(index):
+                # Trailing-slash redirect or directory listing
+                return super().send_head()
+            path = index
+        if path.endswith('/'):
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+        try:
+            stat = os.stat(path)
+            entry = hot_file(path, stat, self.describe_file)
+            f = open(path, 'rb') if entry is None else None
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+
+        try:
+            if entry is not None:
+                body, content_type, validators = entry.body, entry.content_type, dict(entry.headers)
+            else:
+                body = None
+                content_type, validators = self.describe_file(path, stat, file_etag(path, stat, f))
+            etag = validators['ETag']
+            if not_modified(self.headers, etag, stat.st_mtime):
+                if f is not None:
+                    f.close()
+                self.send_not_modified(validators)
+                return None
+
+            range_header = self.headers.get('Range')
+            if range_header is not None and if_range_matches(self.headers, etag, stat.st_mtime):
+                ranges = parse_ranges(range_header, stat.st_size)
+                if ranges is not None:
+                    return self.send_ranges(ranges, body if f is None else f, stat.st_size, content_type,
+                                            validators)
+
+            length = stat.st_size
+            precompressed = self.precompressed_variants(path)
+            encodings = tuple(encoding for encoding, _ in PRECOMPRESSED
+                              if encoding in precompressed or encoding in compression.ENCODINGS)
+            encoding = self.accepted_encoding(content_type, validators, encodings)
+            if encoding in precompressed:
+                if f is not None:
+                    f.close()
+                    f = None
+                sibling = precompressed[encoding]
+                sibling_stat = os.stat(sibling)
+                sibling_entry = hot_file(sibling, sibling_stat)
+                if sibling_entry is not None:
+                    body = sibling_entry.body
+                else:
+                    f = open(sibling, 'rb')
+                length = sibling_stat.st_size
+                self._set_content_encoding(validators, encoding)
+            elif encoding and length >= compression.COMPRESSION_MIN_SIZE:
+                body = compression.cached_compress(etag, encoding, f.read if f is not None else lambda: body)
+                if f is not None:
+                    f.close()
+                    f = None
+                length = len(body)
+                self._set_content_encoding(validators, encoding)
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(length))
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return io.BytesIO(body) if f is None else f
+        except Exception:
+            if f is not None:
+                f.close()
+            raise
+
+    def send_ranges(self, ranges, source, size, content_type, headers):
+        """206 for ranges of source (an open file or bytes), or 416 if there are none"""
+        if not ranges:
+            ByteRanges(source, []).close()
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            parts, trailer = [(b'', start, end - start + 1)], b''
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            boundary = secrets.token_hex(16)
+            parts = [(f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                      f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'.encode(), start, end - start + 1)
+                     for start, end in ranges]
+            trailer = f'\r\n--{boundary}--\r\n'.encode()
+            self.send_header('Content-type', f'multipart/byteranges; boundary={boundary}')
+        length = sum(len(head) + count for head, _, count in parts) + len(trailer)
+        self.send_header('Content-Length', str(length))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        return ByteRanges(source, parts, trailer)
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, ByteRanges):
+            for head, offset, count in source.parts:
+                if head:
+                    outputfile.write(head)
+                self.copy_range(source.source, offset, count, outputfile)
+            if source.trailer:
+                outputfile.write(source.trailer)
+        elif isinstance(source, io.BytesIO):
+            outputfile.write(source.getbuffer())
+        elif self.can_sendfile(outputfile):
+            # end_headers() has flushed the head; the kernel copies the file to the socket
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+
+    def copy_range(self, source, offset, count, outputfile):
+        if isinstance(source, bytes):
+            outputfile.write(memoryview(source)[offset:offset + count])
+        elif self.can_sendfile(outputfile):
+            self.connection.sendfile(source, offset, count)
+        else:
+            source.seek(offset)
+            while count > 0:
+                block = source.read(min(count, 64 * 1024))
+                if not block:
+                    break
+                outputfile.write(block)
+                count -= len(block)
+
+    def can_sendfile(self, outputfile):
+        return STATIC_SENDFILE and isinstance(self.connection, socket.socket) and outputfile is self.wfile
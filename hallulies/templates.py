@@ -0,0 +1,210 @@
+"""
+Email templates, parsed and compiled once per process
+
+    body_html = templates.render('booking_confirmation.html', guest_name='Ama', ...)
+
+Templates live in hallulies/email_templates/ (EMAIL_TEMPLATES_DIR) and use a
+small subset of the Jinja syntax:
+
+    {{ name }}                                  the value, HTML-escaped
+    {% if name %}...{% else %}...{% endif %}    on the value's truthiness
+    {% for item in name %}...{% endfor %}       once per value, as {{ item }}
+    {% include "style.css" %}                   another template, inlined
+    {% extends "layout.html" %}                 first tag only; the
+    {% block content %}...{% endblock %}        template's blocks replace
+                                                the layout's
+
+Includes and layouts are resolved the first time a template is used and the
+result is compiled to one Python function that joins constant strings and
+escaped values, so rendering a message no longer re-parses or re-formats
+kilobytes of markup and CSS. Values are never interpreted as markup unless
+they are wrapped in Markup, e.g. another template's output:
+
+    templates.render('admin_digest.html', items=templates.Markup(entries), ...)
+"""
+
+import html
+import os
+import re
+import threading
+
+EMAIL_TEMPLATES_DIR = os.environ.get('EMAIL_TEMPLATES_DIR',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email_templates'))
+
+_TOKEN = re.compile(r'(\{\{.*?\}\}|\{%.*?%\})', re.S)
+_NAME = re.compile(r'[A-Za-z_]\w*$')
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Markup(str):
+    """Text that already is HTML, inserted as is"""
+
+
+def _escape(value):
+    if value is None:
+        return ''
+    if isinstance(value, Markup):
+        return value
+    return html.escape(str(value))
+
+
+def _loop(context, name, values):
+    """The context for each pass of a for loop"""
+    for value in values or ():
+        yield dict(context, **{name: value})
+
+
+def _name(words, template):
+    if len(words) != 2 or not _NAME.match(words[1]):
+        raise TemplateError(f'{template}: expected {{% {words[0]} <name> %}}')
+    return words[1]
+
+
+def _filename(words, template):
+    if len(words) != 2 or len(words[1]) < 3 or words[1][0] not in '"\'' or words[1][-1] != words[1][0]:
+        raise TemplateError(f'{template}: expected {{% {words[0]} "<template>" %}}')
+    return words[1][1:-1]
+
+
+def _parse(tokens, template, end=()):
+    """Nodes up to one of the end tags; returns (nodes, end tag found)"""
+    nodes = []
+    for token in tokens:
+        if token.startswith('{{'):
+            name = token[2:-2].strip()
+            if not _NAME.match(name):
+                raise TemplateError(f'{template}: bad variable {token}')
+            nodes.append(('var', name))
+        elif token.startswith('{%'):
+            words = token[2:-2].split() or ['']
+            tag = words[0]
+            if tag in end:
+                return nodes, tag
+            if tag == 'if':
+                name = _name(words, template)
+                body, closing = _parse(tokens, template, ('else', 'endif'))
+                orelse = _parse(tokens, template, ('endif',))[0] if closing == 'else' else []
+                nodes.append(('if', name, body, orelse))
+            elif tag == 'for':
+                if len(words) != 4 or words[2] != 'in' or not (_NAME.match(words[1]) and _NAME.match(words[3])):
+                    raise TemplateError(f'{template}: expected {{% for <name> in <name> %}}')
+                nodes.append(('for', words[1], words[3], _parse(tokens, template, ('endfor',))[0]))
+            elif tag == 'block':
+                nodes.append(('block', _name(words, template), _parse(tokens, template, ('endblock',))[0]))
+            elif tag in ('include', 'extends'):
+                nodes.append((tag, _filename(words, template)))
+            else:
+                raise TemplateError(f'{template}: unexpected {token}')
+        elif token:
+            nodes.append(('text', token))
+    if end:
+        raise TemplateError(f'{template}: missing {{% {end[-1]} %}}')
+    return nodes, None
+
+
+def _read(name):
+    if os.path.basename(name) != name or name.startswith('.'):
+        raise TemplateError(f'Bad template name {name!r}')
+    with open(os.path.join(EMAIL_TEMPLATES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def _tree(name, blocks, seen):
+    """The template's nodes with includes, layout and blocks resolved"""
+    if name in seen:
+        raise TemplateError(f'{name} includes or extends itself')
+    seen += (name,)
+    nodes = _parse(iter(_TOKEN.split(_read(name))), name)[0]
+    significant = [node for node in nodes if node[0] != 'text' or node[1].strip()]
+    if significant and significant[0][0] == 'extends':
+        # The closest template's block wins, as in Jinja
+        own = {node[1]: node[2] for node in nodes if node[0] == 'block'}
+        return _tree(significant[0][1], dict(own, **blocks), seen)
+    return _resolve(nodes, blocks, name, seen)
+
+
+def _resolve(nodes, blocks, name, seen):
+    resolved = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'include':
+            resolved.extend(_tree(node[1], {}, seen))
+        elif kind == 'extends':
+            raise TemplateError(f'{name}: {{% extends %}} must come first')
+        elif kind == 'block':
+            resolved.extend(_resolve(blocks.get(node[1], node[2]), blocks, name, seen))
+        elif kind == 'if':
+            resolved.append(('if', node[1], _resolve(node[2], blocks, name, seen),
+                             _resolve(node[3], blocks, name, seen)))
+        elif kind == 'for':
+            resolved.append(('for', node[1], node[2], _resolve(node[3], blocks, name, seen)))
+        else:
+            resolved.append(node)
+    return resolved
+
+
+def _expression(nodes):
+    """Python expression for the nodes: one join() of constants and escaped values"""
+    parts = []
+    text = []
+    for node in nodes:
+        if node[0] == 'text':
+            text.append(node[1])
+            continue
+        if text:
+            parts.append(repr(''.join(text)))
+            text = []
+        if node[0] == 'var':
+            parts.append(f'escape(context[{node[1]!r}])')
+        elif node[0] == 'for':
+            # The comprehension's own context shadows the outer one
+            parts.append(f"''.join([{_expression(node[3])} for context in loop(context, {node[1]!r}, "
+                         f"context[{node[2]!r}])])")
+        else:
+            parts.append(f'({_expression(node[2])} if context.get({node[1]!r}) else {_expression(node[3])})')
+    if text:
+        parts.append(repr(''.join(text)))
+    if len(parts) < 2:
+        return parts[0] if parts else "''"
+    return "''.join((" + ', '.join(parts) + '))'
+
+
+class Template:
+    def __init__(self, name):
+        self.name = name
+        self.source = 'def render(context, escape=escape, loop=loop):\n    return ' + _expression(_tree(name, {}, ()))
+        namespace = {'escape': _escape, 'loop': _loop}
+        exec(compile(self.source, f'<template {name}>', 'exec'), namespace)
+        self._render = namespace['render']
+
+    def render(self, /, **context):
+        """The template filled in; a missing value raises KeyError"""
+        return self._render(context)
+
+
+def get(name):
+    """The compiled template, loaded on first use"""
+    template = _compiled.get(name)
+    if template is None:
+        with _lock:
+            template = _compiled.get(name)
+            if template is None:
+                template = _compiled[name] = Template(name)
+    return template
+
+
+def render(name, /, **context):
+    return get(name).render(**context)
+
+
+def preload():
+    """Compile every template now so that a broken one fails at startup"""
+    for name in sorted(os.listdir(EMAIL_TEMPLATES_DIR)):
+        if name.endswith('.html'):
+            get(name)
@@ -0,0 +1,90 @@
+"""
+JWT verification with a cache of already verified tokens
+
+    TOKENS = tokens.TokenVerifier(SECRET_KEY)
+    payload = TOKENS.decode(token)    # raises jwt.InvalidTokenError like jwt.decode()
+
+The admin dashboard sends the same bearer token with every request, and
+each one used to pay for jwt.decode(): base64 and JSON decoding, the HMAC
+and the claim checks. A TokenVerifier remembers the payload of every token
+it has verified, keyed by the token's SHA-256, in an LRU of at most
+JWT_CACHE_SIZE entries, so a repeat costs one hash and a dict lookup.
+
+An entry is only used until the token's exp claim; after that the token
+goes through jwt.decode() again, which rejects it as expired. Tokens that
+fail verification are never cached, so garbage cannot push out good
+entries.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 1024))
+
+
+class TokenVerifier:
+    def __init__(self, secret, algorithms=('HS256',), max_entries=None):
+        self.secret = secret
+        self.algorithms = list(algorithms)
+        self.max_entries = JWT_CACHE_SIZE if max_entries is None else max_entries
+        # sha256(token) -> (payload, exp or None)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.failures = 0
+
+    def decode(self, token):
+        """The verified payload of token (a fresh dict); raises jwt.InvalidTokenError"""
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is not None and entry[1] <= time.time():
+                    del self._entries[key]
+                    self.expired += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[0])
+            self.misses += 1
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=self.algorithms)
+        except jwt.InvalidTokenError:
+            with self._lock:
+                self.failures += 1
+            raise
+        if self.max_entries > 0:
+            exp = payload.get('exp')
+            with self._lock:
+                self._entries[key] = (payload, exp if isinstance(exp, (int, float)) else None)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return dict(payload)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'failures': self.failures,
+            }
@@ -0,0 +1,84 @@
+"""
+Run requests through a handler class without a socket, for the unit tests
+
+    response = http_testing.request(Handler, 'GET', '/api/menu', {'Accept-Encoding': 'gzip'})
+    response.status, response.headers['ETag'], response.body
+
+The handler reads the raw request from a BytesIO and writes its response
+into another; http.client parses the result (undoing chunked framing) and
+the raw bytes are kept for checks on the framing itself. temporary_database() points hallulies.db at a fresh,
+migrated database file for handlers that query it, and load_script()
+imports one of the server scripts (api-server.py) to test its handlers.
+"""
+
+import contextlib
+import http.client
+import importlib.util
+import io
+import os
+import tempfile
+from collections import namedtuple
+from unittest import mock
+
+from hallulies import db, migrations
+
+Response = namedtuple('Response', 'status headers body raw')
+
+
+class _Socket:
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, mode):
+        return io.BytesIO(self._data)
+
+
+def request(handler_class, method, path, headers=None, body=b'', version='HTTP/1.1', directory=None):
+    headers = dict(headers or {})
+    if body:
+        headers['Content-Length'] = str(len(body))
+    head = f'{method} {path} {version}\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    raw = send(handler_class, head.encode() + b'\r\n' + body, directory)
+    response = http.client.HTTPResponse(_Socket(raw), method=method)
+    response.begin()
+    return Response(response.status, response.headers, response.read(), raw)
+
+
+def send(handler_class, raw_request, directory=None):
+    """The raw bytes handler_class writes in answer to raw_request"""
+    handler = handler_class.__new__(handler_class)
+    handler.server = None
+    handler.request = None
+    handler.connection = None
+    handler.client_address = ('127.0.0.1', 50000)
+    handler.directory = directory or os.getcwd()
+    handler.rfile = io.BytesIO(raw_request)
+    handler.wfile = io.BytesIO()
+    handler.close_connection = True
+    handler.log_message = lambda *args: None
+    handler.handle_one_request()
+    return handler.wfile.getvalue()
+
+
+@contextlib.contextmanager
+def temporary_database():
+    """Yields a db.ConnectionManager for a migrated database in a temporary directory"""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = db.ConnectionManager(os.path.join(directory, 'test.db'))
+        conn = manager.connect()
+        migrations.migrate(conn, verbose=False)
+        conn.close()
+        try:
+            with mock.patch.object(db, '_default', manager):
+                yield manager
+        finally:
+            manager.close_all()
+
+
+def load_script(filename):
+    """Import a server script whose name is not a module name, e.g. 'api-server.py'"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
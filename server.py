@@ -1,6 +1,4 @@
 import http.server
-import socketserver
-import json
 import os
 import threading
 import time
@@ -8,6 +6,10 @@ import urllib.request
 import urllib.error
 from urllib.parse import parse_qs
 
+from hallulies import serving
+from hallulies.responses import ResponseMixin
+from hallulies.static import StaticFileMixin
+
 # Use the PORT environment variable provided by Render, default to 8000
 PORT = int(os.environ.get('PORT', 8000))
 
@@ -48,12 +50,10 @@ def start_self_ping():
         print(f"🚀 Self-ping thread started - Interval: {PING_INTERVAL} seconds")
     else:
         print("⏭️ Self-ping disabled")
-class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+class CustomHTTPRequestHandler(ResponseMixin, StaticFileMixin, http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
+        post_data = self.read_body().decode('utf-8')
         if self.path.startswith('/process-'):
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            
             # Parse the form data
             parsed_data = parse_qs(post_data)
             
@@ -64,15 +64,10 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             }
             
             # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            self.send_json_response(response_data)
         else:
             # For other POST requests, return 404
-            self.send_response(404)
-            self.end_headers()
+            self.send_empty_response(404)
             
     def do_GET(self):
         if self.path == '/config.js':
@@ -86,10 +81,7 @@ window.EMAILJS_CONFIG = {{
     serviceId: '{service_id}'
 }};
 """
-            self.send_response(200)
-            self.send_header('Content-type', 'application/javascript')
-            self.end_headers()
-            self.wfile.write(config_content.encode('utf-8'))
+            self.send_body(config_content.encode('utf-8'), content_type='application/javascript')
         elif self.path == '/health':
             # Health check endpoint for self-ping
             health_data = {
@@ -98,11 +90,7 @@ window.EMAILJS_CONFIG = {{
                 "uptime": time.strftime('%Y-%m-%d %H:%M:%S'),
                 "server": "Hallulies-Website-Python-Server"
             }
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(health_data).encode('utf-8'))
+            self.send_json_response(health_data)
         else:
             # Serve static files
             super().do_GET()
@@ -131,11 +119,6 @@ print(f"🌐 Server URL detected: {server_url}")
 start_self_ping()
 
 # Create the server
-with socketserver.TCPServer(("0.0.0.0", PORT), Handler) as httpd:
-    print(f"Server running at http://0.0.0.0:{PORT}/")
-    print("Press Ctrl+C to stop the server")
-    
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\nServer stopped.")
\ No newline at end of file
+print(f"Server running at http://0.0.0.0:{PORT}/")
+print("Press Ctrl+C to stop the server")
+serving.serve(Handler, PORT)
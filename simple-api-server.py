@@ -1,18 +1,18 @@
 import http.server
-import socketserver
 import os
-import json
-import sqlite3
 from datetime import datetime, timedelta
 import jwt
 import hashlib
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import ssl
 import os
 from dotenv import load_dotenv
 
+from hallulies import db, digest, mail, migrations, outbox, passwords, serving, templates
+from hallulies.conditional import PUBLIC_CACHE_CONTROL, conditional
+from hallulies.ratelimit import rate_limited
+from hallulies.responses import ResponseMixin
+from hallulies.router import Router, RoutingMixin
+from hallulies.static import StaticFileMixin
+
 # Load environment variables
 load_dotenv()
 
@@ -26,224 +26,44 @@ EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', 'hallulies6@gmail.com')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')  # Use app password for Gmail
 
-# Database setup
-# Email utility functions
-def send_email(to_email, subject, body_html):
-    """Send an email using SMTP"""
-    if not EMAIL_HOST_PASSWORD:
-        print("Warning: EMAIL_HOST_PASSWORD not set. Email sending disabled.")
-        return False
-    
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_HOST_USER
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add body to email
-        msg.attach(MIMEText(body_html, 'html'))
-        
-        # Create SMTP session
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        server.starttls()  # Enable TLS encryption
-        server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(EMAIL_HOST_USER, to_email, text)
-        server.quit()
-        
-        return True
-    except Exception as e:
-        print(f"Email sending failed: {str(e)}")
-        return False
+MAILER = mail.Mailer(EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, EMAIL_USE_TLS)
 
-def send_booking_confirmation_email(booking_data, to_email):
-    """Send booking confirmation email"""
+# Emails are queued in the request's transaction and sent by hallulies/outbox.py
+def queue_booking_confirmation_email(conn, booking_data, to_email):
+    """Queue the booking confirmation email in conn's transaction"""
     subject = f"Booking Confirmation - {booking_data['guest_name']}"
     
-    body_html = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: linear-gradient(90deg, #d2691e, #8b4513); color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; }}
-            .details {{ background: #f9f9f9; padding: 15px; margin: 15px 0; }}
-            .footer {{ background: #f0f0f0; padding: 15px; text-align: center; margin-top: 20px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Booking Confirmation</h1>
-                <p>Hallulies Hotel & Restaurant/Bar</p>
-            </div>
-            <div class="content">
-                <h2>Hello {booking_data['guest_name']},</h2>
-                <p>Thank you for your booking at Hallulies Hotel & Restaurant/Bar. Your reservation has been confirmed.</p>
-                
-                <div class="details">
-                    <h3>Booking Details:</h3>
-                    <p><strong>Check-in:</strong> {booking_data['checkin_date']}</p>
-                    <p><strong>Check-out:</strong> {booking_data['checkout_date']}</p>
-                    <p><strong>Room Type:</strong> {booking_data['room_type']}</p>
-                    <p><strong>Guests:</strong> {booking_data['adults']} Adults, {booking_data['children']} Children</p>
-                    <p><strong>Email:</strong> {booking_data['email']}</p>
-                    <p><strong>Phone:</strong> {booking_data['phone']}</p>
-                    {f'<p><strong>Special Requests:</strong> {booking_data['special_requests']}</p>' if booking_data.get('special_requests') else ''}
-                </div>
-                
-                <p>If you have any questions or need to make changes to your reservation, please contact us at <a href="mailto:hallulies6@gmail.com">hallulies6@gmail.com</a> or call 0247533518.</p>
-                
-                <p>We look forward to welcoming you!</p>
-                
-                <p>Best regards,<br>The Hallulies Team</p>
-            </div>
-            <div class="footer">
-                <p>Hallulies Hotel & Restaurant/Bar<br>Asufufu-Sunyani, Ghana</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    body_html = templates.render('booking_confirmation.html', **booking_data)
     
-    return send_email(to_email, subject, body_html)
+    return outbox.enqueue(conn, to_email, subject, body_html)
 
-def send_testimonial_notification_email(testimonial_data):
-    """Send notification email to admin when a new testimonial is submitted"""
+def queue_testimonial_notification_email(conn, testimonial_data):
+    """Buffer the admin's notification of a new testimonial for the next digest, in conn's transaction"""
     subject = f"New Testimonial Submitted - {testimonial_data['name']}"
     
-    body_html = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; }}
-            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-            .header {{ background: linear-gradient(90deg, #d2691e, #8b4513); color: white; padding: 20px; text-align: center; }}
-            .content {{ padding: 20px; }}
-            .testimonial {{ background: #f9f9f9; padding: 15px; margin: 15px 0; }}
-            .footer {{ background: #f0f0f0; padding: 15px; text-align: center; margin-top: 20px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>New Testimonial Submission</h1>
-                <p>Hallulies Hotel & Restaurant/Bar</p>
-            </div>
-            <div class="content">
-                <h2>A new testimonial has been submitted:</h2>
-                
-                <div class="testimonial">
-                    <p><strong>Name:</strong> {testimonial_data['name']}</p>
-                    <p><strong>Location:</strong> {testimonial_data.get('location', 'N/A')}</p>
-                    <p><strong>Title:</strong> {testimonial_data['title']}</p>
-                    <p><strong>Rating:</strong> {testimonial_data['rating']}/5 stars</p>
-                    <p><strong>Content:</strong> {testimonial_data['content']}</p>
-                </div>
-                
-                <p>Please log in to the admin panel to review and approve this testimonial.</p>
-            </div>
-            <div class="footer">
-                <p>Hallulies Hotel & Restaurant/Bar<br>Asufufu-Sunyani, Ghana</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return send_email(EMAIL_HOST_USER, subject, body_html)
+    return digest.notify(conn, EMAIL_HOST_USER, subject, 'testimonial_notification', testimonial_data)
 
 def init_database():
-    conn = sqlite3.connect('hallulies.db')
-    cursor = conn.cursor()
-    
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            guest_name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            phone TEXT,
-            checkin_date DATE NOT NULL,
-            checkout_date DATE NOT NULL,
-            room_type TEXT NOT NULL,
-            adults INTEGER DEFAULT 1,
-            children INTEGER DEFAULT 0,
-            special_requests TEXT,
-            status TEXT DEFAULT 'pending',
-            total_amount REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS testimonials (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            location TEXT,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            rating INTEGER NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS menu_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            category TEXT NOT NULL,
-            price REAL NOT NULL,
-            discounted_price REAL,
-            ingredients TEXT,
-            allergens TEXT,
-            tags TEXT,
-            image_url TEXT,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Insert sample admin user (password: admin123)
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (username, email, password_hash, role)
-        VALUES (?, ?, ?, ?)
-    ''', ('admin', 'admin@hallulies.com', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.PZvO.S', 'admin'))
-    
-    # Insert sample menu items
-    sample_menu_items = [
-        ('Bruschetta Trio', 'Fresh tomatoes, basil, garlic on ciabatta', 'appetizers', 35.0, 26.0, 'Ciabatta bread, tomatoes, basil, garlic, olive oil', 'Gluten', 'vegetarian,gluten-free', ''),
-        ('Seared Scallops', 'Pan-seared Atlantic scallops with cauliflower purée', 'appetizers', 45.0, 34.0, 'Atlantic scallops, cauliflower, pancetta, truffle oil', 'Milk', 'seafood,gluten-free', ''),
-        ('Herb-Crusted Rack of Lamb', 'New Zealand lamb with rosemary crust and mint jus', 'mains', 85.0, 68.0, 'New Zealand lamb, fresh herbs, mint, root vegetables', 'Milk,Gluten', 'meat', ''),
-        ('Wild Mushroom Risotto', 'Creamy arborio rice with wild forest mushrooms', 'mains', 42.0, None, 'Arborio rice, wild mushrooms, vegetable stock, white wine', 'Milk', 'vegetarian,vegan,gluten-free', '')
-    ]
-    
-    cursor.executemany('''
-        INSERT OR IGNORE INTO menu_items (name, description, category, price, discounted_price, ingredients, allergens, tags, image_url)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_menu_items)
-    
-    conn.commit()
+    conn = db.connect()
+    migrations.migrate(conn)
     conn.close()
 
-class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
+# API routes: (method, path pattern, handler method)
+ROUTES = Router([
+    ('POST', '/api/auth/login', 'handle_login'),
+    ('GET', '/api/bookings', 'handle_get_bookings'),
+    ('POST', '/api/bookings', 'handle_create_booking'),
+    ('GET', '/api/testimonials', 'handle_get_testimonials'),
+    ('POST', '/api/testimonials', 'handle_create_testimonial'),
+    ('GET', '/api/menu', 'handle_get_menu'),
+    ('POST', '/api/contact', 'handle_contact_form'),
+    ('GET', '/api/analytics/dashboard', 'handle_get_dashboard_analytics'),
+    ('GET', '/api/docs', 'handle_api_docs'),
+])
+
+class SimpleAPIHandler(RoutingMixin, ResponseMixin, StaticFileMixin, http.server.SimpleHTTPRequestHandler):
+    routes = ROUTES
+    
     def end_headers(self):
         # Add CORS headers to all responses
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -252,83 +72,52 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
         super().end_headers()
     
     def do_OPTIONS(self):
-        self.send_response(200)
-        self.end_headers()
+        self.send_empty_response(200)
     
     def do_GET(self):
-        if self.path.startswith('/api/'):
-            # API Routes
-            if self.path == '/api/docs':
-                self.handle_api_docs()
-            elif self.path == '/api/menu':
-                self.handle_get_menu()
-            elif self.path == '/api/testimonials':
-                self.handle_get_testimonials()
-            elif self.path == '/api/bookings':
-                self.handle_get_bookings()
-            elif self.path == '/api/analytics/dashboard':
-                self.handle_get_dashboard_analytics()
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
+        if not self.dispatch_route():
             # Static file serving
             super().do_GET()
     
     def do_POST(self):
-        if self.path.startswith('/api/'):
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length) if content_length > 0 else b''
-            
-            try:
-                data = json.loads(post_data.decode()) if post_data else {}
-            except json.JSONDecodeError:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Invalid JSON'}).encode())
-                return
-            
-            # API Routes
-            if self.path == '/api/auth/login':
-                self.handle_login(data)
-            elif self.path == '/api/testimonials':
-                self.handle_create_testimonial(data)
-            elif self.path == '/api/contact':
-                self.handle_contact_form(data)
-            elif self.path == '/api/bookings':
-                self.handle_create_booking(data)
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'API endpoint not found'}).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
+        if not self.dispatch_route():
+            self.read_body()
+            self.send_empty_response(404)
     
     # Handler methods
+    @rate_limited('auth')
     def handle_login(self, data):
         email = data.get('email')
         password = data.get('password')
         
         if not email or not password:
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Email and password required'}).encode())
+            self.send_json_response({'error': 'Email and password required'}, 400)
+            return
+        if not isinstance(email, str) or not isinstance(password, str):
+            self.send_json_response({'error': 'Email and password must be strings'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT id, username, email, password_hash, role FROM users WHERE email = ?', (email,))
         user = cursor.fetchone()
         conn.close()
         
-        # Simple password check (in production, use proper hashing)
-        if user and user[3] == '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.PZvO.S':  # bcrypt hash of "admin123"
+        try:
+            valid, new_hash = passwords.verify(password, user[3] if user else None)
+        except passwords.PasswordHasherBusy:
+            self.send_json_response({'error': 'Too many logins in progress, try again'}, 503,
+                                    headers={'Retry-After': '1'})
+            return
+        
+        if new_hash:
+            # Hashed at an earlier BCRYPT_ROUNDS
+            conn = db.connect()
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, user[0]))
+            conn.commit()
+            conn.close()
+        
+        if valid:
             token = jwt.encode({
                 'user_id': user[0],
                 'username': user[1],
@@ -337,10 +126,7 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'exp': datetime.utcnow() + timedelta(hours=24)
             }, SECRET_KEY, algorithm='HS256')
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({
+            self.send_json_response({
                 'token': token,
                 'user': {
                     'id': user[0],
@@ -348,15 +134,13 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
                     'email': user[2],
                     'role': user[4]
                 }
-            }).encode())
+            })
         else:
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Invalid credentials'}).encode())
+            self.send_json_response({'error': 'Invalid credentials'}, 401)
     
+    @conditional('menu_items', cache_control=PUBLIC_CACHE_CONTROL)
     def handle_get_menu(self):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM menu_items WHERE is_active = 1 ORDER BY category, name')
         menu_items = cursor.fetchall()
@@ -379,15 +163,13 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'created_at': item[11]
             })
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(menu_list).encode())
+        self.send_json_response(menu_list)
     
+    @conditional('testimonials', cache_control=PUBLIC_CACHE_CONTROL)
     def handle_get_testimonials(self):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM testimonials WHERE status = "approved" ORDER BY created_at DESC')
+        cursor.execute("SELECT * FROM testimonials WHERE status = 'approved' ORDER BY created_at DESC")
         testimonials = cursor.fetchall()
         conn.close()
         
@@ -404,21 +186,16 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'created_at': testimonial[7]
             })
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(testimonial_list).encode())
+        self.send_json_response(testimonial_list)
     
+    @rate_limited('writes')
     def handle_create_testimonial(self, data):
         required_fields = ['name', 'title', 'content', 'rating']
         if not all(field in data for field in required_fields):
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Missing required fields'}).encode())
+            self.send_json_response({'error': 'Missing required fields'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO testimonials (name, location, title, content, rating)
@@ -429,9 +206,8 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
         ))
         
         testimonial_id = cursor.lastrowid
-        conn.commit()
         
-        # Send notification email to admin
+        # Notify the admin once the testimonial is committed
         testimonial_data = {
             'name': data['name'],
             'location': data.get('location', ''),
@@ -439,22 +215,18 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
             'content': data['content'],
             'rating': data['rating']
         }
-        email_sent = send_testimonial_notification_email(testimonial_data)
-        
+        queue_testimonial_notification_email(conn, testimonial_data)
+        conn.commit()
         conn.close()
-        
-        self.send_response(201)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
+        outbox.wake()
         response_data = {
             'message': 'Testimonial submitted successfully',
             'testimonial_id': testimonial_id
         }
-        if not email_sent:
-            response_data['warning'] = 'Testimonial submitted but admin notification email failed to send.'
         
-        self.wfile.write(json.dumps(response_data).encode())
+        self.send_json_response(response_data, 201)
     
+    @rate_limited('writes')
     def handle_contact_form(self, data):
         # Extract contact form data
         name = data.get('name', '')
@@ -464,82 +236,31 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
         message = data.get('message', '')
         
         if not name or not email or not message:
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Name, email, and message are required'}).encode())
+            self.send_json_response({'error': 'Name, email, and message are required'}, 400)
             return
         
-        # Send email notification to admin
-        subject = f"New Contact Message - {name}"
-        body_html = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(90deg, #d2691e, #8b4513); color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .message {{ background: #f9f9f9; padding: 15px; margin: 15px 0; }}
-                .footer {{ background: #f0f0f0; padding: 15px; text-align: center; margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>New Contact Message</h1>
-                    <p>Hallulies Hotel & Restaurant/Bar</p>
-                </div>
-                <div class="content">
-                    <h2>You have received a new message:</h2>
-                    
-                    <div class="message">
-                        <p><strong>From:</strong> {name}</p>
-                        <p><strong>Email:</strong> {email}</p>
-                        <p><strong>Phone:</strong> {phone}</p>
-                        <p><strong>Subject:</strong> {subject}</p>
-                        <p><strong>Message:</strong> {message}</p>
-                    </div>
-                    
-                    <p>Please respond to this inquiry as soon as possible.</p>
-                </div>
-                <div class="footer">
-                    <p>Hallulies Hotel & Restaurant/Bar<br>Asufufu-Sunyani, Ghana</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Send email to admin
-        email_sent = send_email(EMAIL_HOST_USER, subject, body_html)
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        response_data = {'message': 'Message sent successfully'}
-        if not email_sent:
-            response_data['warning'] = 'Message saved but email notification failed. Please check server logs.'
-        self.wfile.write(json.dumps(response_data).encode())
+        # Notify the admin in the next digest
+        conn = db.connect()
+        digest.notify(conn, EMAIL_HOST_USER, f"New Contact Message - {name}", 'contact_message',
+                      {'name': name, 'email': email, 'phone': phone, 'subject': subject, 'message': message})
+        conn.commit()
+        conn.close()
+        outbox.wake()
+        self.send_json_response({'message': 'Message sent successfully'})
     
     def handle_get_bookings(self):
         # For security reasons, only authenticated admin users can view bookings
         # For now, return empty array
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps([]).encode())
+        self.send_json_response([])
     
+    @rate_limited('writes')
     def handle_create_booking(self, data):
         required_fields = ['guest_name', 'email', 'phone', 'checkin_date', 'checkout_date', 'room_type']
         if not all(field in data for field in required_fields):
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Missing required fields'}).encode())
+            self.send_json_response({'error': 'Missing required fields'}, 400)
             return
         
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         try:
@@ -556,9 +277,8 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
             ))
             
             booking_id = cursor.lastrowid
-            conn.commit()
             
-            # Send booking confirmation email
+            # Booking confirmation email, committed with the booking
             booking_data = {
                 'id': booking_id,
                 'guest_name': data['guest_name'],
@@ -572,32 +292,24 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
                 'special_requests': data.get('special_requests', '')
             }
             
-            email_sent = send_booking_confirmation_email(booking_data, data['email'])
-            
+            queue_booking_confirmation_email(conn, booking_data, data['email'])
+            conn.commit()
             conn.close()
-            
-            self.send_response(201)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
+            outbox.wake()
             response_data = {
                 'message': 'Booking created successfully',
                 'booking_id': booking_id
             }
-            if not email_sent:
-                response_data['warning'] = 'Booking created but confirmation email failed to send. Please contact us directly.'
             
-            self.wfile.write(json.dumps(response_data).encode())
+            self.send_json_response(response_data, 201)
             
         except Exception as e:
             conn.close()
             print(f"Error creating booking: {str(e)}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'Failed to create booking'}).encode())
+            self.send_json_response({'error': 'Failed to create booking'}, 500)
     
     def handle_get_dashboard_analytics(self):
-        conn = sqlite3.connect('hallulies.db')
+        conn = db.connect()
         cursor = conn.cursor()
         
         # Get total bookings
@@ -612,11 +324,11 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
         recent_bookings = cursor.fetchone()[0]
         
         # Get approved testimonials count
-        cursor.execute('SELECT COUNT(*) FROM testimonials WHERE status = "approved"')
+        cursor.execute("SELECT COUNT(*) FROM testimonials WHERE status = 'approved'")
         approved_testimonials = cursor.fetchone()[0]
         
         # Get average rating
-        cursor.execute('SELECT AVG(rating) FROM testimonials WHERE status = "approved"')
+        cursor.execute("SELECT AVG(rating) FROM testimonials WHERE status = 'approved'")
         avg_rating = cursor.fetchone()[0] or 0
         
         conn.close()
@@ -629,10 +341,7 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
             'revenue_30_days': 124560  # Mock data
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(analytics).encode())
+        self.send_json_response(analytics)
     
     def handle_api_docs(self):
         docs = {
@@ -667,23 +376,24 @@ class SimpleAPIHandler(http.server.SimpleHTTPRequestHandler):
             }
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(docs, indent=2).encode())
+        self.send_json_response(docs, indent=2)
 
 if __name__ == "__main__":
     # Initialize database
     init_database()
+    # Compile the email templates now rather than in the first request that needs one
+    templates.preload()
+    digest.start()
+    
+    if MAILER.enabled:
+        outbox.start(MAILER.send_many)
+    else:
+        print("⚠️  EMAIL_HOST_PASSWORD not set: emails stay queued in the email_outbox table")
     
     # Start server
-    with socketserver.TCPServer(("0.0.0.0", PORT), SimpleAPIHandler) as httpd:
-        print(f"🚀 Hallulies Hotel API Server running at http://0.0.0.0:{PORT}")
-        print("🔐 Admin login: admin@hallulies.com / admin123")
-        print("📚 API Documentation: http://0.0.0.0:8000/api/docs")
-        print("Press Ctrl+C to stop the server")
-        
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\nServer stopped.")
\ No newline at end of file
+    print(f"🚀 Hallulies Hotel API Server running at http://0.0.0.0:{PORT}")
+    print("🔐 Admin login: admin@hallulies.com / admin123")
+    print("📚 API Documentation: http://0.0.0.0:8000/api/docs")
+    print("Press Ctrl+C to stop the server")
+    
+    serving.serve(SimpleAPIHandler, PORT)
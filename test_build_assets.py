@@ -0,0 +1,146 @@
+"""
+Tests for the CSS and JavaScript minifiers (build_assets.py)
+
+Checks that comments and redundant whitespace go while strings, regex
+literals and template literals come through untouched, that line breaks
+automatic semicolon insertion depends on are kept, and that CSS only loses
+the last semicolon of a block outside quoted strings. With Node.js
+installed, minified scripts are also run and must print what the
+originals print.
+
+Run with: python -m unittest test_build_assets
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import build_assets
+from build_assets import minify_css, minify_js
+
+NODE = shutil.which('node')
+
+SCRIPT = r'''
+// Strings, regexes and template literals that look like comments or code
+const url = "https://example.com/menu"; /* trailing */
+const quote = 'it\'s /* not */ a comment';
+const slashes = /\/\/[^/]*\/+/g, klass = /[/]}]/;
+const ratio = 10 / 2 / 5
+const templated = `Room ${ [1, 2].map(n => `#${n}`).join(', ') } { not a block; }`
+const object = {key: `${ {a: 1}.a }`}
+let total = 1
+total
+++total
+const arrow = () => {
+    return /a b/.test('a b') ? `ok
+multi-line` : 'no'
+}
+function plain() { return 'x' + "  y  " }
+console.log(url, quote, slashes.source, klass.test('}'), ratio, templated, object.key, total, arrow(), plain())
+console.log('a;}'.replace(/;}/g, '}'), "c: d", typeof /x/)
+'''
+
+
+class MinifyCssTests(unittest.TestCase):
+    def test_whitespace_and_comments(self):
+        source = '''
+            /* Layout */
+            .nav a:hover ,  .nav a:focus {
+                color: #333 ;
+                margin: 0 auto;
+            }
+            @media (max-width: 600px) { .hero > h1 { font-size: 2rem; } }
+        '''
+        self.assertEqual(minify_css(source),
+                         '.nav a:hover,.nav a:focus{color:#333;margin:0 auto}'
+                         '@media (max-width: 600px){.hero>h1{font-size:2rem}}\n')
+
+    def test_strings_untouched(self):
+        source = '''.quote::before { content: ";}"; }
+            .path { background: url("img/a; }.png") ; font-family: 'Noto Sans', "x: y" }
+            .escaped { content: "\\";}" ; }'''
+        self.assertEqual(minify_css(source),
+                         '.quote::before{content:";}"}'
+                         '.path{background:url("img/a; }.png");font-family:\'Noto Sans\',"x: y"}'
+                         '.escaped{content:"\\";}"}\n')
+
+    def test_idempotent_on_site_stylesheet(self):
+        with open(os.path.join(build_assets.ROOT, 'styles.css'), encoding='utf-8') as f:
+            once = minify_css(f.read())
+        self.assertEqual(minify_css(once), once)
+
+    def test_unterminated(self):
+        for source in ('a { content: "x }', '/* a { }'):
+            with self.subTest(source):
+                with self.assertRaises(ValueError):
+                    minify_css(source)
+
+
+class MinifyJsTests(unittest.TestCase):
+    def test_literals_untouched(self):
+        cases = {
+            'var a = "//not a comment" ;': 'var a="//not a comment";',
+            "var a = '/* nor this */' + b": "var a='/* nor this */' + b",
+            'a + +b - -c': 'a + +b - -c',
+            'x = /[/]\\/*/g.test( y )': 'x=/[/]\\/*/g.test(y)',
+            'return /a b/': 'return /a b/',
+            'x = a / b / c': 'x=a / b / c',
+            'x = `a  ${ b } c ${ `d ${ e }` }`': 'x=`a  ${b} c ${`d ${e}`}`',
+            'x = `{ ${ {y: 1}.y } }`': 'x=`{ ${{y:1}.y} }`',
+        }
+        for source, expected in cases.items():
+            with self.subTest(source):
+                self.assertEqual(minify_js(source), expected + '\n')
+
+    def test_newlines_kept_where_statements_end(self):
+        cases = {
+            'a = 1\nb = 2': 'a=1\nb=2',
+            'return\nvalue': 'return\nvalue',
+            'a\n++b': 'a\n++b',
+            'f(\n  1,\n  2\n)\n': 'f(1,2)',
+            'if (x) {\n  y()\n}\nz()': 'if(x){y()}\nz()',
+            'a = 1; // note\nb = 2': 'a=1;b=2',
+            'a = 1 /* one\nline */ b = 2': 'a=1\nb=2',
+        }
+        for source, expected in cases.items():
+            with self.subTest(source):
+                self.assertEqual(minify_js(source), expected + '\n')
+
+    def test_unterminated(self):
+        for source in ('a = "x', 'a = `x ${y}', '/* a'):
+            with self.subTest(source):
+                with self.assertRaises(ValueError):
+                    minify_js(source)
+
+
+@unittest.skipUnless(NODE, 'needs Node.js')
+class NodeRoundTripTests(unittest.TestCase):
+    def run_script(self, source):
+        with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+            f.write(source)
+        self.addCleanup(os.remove, f.name)
+        result = subprocess.run([NODE, f.name], capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_minified_script_prints_the_same(self):
+        minified = minify_js(SCRIPT)
+        self.assertLess(len(minified), len(SCRIPT))
+        self.assertEqual(self.run_script(minified), self.run_script(SCRIPT))
+
+    def test_site_scripts_still_parse(self):
+        for name in ('script.js', 'keep-alive.js'):
+            with self.subTest(name):
+                with open(os.path.join(build_assets.ROOT, name), encoding='utf-8') as f:
+                    minified = minify_js(f.read())
+                with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+                    f.write(minified)
+                self.addCleanup(os.remove, f.name)
+                result = subprocess.run([NODE, '--check', f.name], capture_output=True, text=True, timeout=30)
+                self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for the response cache (hallulies/cache.py)
+
+Checks LRU eviction, expiry and tag invalidation of ResponseCache, that a
+response built while its tag was invalidated is not stored, and that a
+@conditional @cached handler notices a write made behind its back (another
+connection, as another process would) through the table_versions ETag.
+
+Run with: python -m unittest test_cache
+"""
+
+import http.server
+import json
+import sqlite3
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import cache, db
+from hallulies.cache import CachingMixin, ResponseCache, cached
+from hallulies.conditional import conditional
+from hallulies.responses import ResponseMixin
+
+
+class MenuHandler(CachingMixin, ResponseMixin, http.server.BaseHTTPRequestHandler):
+    calls = 0
+    status = 200
+
+    def do_GET(self):
+        self.handle_get_menu()
+
+    @conditional('menu_items')
+    @cached('menu_items')
+    def handle_get_menu(self):
+        type(self).calls += 1
+        conn = db.connect()
+        names = [row[0] for row in conn.execute('SELECT name FROM menu_items ORDER BY id')]
+        conn.close()
+        self.send_json_response(names, self.status)
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def test_hit_after_put(self):
+        responses = ResponseCache(max_bytes=1024, ttl=0, enabled=True)
+        self.assertIsNone(responses.get('/api/menu'))
+        self.assertTrue(responses.put('/api/menu', b'[]', 'application/json', {'ETag': '"a"'}, ('menu_items',)))
+        entry = responses.get('/api/menu')
+        self.assertEqual((entry.body, entry.headers), (b'[]', {'ETag': '"a"'}))
+        self.assertEqual((responses.hits, responses.misses), (1, 1))
+
+    def test_invalidate_only_drops_tagged_entries(self):
+        responses = ResponseCache(max_bytes=1024, ttl=0, enabled=True)
+        responses.put('/api/menu', b'menu', 'application/json', None, ('menu_items',))
+        responses.put('/api/testimonials', b'testimonials', 'application/json', None, ('testimonials',))
+        responses.invalidate('menu_items')
+        self.assertIsNone(responses.get('/api/menu'))
+        self.assertIsNotNone(responses.get('/api/testimonials'))
+        self.assertEqual(responses.size, len(b'testimonials'))
+
+    def test_response_built_across_an_invalidation_is_not_stored(self):
+        responses = ResponseCache(max_bytes=1024, ttl=0, enabled=True)
+        generations = responses.generations(('menu_items',))
+        responses.invalidate('menu_items')
+        self.assertFalse(responses.put('/api/menu', b'old', 'application/json', None, ('menu_items',),
+                                       generations))
+        self.assertIsNone(responses.get('/api/menu'))
+
+    def test_least_recently_used_evicted(self):
+        responses = ResponseCache(max_bytes=40, ttl=0, enabled=True)
+        for key in 'abcd':
+            responses.put(key, b'x' * 10, None, None, ())
+        responses.get('a')
+        responses.put('e', b'x' * 10, None, None, ())
+        self.assertIsNone(responses.get('b'))
+        self.assertIsNotNone(responses.get('a'))
+        self.assertEqual(responses.size, 40)
+        # More than a quarter of the budget is not worth caching
+        self.assertFalse(responses.put('f', b'x' * 11, None, None, ()))
+
+    def test_entries_expire(self):
+        responses = ResponseCache(max_bytes=1024, ttl=10, enabled=True)
+        with mock.patch('hallulies.cache.time.monotonic', return_value=100.0):
+            responses.put('/api/menu', b'[]', None, None, ())
+        with mock.patch('hallulies.cache.time.monotonic', return_value=109.0):
+            self.assertIsNotNone(responses.get('/api/menu'))
+        with mock.patch('hallulies.cache.time.monotonic', return_value=110.0):
+            self.assertIsNone(responses.get('/api/menu'))
+        self.assertEqual(responses.size, 0)
+
+
+class CachedHandlerTests(unittest.TestCase):
+    def setUp(self):
+        self.database = self.enterContext(http_testing.temporary_database())
+        self.enterContext(mock.patch.object(cache, '_default', ResponseCache(max_bytes=1024 * 1024, ttl=0,
+                                                                             enabled=True)))
+        MenuHandler.calls = 0
+
+    def get(self, headers=None):
+        return http_testing.request(MenuHandler, 'GET', '/api/menu', headers)
+
+    def test_second_request_is_a_hit(self):
+        first, second = self.get(), self.get()
+        self.assertEqual((first.headers['X-Cache'], second.headers['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(MenuHandler.calls, 1)
+
+    def test_write_elsewhere_changes_the_etag_and_misses(self):
+        first = self.get()
+        # Another process: its own connection, no cache.invalidate() here
+        conn = sqlite3.connect(self.database.path)
+        conn.execute("INSERT INTO menu_items (name, category, price) VALUES ('Chef Special', 'mains', 50)")
+        conn.commit()
+        conn.close()
+        second = self.get()
+        self.assertEqual(second.headers['X-Cache'], 'MISS')
+        self.assertNotEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertIn('Chef Special', json.loads(second.body))
+        self.assertEqual(MenuHandler.calls, 2)
+
+    def test_invalidate_drops_the_entry(self):
+        self.get()
+        cache.invalidate('menu_items')
+        self.assertEqual(self.get().headers['X-Cache'], 'MISS')
+        self.assertEqual(MenuHandler.calls, 2)
+
+    def test_only_200_is_stored(self):
+        with mock.patch.object(MenuHandler, 'status', 503):
+            self.assertIsNone(self.get().headers['X-Cache'])
+        self.assertEqual(self.get().headers['X-Cache'], 'MISS')
+        self.assertEqual(MenuHandler.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Tests for Content-Encoding negotiation (hallulies/compression.py)
+
+Checks Accept-Encoding parsing (q-values, q=0, "*", x-gzip), the variant
+ETags of compressed representations, that an incremental gzip stream can be
+decoded piece by piece, and that responses are compressed only when they
+should be, with Vary and the variant ETag set and a 304 echoing the
+variant the client holds.
+
+Run with: python -m unittest test_compression
+"""
+
+import gzip
+import http.server
+import json
+import unittest
+import zlib
+from unittest import mock
+
+import http_testing
+from hallulies import compression, conditional
+from hallulies.responses import ResponseMixin
+
+BOTH = ('br', 'gzip')
+ITEMS = [{'id': number, 'name': f'Jollof rice {number}', 'price': 45} for number in range(100)]
+
+
+class ItemsHandler(ResponseMixin, http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.handle_get_items()
+
+    @conditional.conditional('menu_items')
+    def handle_get_items(self):
+        items = ITEMS if self.path == '/items' else ITEMS[:1]
+        self.send_json_response(items)
+
+
+class NegotiationTests(unittest.TestCase):
+    def test_negotiate(self):
+        cases = {
+            'gzip': 'gzip',
+            'gzip, br': 'br',
+            'br;q=0.5, gzip': 'gzip',
+            'br;q=0, gzip;q=0.1': 'gzip',
+            'gzip;q=0': None,
+            'x-gzip': 'gzip',
+            '*': 'br',
+            '*, br;q=0': 'gzip',
+            'identity': None,
+            'deflate, zstd': None,
+            'GZIP': 'gzip',
+            'gzip;q=bad': None,
+            '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertEqual(compression.negotiate(header, BOTH), expected)
+
+    def test_only_offered_encodings(self):
+        self.assertEqual(compression.negotiate('br, gzip', ('gzip',)), 'gzip')
+        self.assertIsNone(compression.negotiate('br', ('gzip',)))
+
+    def test_disabled(self):
+        with mock.patch.object(compression, 'COMPRESSION', False):
+            self.assertIsNone(compression.negotiate('gzip', BOTH))
+            self.assertFalse(compression.compressible('application/json'))
+
+    def test_compressible(self):
+        for content_type, expected in (('application/json', True), ('text/css', True),
+                                       ('image/svg+xml', True), ('image/jpeg', False), (None, False)):
+            with self.subTest(content_type):
+                self.assertEqual(compression.compressible(content_type), expected)
+
+    def test_variant_etags(self):
+        self.assertEqual(compression.variant_etag('"abc"', 'gzip'), '"abc-gzip"')
+        self.assertEqual(compression.base_etag('"abc-gzip"'), '"abc"')
+        self.assertEqual(compression.base_etag('"abc-br"'), '"abc"')
+        self.assertEqual(compression.base_etag('"abc"'), '"abc"')
+
+    def test_stream_compressor_output_decodes_as_it_arrives(self):
+        compressor = compression.StreamCompressor('gzip')
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for piece in (b'[1,', b'2,', b'3]'):
+            self.assertEqual(decoder.decompress(compressor.compress(piece)), piece)
+        decoder.decompress(compressor.finish())
+        self.assertTrue(decoder.eof)
+
+
+class CompressedResponseTests(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(http_testing.temporary_database())
+
+    def get(self, path='/items', headers=None):
+        return http_testing.request(ItemsHandler, 'GET', path, headers)
+
+    def test_gzip_response_has_variant_etag(self):
+        plain = self.get()
+        compressed = self.get(headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(plain.headers['Content-Encoding'])
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(compressed.body)), ITEMS)
+        self.assertEqual(compressed.headers['Content-Length'], str(len(compressed.body)))
+        self.assertEqual(compressed.headers['ETag'], compression.variant_etag(plain.headers['ETag'], 'gzip'))
+        for response in (plain, compressed):
+            self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_small_response_not_compressed(self):
+        response = self.get('/items/first', {'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers['Content-Encoding'])
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_304_echoes_the_clients_variant(self):
+        compressed = self.get(headers={'Accept-Encoding': 'gzip'})
+        again = self.get(headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+        self.assertEqual(again.status, 304)
+        self.assertEqual(again.headers['ETag'], compressed.headers['ETag'])
+        self.assertEqual(again.headers['Vary'], 'Accept-Encoding')
+
+    def test_compressed_body_cached_per_etag(self):
+        first = self.get(headers={'Accept-Encoding': 'gzip'})
+        hits = compression.stats()['hits']
+        second = self.get(headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(compression.stats()['hits'], hits + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests for conditional GET (hallulies/conditional.py)
+
+Checks If-None-Match matching (lists, weak tags, "*", compressed variants),
+that it takes precedence over If-Modified-Since, and that API lists and
+static files answer a matching request with a bodiless 304 carrying their
+validators, without running the handler.
+
+Run with: python -m unittest test_conditional
+"""
+
+import http.server
+import os
+import tempfile
+import unittest
+
+import http_testing
+from hallulies import conditional, db
+from hallulies.responses import ResponseMixin
+from hallulies.static import StaticFileMixin
+
+ETAG = '"0123456789abcdef0123"'
+
+
+class MenuHandler(ResponseMixin, http.server.BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        self.handle_get_menu()
+
+    @conditional.conditional('menu_items', cache_control='public, max-age=60')
+    def handle_get_menu(self):
+        type(self).calls += 1
+        conn = db.connect()
+        count = conn.execute('SELECT COUNT(*) FROM menu_items').fetchone()[0]
+        conn.close()
+        self.send_json_response({'items': count})
+
+
+class StaticHandler(ResponseMixin, StaticFileMixin, http.server.SimpleHTTPRequestHandler):
+    pass
+
+
+class ValidatorTests(unittest.TestCase):
+    def test_etag_matches(self):
+        cases = {
+            ETAG: True,
+            f'"other", {ETAG}': True,
+            f'W/{ETAG}': True,
+            '*': True,
+            f'{ETAG[:-1]}-gzip"': True,
+            f'{ETAG[:-1]}-br"': True,
+            '"other"': False,
+            f'{ETAG[:-1]}-zstd"': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertEqual(conditional.etag_matches(header, ETAG), expected)
+
+    def test_matching_etag_returns_the_clients_variant(self):
+        gzip_etag = f'{ETAG[:-1]}-gzip"'
+        self.assertEqual(conditional.matching_etag(f'"other", {gzip_etag}', ETAG), gzip_etag)
+        self.assertIsNone(conditional.matching_etag('"other"', ETAG))
+
+    def test_if_none_match_takes_precedence(self):
+        later = conditional.http_date(2000000000)
+        headers = {'If-None-Match': '"other"', 'If-Modified-Since': later}
+        self.assertFalse(conditional.not_modified(headers, ETAG, 1700000000))
+        self.assertTrue(conditional.not_modified({'If-Modified-Since': later}, ETAG, 1700000000))
+
+    def test_if_modified_since(self):
+        modified = 1700000000.5
+        self.assertTrue(conditional.not_modified({'If-Modified-Since': conditional.http_date(1700000000)},
+                                                 ETAG, modified))
+        self.assertFalse(conditional.not_modified({'If-Modified-Since': conditional.http_date(1699999999)},
+                                                  ETAG, modified))
+        self.assertFalse(conditional.not_modified({'If-Modified-Since': 'yesterday'}, ETAG, modified))
+        self.assertFalse(conditional.not_modified({}, ETAG, modified))
+
+    def test_parse_http_date(self):
+        self.assertEqual(conditional.parse_http_date('Sun, 06 Nov 1994 08:49:37 GMT'), 784111777)
+        self.assertIsNone(conditional.parse_http_date('not a date'))
+
+    def test_make_etag_is_quoted_and_stable(self):
+        self.assertEqual(conditional.make_etag('a', 1), conditional.make_etag('a', 1))
+        self.assertNotEqual(conditional.make_etag('a', 1), conditional.make_etag('a', 2))
+        self.assertRegex(conditional.make_etag('a', 1), r'^"[0-9a-f]{20}"$')
+
+
+class ApiNotModifiedTests(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(http_testing.temporary_database())
+        MenuHandler.calls = 0
+
+    def get(self, headers=None):
+        return http_testing.request(MenuHandler, 'GET', '/api/menu', headers)
+
+    def test_matching_etag_gets_304_without_running_the_handler(self):
+        first = self.get()
+        self.assertEqual(first.status, 200)
+        self.assertEqual(first.headers['Cache-Control'], 'public, max-age=60')
+        second = self.get({'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status, 304)
+        self.assertEqual(second.body, b'')
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.headers['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(MenuHandler.calls, 1)
+
+    def test_write_changes_the_etag(self):
+        first = self.get()
+        conn = db.connect()
+        conn.execute("UPDATE menu_items SET price = price + 1 WHERE id = 1")
+        conn.commit()
+        conn.close()
+        second = self.get({'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status, 200)
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+
+    def test_if_modified_since(self):
+        first = self.get()
+        second = self.get({'If-Modified-Since': first.headers['Last-Modified']})
+        self.assertEqual(second.status, 304)
+
+
+class StaticNotModifiedTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        with open(os.path.join(self.directory, 'style.css'), 'w') as f:
+            f.write('body { color: #333; }\n')
+
+    def get(self, headers=None):
+        return http_testing.request(StaticHandler, 'GET', '/style.css', headers, directory=self.directory)
+
+    def test_matching_etag_gets_304(self):
+        first = self.get()
+        self.assertEqual(first.status, 200)
+        self.assertEqual(first.body, b'body { color: #333; }\n')
+        second = self.get({'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status, 304)
+        self.assertEqual(second.body, b'')
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.headers['Last-Modified'], first.headers['Last-Modified'])
+
+    def test_changed_file_gets_200(self):
+        first = self.get()
+        path = os.path.join(self.directory, 'style.css')
+        with open(path, 'w') as f:
+            f.write('body { color: #000; }\n')
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1000000))
+        second = self.get({'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status, 200)
+        self.assertEqual(second.body, b'body { color: #000; }\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
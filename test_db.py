@@ -0,0 +1,194 @@
+"""
+Tests for per-thread SQLite connections (hallulies/db.py)
+
+Runs ConnectionManager against a database in a temporary directory on a
+fake clock. Checks that each thread keeps reusing its own connection, that
+close() hands it back with uncommitted work rolled back, that an idle or
+failed connection is health-checked and reopened when the check fails,
+that the configured journal mode and per-connection pragmas are applied,
+and what stats() reports.
+
+Run with: python -m unittest test_db
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from hallulies import db
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+class ConnectionManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = os.path.join(directory, 'hallulies.db')
+        self.clock = Clock()
+        self.enterContext(mock.patch.object(db, 'time', self.clock))
+        self.manager = self.manager_for()
+        conn = self.manager.connect()
+        conn.execute('CREATE TABLE bookings (id INTEGER PRIMARY KEY, name TEXT)')
+        conn.commit()
+        conn.close()
+
+    def manager_for(self, **kwargs):
+        manager = db.ConnectionManager(self.path, health_check_interval=30, **kwargs)
+        self.addCleanup(manager.close_all)
+        return manager
+
+    def in_thread(self, fn):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(fn()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def count(self):
+        # Through a separate connection, so only committed rows are seen
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0]
+
+
+class ReuseTests(ConnectionManagerTestCase):
+    def test_connection_reused_by_its_thread(self):
+        first = self.manager.connect()
+        first.close()
+        self.assertIs(self.manager.connect(), first)
+        # Still open after close()
+        self.assertEqual(first.execute('SELECT 1').fetchone(), (1,))
+
+    def test_one_connection_per_thread(self):
+        mine = self.manager.connect()
+        theirs = self.in_thread(self.manager.connect)
+        self.assertIsNot(theirs, mine)
+        self.assertEqual(self.manager.opened, 2)
+
+    def test_close_all_really_closes(self):
+        conn = self.manager.connect()
+        self.manager.close_all()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+        self.assertIsNot(self.manager.connect(), conn)
+
+
+class RollbackTests(ConnectionManagerTestCase):
+    def test_uncommitted_work_rolled_back_on_close(self):
+        conn = self.manager.connect()
+        conn.execute("INSERT INTO bookings (name) VALUES ('Ama')")
+        conn.close()
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.manager.rollbacks, 1)
+
+    def test_committed_work_kept(self):
+        conn = self.manager.connect()
+        conn.execute("INSERT INTO bookings (name) VALUES ('Ama')")
+        conn.commit()
+        conn.close()
+        self.assertEqual((self.count(), self.manager.rollbacks), (1, 0))
+
+    def test_transaction_left_open_rolled_back_on_checkout(self):
+        conn = self.manager.connect()
+        # A handler that raised without calling close()
+        conn.execute("INSERT INTO bookings (name) VALUES ('Ama')")
+        self.assertIs(self.manager.connect(), conn)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual((self.count(), self.manager.rollbacks), (0, 1))
+
+
+class HealthCheckTests(ConnectionManagerTestCase):
+    def test_idle_connection_reopened_when_broken(self):
+        conn = self.manager.connect()
+        conn.close()
+        conn.really_close()
+        self.clock.now += 31
+        fresh = self.manager.connect()
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(fresh.execute('SELECT COUNT(*) FROM bookings').fetchone(), (0,))
+        self.assertEqual((self.manager.reconnects, self.manager.failed_health_checks, self.manager.opened), (1, 1, 2))
+
+    def test_idle_connection_kept_when_healthy(self):
+        conn = self.manager.connect()
+        conn.close()
+        with mock.patch.object(self.manager, '_healthy', wraps=self.manager._healthy) as healthy:
+            # Not checked until it has been idle for the interval
+            self.clock.now += 30
+            self.manager.connect().close()
+            healthy.assert_not_called()
+            self.clock.now += 3600
+            self.assertIs(self.manager.connect(), conn)
+            healthy.assert_called_once_with(conn)
+        self.assertEqual(self.manager.reconnects, 0)
+
+    def test_connection_checked_after_a_database_error(self):
+        conn = self.manager.connect()
+        with self.assertRaises(sqlite3.DatabaseError):
+            conn.execute('SELECT * FROM no_such_table')
+        self.assertTrue(conn.suspect)
+        conn.close()
+        self.assertIs(self.manager.connect(), conn)
+        self.assertFalse(conn.suspect)
+        with self.assertRaises(sqlite3.DatabaseError):
+            conn.cursor().execute('SELECT * FROM no_such_table')
+        conn.close()
+        conn.really_close()
+        self.assertIsNot(self.manager.connect(), conn)
+        self.assertEqual(self.manager.reconnects, 1)
+
+
+class PragmaTests(ConnectionManagerTestCase):
+    def pragma(self, conn, name):
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_defaults(self):
+        conn = self.manager.connect()
+        self.assertEqual((self.manager.active_journal_mode, self.pragma(conn, 'journal_mode')), ('WAL', 'wal'))
+        # NORMAL
+        self.assertEqual(self.pragma(conn, 'synchronous'), 1)
+
+    def test_configured_modes_applied_to_every_connection(self):
+        self.path = os.path.join(os.path.dirname(self.path), 'configured.db')
+        manager = self.manager_for(journal_mode='truncate', synchronous='full', timeout=2, cache_size=-2000,
+                                   mmap_size=0)
+        for conn in (manager.connect(), self.in_thread(manager.connect)):
+            self.assertEqual(self.pragma(conn, 'journal_mode'), 'truncate')
+            # FULL
+            self.assertEqual(self.pragma(conn, 'synchronous'), 2)
+            self.assertEqual(self.pragma(conn, 'busy_timeout'), 2000)
+            self.assertEqual(self.pragma(conn, 'cache_size'), -2000)
+            self.assertEqual(self.pragma(conn, 'mmap_size'), 0)
+        stats = manager.stats()
+        self.assertEqual((stats['journal_mode'], stats['synchronous']), ('TRUNCATE', 'FULL'))
+
+    def test_unknown_modes_rejected(self):
+        with self.assertRaises(ValueError):
+            db.ConnectionManager(self.path, journal_mode='FAST')
+        with self.assertRaises(ValueError):
+            db.ConnectionManager(self.path, synchronous='SOMETIMES')
+
+
+class StatsTests(ConnectionManagerTestCase):
+    def test_stats(self):
+        for _ in range(3):
+            self.manager.connect().close()
+        self.in_thread(lambda: self.manager.connect().close())
+        stats = self.manager.stats()
+        self.assertEqual(stats['path'], self.path)
+        # The other thread has exited and its connection is no longer counted
+        self.assertEqual((stats['connections'], stats['opened'], stats['checkouts']), (1, 2, 5))
+        self.assertEqual(stats['reuse_ratio'], 0.6)
+        self.assertEqual((stats['reconnects'], stats['rollbacks']), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
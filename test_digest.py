@@ -0,0 +1,208 @@
+"""
+Tests for admin notification digests (hallulies/digest.py)
+
+Runs against a temporary database on a fake clock. Checks that
+notifications go straight to the outbox when digests are off or urgent,
+that buffered ones are held for ADMIN_DIGEST_WINDOW and then sent as one
+digest per recipient of at most ADMIN_DIGEST_MAX_ITEMS, and that the
+digest thread backs off after errors and keeps going.
+
+Run with: python -m unittest test_digest
+"""
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import digest, outbox
+
+ADMIN = 'admin@hallulies.com'
+WINDOW = 300
+CONTACT = {'name': 'Ama <b>', 'email': 'ama@example.com', 'phone': '0241234567', 'subject': 'Rooms',
+           'message': 'Do you have a sea view?'}
+TESTIMONIAL = {'name': 'Kofi', 'title': 'Lovely stay', 'content': 'Great jollof', 'rating': 5, 'location': ''}
+
+
+class Stop(BaseException):
+    """Ends the digest loop under test (the loop itself catches Exception)"""
+
+
+class FakeTime:
+    def __init__(self, now=1700000000.0, max_sleeps=None):
+        self.now = now
+        self.sleeps = []
+        self.max_sleeps = max_sleeps
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.max_sleeps is not None and len(self.sleeps) >= self.max_sleeps:
+            raise Stop
+
+
+class DigestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.database = self.enterContext(http_testing.temporary_database())
+        self.clock = FakeTime()
+        self.enterContext(mock.patch.object(digest, 'time', self.clock))
+        self.enterContext(mock.patch.object(outbox, 'time', self.clock))
+        self.enterContext(mock.patch.object(digest, 'ADMIN_DIGEST_WINDOW', WINDOW))
+        self.enterContext(mock.patch.object(outbox, '_local', threading.local()))
+        self.enterContext(mock.patch.object(outbox, '_wakeup', threading.Event()))
+        for counter in ('_digests', '_digested', '_errors'):
+            self.enterContext(mock.patch.object(digest, counter, 0))
+
+    def notify(self, to_email=ADMIN, template='contact_message', context=CONTACT, urgent=False):
+        conn = self.database.connect()
+        result = digest.notify(conn, to_email, f'New {template}', template, context, urgent=urgent)
+        conn.commit()
+        conn.close()
+        return result
+
+    def flush(self):
+        conn = self.database.connect()
+        try:
+            return digest.flush(conn)
+        finally:
+            conn.close()
+
+    def outbox_messages(self):
+        conn = self.database.connect()
+        rows = conn.execute('SELECT to_email, subject, body_html FROM email_outbox ORDER BY id').fetchall()
+        conn.close()
+        return rows
+
+
+class NotifyTests(DigestTestCase):
+    def test_off_by_default(self):
+        env = {name: value for name, value in os.environ.items() if name != 'ADMIN_DIGEST_WINDOW'}
+        code = 'from hallulies import digest; print(digest.ADMIN_DIGEST_WINDOW)'
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '0.0')
+
+    def test_sent_at_once_without_a_window(self):
+        with mock.patch.object(digest, 'ADMIN_DIGEST_WINDOW', 0):
+            self.assertIsNotNone(self.notify())
+        (to_email, subject, body_html), = self.outbox_messages()
+        self.assertEqual((to_email, subject), (ADMIN, 'New contact_message'))
+        self.assertIn('New Contact Message', body_html)
+        self.assertIn('Ama &lt;b&gt;', body_html)
+        self.assertEqual(digest.stats()['buffered'], 0)
+
+    def test_urgent_skips_the_buffer(self):
+        self.notify(urgent=True)
+        self.assertEqual(len(self.outbox_messages()), 1)
+        self.assertEqual(digest.stats()['buffered'], 0)
+
+    def test_buffered_until_the_window_has_passed(self):
+        self.assertIsNone(self.flush())
+        self.assertIsNone(self.notify())
+        self.clock.now += 100
+        self.notify(template='testimonial_notification', context=TESTIMONIAL)
+        self.assertEqual(self.flush(), WINDOW - 100)
+        self.assertEqual(self.outbox_messages(), [])
+        stats = digest.stats()
+        self.assertEqual((stats['buffered'], stats['oldest_buffered_seconds']), (2, 100))
+        self.clock.now += WINDOW - 100
+        self.assertEqual(self.flush(), 0)
+        (to_email, subject, body_html), = self.outbox_messages()
+        self.assertEqual(to_email, ADMIN)
+        self.assertEqual(subject, 'Hallulies digest: 1 contact message, 1 testimonial notification')
+        self.assertIn('2 new notifications', body_html)
+        self.assertIn('Ama &lt;b&gt;', body_html)
+        self.assertIn('Great jollof', body_html)
+        self.assertIsNone(self.flush())
+        stats = digest.stats()
+        self.assertEqual((stats['buffered'], stats['digests_sent'], stats['notifications_digested']), (0, 1, 2))
+
+
+class FlushTests(DigestTestCase):
+    def test_single_notification_keeps_its_subject(self):
+        self.notify()
+        self.clock.now += WINDOW
+        self.flush()
+        self.assertEqual(self.outbox_messages()[0][1], 'New contact_message')
+
+    def test_one_digest_per_recipient(self):
+        self.notify()
+        self.notify(to_email='manager@hallulies.com')
+        self.notify()
+        self.clock.now += WINDOW
+        self.flush()
+        self.assertEqual(sorted((to_email, subject) for to_email, subject, _ in self.outbox_messages()),
+                         [(ADMIN, 'Hallulies digest: 2 contact messages'),
+                          ('manager@hallulies.com', 'New contact_message')])
+
+    def test_at_most_max_items_per_digest(self):
+        for _ in range(5):
+            self.notify()
+        self.clock.now += WINDOW
+        with mock.patch.object(digest, 'ADMIN_DIGEST_MAX_ITEMS', 2):
+            while self.flush() is not None:
+                pass
+        subjects = [subject for _, subject, _ in self.outbox_messages()]
+        self.assertEqual(subjects, ['Hallulies digest: 2 contact messages'] * 2 + ['New contact_message'])
+
+    def test_failed_flush_keeps_the_notifications(self):
+        self.notify()
+        self.clock.now += WINDOW
+        with mock.patch.object(digest, '_message', side_effect=RuntimeError('bad template')):
+            with self.assertRaises(RuntimeError):
+                self.flush()
+        self.assertEqual((digest.stats()['buffered'], self.outbox_messages()), (1, []))
+        self.flush()
+        self.assertEqual(len(self.outbox_messages()), 1)
+
+
+class WorkerTests(DigestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+
+    def test_keeps_running_after_errors(self):
+        self.notify()
+        self.clock.now += WINDOW
+        self.clock.max_sleeps = 4
+        flush = digest.flush
+        failures = iter([RuntimeError('bug'), RuntimeError('bug')])
+
+        def flaky_flush(conn):
+            for error in failures:
+                raise error
+            return flush(conn)
+
+        with mock.patch.object(digest, 'flush', flaky_flush):
+            with self.assertRaises(Stop):
+                digest._work()
+        interval = outbox.EMAIL_OUTBOX_POLL_INTERVAL
+        # Backed off twice, sent the digest, then found nothing buffered
+        self.assertEqual(self.clock.sleeps, [interval, interval * 2, 0.05, interval])
+        self.assertEqual(len(self.outbox_messages()), 1)
+        self.assertEqual(digest.stats()['errors'], 2)
+
+    def test_sleeps_until_the_oldest_is_due(self):
+        self.notify()
+        self.clock.max_sleeps = 1
+        with self.assertRaises(Stop):
+            digest._work()
+        self.assertEqual(self.clock.sleeps, [WINDOW])
+
+    def test_not_started_without_a_window(self):
+        with mock.patch.object(digest, 'ADMIN_DIGEST_WINDOW', 0), mock.patch.object(digest, '_flusher', None), \
+                mock.patch.object(digest.threading, 'Thread') as thread:
+            digest.start()
+        thread.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests for responsive image derivatives (hallulies/images.py)
+
+Checks derivative names, including that sources differing only in their
+extension never share one, the widths chosen for a source, and, with
+Pillow installed, that derive() writes every width x format variant and
+reports them in its manifest entry.
+
+Run with: python -m unittest test_images
+"""
+
+import os
+import tempfile
+import unittest
+
+from hallulies import images
+
+
+class DerivedPathTests(unittest.TestCase):
+    def test_derived_path(self):
+        self.assertEqual(images.derived_path('images/events/hall.jpeg', 640, 'webp'),
+                         os.path.join('images', 'derived', 'events', 'hall.jpeg-640w.webp'))
+
+    def test_sources_with_the_same_stem_kept_apart(self):
+        paths = [images.derived_path(f'images/room2.{ext}', 640, 'webp') for ext in ('jpeg', 'jpg', 'webp', 'png')]
+        self.assertEqual(len(set(paths)), 4)
+
+    def test_target_widths(self):
+        self.assertEqual(images.target_widths(1000, [320, 640, 1280]), [320, 640, 1000])
+        self.assertEqual(images.target_widths(2000, [320, 640, 1280]), [320, 640, 1280])
+        self.assertEqual(images.target_widths(200, [320, 640]), [200])
+
+    def test_settings_signature(self):
+        signature = images.settings_signature
+        self.assertEqual(signature([640, 320], ['webp']), signature([320, 640], ['webp']))
+        self.assertNotEqual(signature([320], ['webp']), signature([320], ['avif']))
+
+
+@unittest.skipIf(images.Image is None, 'needs Pillow')
+class DeriveTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.images_dir = os.path.join(self.directory, 'images')
+        self.derived_dir = os.path.join(self.images_dir, 'derived')
+        os.makedirs(self.images_dir)
+
+    def source(self, name, fmt, color):
+        path = os.path.join(self.images_dir, name)
+        images.Image.new('RGB', (400, 300), color).save(path, fmt)
+        return path
+
+    def derive(self, source):
+        return images.derive(source, images.file_hash(source), [160, 320], ['webp'], self.derived_dir, self.images_dir)
+
+    def test_variants_written_and_listed(self):
+        source = self.source('room2.jpeg', 'JPEG', (200, 40, 40))
+        entry = self.derive(source)
+        self.assertEqual((entry['width'], entry['height']), (400, 300))
+        self.assertEqual([item['type'] for item in entry['sources']], ['image/webp', 'image/jpeg'])
+        self.assertEqual(len(entry['files']), 4)
+        for path in entry['files']:
+            self.assertTrue(os.path.isfile(path), path)
+        with images.Image.open(images.derived_path(source, 160, 'webp', self.derived_dir, self.images_dir)) as image:
+            self.assertEqual(image.size, (160, 120))
+
+    def test_same_stem_different_extension(self):
+        jpeg = self.derive(self.source('room2.jpeg', 'JPEG', (200, 40, 40)))
+        webp = self.derive(self.source('room2.webp', 'WEBP', (40, 40, 200)))
+        self.assertFalse(set(jpeg['files']) & set(webp['files']))
+        # The JPEG's WebP derivatives are still its own, not overwritten by the other source
+        with images.Image.open(jpeg['files'][0]) as image:
+            self.assertGreater(image.convert('RGB').getpixel((10, 10))[0], 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
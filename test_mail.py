@@ -0,0 +1,214 @@
+"""
+Tests for pooled SMTP delivery (hallulies/mail.py)
+
+Runs the Mailer against a fake smtplib.SMTP. Checks that sessions are
+pooled and reused across send_many() calls and replaced when idle or worn
+out, that a reused session the server dropped is retried once on a fresh
+one, that refused and unreachable messages are reported per message, and
+that the per-host TokenBucket holds sending to EMAIL_RATE_LIMIT.
+
+Run with: python -m unittest test_mail
+"""
+
+import smtplib
+import unittest
+from unittest import mock
+
+from hallulies import mail, ratelimit
+from hallulies.mail import Mailer
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeServer:
+    """The SMTP host: hands out FakeSMTP connections and records what they did"""
+
+    def __init__(self):
+        self.connections = []
+        self.refused = set()
+        self.unreachable = False
+
+    def __call__(self, host, port, timeout=None):
+        if self.unreachable:
+            raise ConnectionRefusedError(111, 'Connection refused')
+        connection = FakeSMTP(self)
+        self.connections.append(connection)
+        return connection
+
+    def sent(self):
+        return [to for connection in self.connections for to in connection.sent]
+
+
+class FakeSMTP:
+    def __init__(self, server):
+        self.server = server
+        self.calls = []
+        self.sent = []
+        self.sock = object()
+        # Set to make the next commands fail as if the server hung up
+        self.dropped = False
+
+    def starttls(self, context=None):
+        self.calls.append('starttls')
+
+    def login(self, user, password):
+        self.calls.append('login')
+
+    def sendmail(self, from_addr, to_addr, msg):
+        if self.dropped:
+            self.sock = None
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        if to_addr in self.server.refused:
+            raise smtplib.SMTPRecipientsRefused({to_addr: (550, b'No such user here')})
+        self.sent.append(to_addr)
+
+    def quit(self):
+        self.calls.append('quit')
+        self.sock = None
+
+    def close(self):
+        self.calls.append('close')
+        self.sock = None
+
+
+def messages(*addresses):
+    return [(address, 'Booking Confirmation', '<p>Akwaaba</p>') for address in addresses]
+
+
+class MailerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer()
+        self.clock = Clock()
+        self.enterContext(mock.patch.object(mail.smtplib, 'SMTP', self.server))
+        self.enterContext(mock.patch.object(mail, 'time', self.clock))
+        self.enterContext(mock.patch.object(ratelimit, 'time', self.clock))
+        self.enterContext(mock.patch.dict(mail._buckets, clear=True))
+
+    def mailer(self, **kwargs):
+        kwargs.setdefault('password', 'app-password')
+        return Mailer('smtp.example.com', 587, 'bookings@hallulies.com', kwargs.pop('password'), **kwargs)
+
+
+class PoolTests(MailerTestCase):
+    def test_session_reused_across_batches(self):
+        mailer = self.mailer()
+        self.assertEqual(mailer.send_many(messages('ama@example.com', 'kofi@example.com')), [None, None])
+        mailer.send('esi@example.com', 'Booking Confirmation', '<p>Akwaaba</p>')
+        self.assertEqual(len(self.server.connections), 1)
+        connection = self.server.connections[0]
+        self.assertEqual(connection.calls, ['starttls', 'login'])
+        self.assertEqual(connection.sent, ['ama@example.com', 'kofi@example.com', 'esi@example.com'])
+        stats = mailer.stats()
+        self.assertEqual((stats['connects'], stats['messages'], stats['idle_sessions']), (1, 3, 1))
+        mailer.close()
+        self.assertEqual(connection.calls[-1], 'quit')
+        self.assertEqual(mailer.stats()['idle_sessions'], 0)
+
+    def test_no_tls_or_login_unless_configured(self):
+        mailer = self.mailer(password='', use_tls=False)
+        self.assertFalse(mailer.enabled)
+        mailer.send_many(messages('ama@example.com'))
+        self.assertEqual(self.server.connections[0].calls, [])
+
+    def test_idle_session_replaced(self):
+        mailer = self.mailer()
+        mailer.send_many(messages('ama@example.com'))
+        self.clock.now += mail.EMAIL_SESSION_IDLE_TIMEOUT
+        mailer.send_many(messages('kofi@example.com'))
+        first, second = self.server.connections
+        self.assertEqual(first.calls[-1], 'quit')
+        self.assertEqual(second.sent, ['kofi@example.com'])
+
+    def test_worn_out_session_replaced(self):
+        mailer = self.mailer()
+        with mock.patch.object(mail, 'EMAIL_SESSION_MAX_MESSAGES', 2):
+            mailer.send_many(messages('ama@example.com', 'kofi@example.com'))
+            mailer.send_many(messages('esi@example.com'))
+        self.assertEqual([connection.sent for connection in self.server.connections],
+                         [['ama@example.com', 'kofi@example.com'], ['esi@example.com']])
+        self.assertEqual(self.server.connections[0].calls[-1], 'quit')
+
+    def test_pool_size_zero_closes_after_use(self):
+        mailer = self.mailer(pool_size=0)
+        mailer.send_many(messages('ama@example.com'))
+        mailer.send_many(messages('kofi@example.com'))
+        self.assertEqual(len(self.server.connections), 2)
+        self.assertEqual(mailer.stats()['idle_sessions'], 0)
+
+
+class ReconnectTests(MailerTestCase):
+    def test_dropped_pooled_session_retried_on_a_new_one(self):
+        mailer = self.mailer()
+        mailer.send_many(messages('ama@example.com'))
+        self.server.connections[0].dropped = True
+        self.assertEqual(mailer.send_many(messages('kofi@example.com', 'esi@example.com')), [None, None])
+        self.assertEqual(self.server.sent(), ['ama@example.com', 'kofi@example.com', 'esi@example.com'])
+        stats = mailer.stats()
+        self.assertEqual((stats['connects'], stats['reconnects'], stats['failures']), (2, 1, 0))
+
+    def test_fresh_session_dropping_is_an_error(self):
+        mailer = self.mailer()
+        original = FakeSMTP.sendmail
+
+        def hang_up(connection, *args):
+            connection.dropped = True
+            return original(connection, *args)
+
+        with mock.patch.object(FakeSMTP, 'sendmail', hang_up):
+            errors = mailer.send_many(messages('ama@example.com'))
+        self.assertIsInstance(errors[0], smtplib.SMTPServerDisconnected)
+        stats = mailer.stats()
+        self.assertEqual((stats['connects'], stats['reconnects'], stats['failures']), (1, 0, 1))
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            with mock.patch.object(FakeSMTP, 'sendmail', hang_up):
+                mailer.send('ama@example.com', 'Booking Confirmation', '<p>Akwaaba</p>')
+
+    def test_refused_recipient_does_not_end_the_session(self):
+        self.server.refused.add('nobody@example.com')
+        mailer = self.mailer()
+        errors = mailer.send_many(messages('ama@example.com', 'nobody@example.com', 'kofi@example.com'))
+        self.assertEqual([type(error) for error in errors], [type(None), smtplib.SMTPRecipientsRefused, type(None)])
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.server.sent(), ['ama@example.com', 'kofi@example.com'])
+        self.assertEqual(mailer.stats()['failures'], 1)
+
+    def test_unreachable_host_fails_the_batch_with_one_attempt(self):
+        self.server.unreachable = True
+        mailer = self.mailer()
+        errors = mailer.send_many(messages('ama@example.com', 'kofi@example.com'))
+        self.assertEqual([type(error) for error in errors], [ConnectionRefusedError] * 2)
+        self.assertIs(errors[0], errors[1])
+        self.server.unreachable = False
+        self.assertEqual(mailer.send_many(messages('ama@example.com')), [None])
+
+
+class RateLimitTests(MailerTestCase):
+    def test_sending_held_to_the_rate(self):
+        with mock.patch.object(mail, 'EMAIL_RATE_LIMIT', 60), mock.patch.object(mail, 'EMAIL_RATE_BURST', 2):
+            first, second = self.mailer(), self.mailer()
+            first.send_many(messages('a@example.com', 'b@example.com', 'c@example.com'))
+            # The same host's bucket, even from another Mailer
+            second.send_many(messages('d@example.com'))
+        self.assertEqual(self.clock.slept, [1.0, 1.0])
+        self.assertEqual(first.stats()['rate_limited_seconds'], 1.0)
+        self.assertEqual(second.stats()['rate_limited_seconds'], 1.0)
+        self.assertEqual(len(self.server.sent()), 4)
+
+    def test_bucket_per_host(self):
+        self.assertIs(mail.rate_limiter('smtp.example.com'), mail.rate_limiter('smtp.example.com'))
+        self.assertIsNot(mail.rate_limiter('smtp.example.com'), mail.rate_limiter('smtp.other.com'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Tests for the schema migrations in hallulies/migrations.py
+
+Checks that migrations are recorded and applied once, and that the hot
+list queries of the API servers are answered from the shipped indexes
+(EXPLAIN QUERY PLAN shows no full scan and no temp B-tree sort).
+
+Run with: python -m unittest test_migrations
+"""
+
+import sqlite3
+import unittest
+
+from hallulies import migrations
+
+HOT_QUERIES = {
+    'bookings first page': (
+        'SELECT * FROM bookings ORDER BY created_at DESC, id DESC LIMIT ?', (51,),
+        'idx_bookings_created_at_id'),
+    'bookings next page': (
+        'SELECT * FROM bookings WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?',
+        ('2025-01-01 00:00:00', 10, 51),
+        'idx_bookings_created_at_id'),
+    'bookings by status': (
+        'SELECT * FROM bookings WHERE status = ? AND (created_at, id) < (?, ?) '
+        'ORDER BY created_at DESC, id DESC LIMIT ?',
+        ('pending', '2025-01-01 00:00:00', 10, 51),
+        'idx_bookings_status_created_at_id'),
+    'bookings last 30 days': (
+        "SELECT COUNT(*) FROM bookings WHERE created_at >= datetime('now', '-30 days')", (),
+        'idx_bookings_created_at_id'),
+    'approved testimonials': (
+        "SELECT * FROM testimonials WHERE status = 'approved' ORDER BY created_at DESC", (),
+        'idx_testimonials_approved_created_at'),
+    'menu': (
+        'SELECT * FROM menu_items WHERE is_active = 1 ORDER BY category, name', (),
+        'idx_menu_items_active_category_name'),
+    'menu by category': (
+        'SELECT * FROM menu_items WHERE category = ? AND is_active = 1 ORDER BY name', ('mains',),
+        'idx_menu_items_active_category_name'),
+    'email outbox claim': (
+        "SELECT id, to_email, subject, body_html, attempts FROM email_outbox "
+        "WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+        (1700000000.0,),
+        'idx_email_outbox_due'),
+}
+
+
+class MigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.applied = migrations.migrate(self.conn, verbose=False)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_all_migrations_recorded(self):
+        versions = [migration[0] for migration in migrations.MIGRATIONS]
+        self.assertEqual(self.applied, sorted(versions))
+        rows = self.conn.execute('SELECT version FROM schema_migrations ORDER BY version').fetchall()
+        self.assertEqual([row[0] for row in rows], sorted(versions))
+
+    def test_rerun_applies_nothing(self):
+        self.assertEqual(migrations.migrate(self.conn, verbose=False), [])
+        count = self.conn.execute('SELECT COUNT(*) FROM menu_items').fetchone()[0]
+        self.assertEqual(count, len(migrations.SAMPLE_MENU_ITEMS))
+
+    def test_new_migration_applied_in_order(self):
+        extra = migrations.MIGRATIONS + [
+            (999, 'Test column', ['ALTER TABLE menu_items ADD COLUMN spice_level INTEGER']),
+        ]
+        self.assertEqual(migrations.migrate(self.conn, extra, verbose=False), [999])
+        self.conn.execute('SELECT spice_level FROM menu_items').fetchall()
+
+    def test_failed_migration_is_rolled_back(self):
+        broken = migrations.MIGRATIONS + [
+            (999, 'Broken', ['CREATE TABLE half_done (id INTEGER)', 'SELECT * FROM no_such_table']),
+        ]
+        with self.assertRaises(sqlite3.OperationalError):
+            migrations.migrate(self.conn, broken, verbose=False)
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn('half_done', tables)
+        self.assertNotIn(999, migrations.applied_versions(self.conn))
+
+    def test_duplicate_sample_menu_removed(self):
+        conn = sqlite3.connect(':memory:')
+        migrations.migrate(conn, migrations.MIGRATIONS[:2], verbose=False)
+        # What the old "INSERT OR IGNORE" seeding left behind after a restart
+        conn.execute('''
+            INSERT INTO menu_items (name, description, category, price)
+            SELECT name, description, category, price FROM menu_items
+        ''')
+        conn.execute("INSERT INTO menu_items (name, category, price) VALUES ('Chef Special', 'mains', 50)")
+        conn.execute("INSERT INTO menu_items (name, category, price) VALUES ('Chef Special', 'mains', 50)")
+        conn.commit()
+        migrations.migrate(conn, verbose=False)
+        names = [row[0] for row in conn.execute('SELECT name FROM menu_items')]
+        self.assertEqual(len(names), len(migrations.SAMPLE_MENU_ITEMS) + 2)
+        conn.close()
+
+    def test_sample_admin_password_hash_replaced(self):
+        def admin_hash(conn):
+            return conn.execute("SELECT password_hash FROM users WHERE email = 'admin@hallulies.com'").fetchone()[0]
+
+        self.assertEqual(admin_hash(self.conn), migrations.SAMPLE_ADMIN_PASSWORD_HASH)
+        # A password the admin has set since is kept
+        conn = sqlite3.connect(':memory:')
+        migrations.migrate(conn, [m for m in migrations.MIGRATIONS if m[0] < 9], verbose=False)
+        conn.execute("UPDATE users SET password_hash = 'changed' WHERE email = 'admin@hallulies.com'")
+        conn.commit()
+        migrations.migrate(conn, verbose=False)
+        self.assertEqual(admin_hash(conn), 'changed')
+        conn.close()
+
+    def test_writes_bump_table_versions(self):
+        def version(table):
+            return self.conn.execute('SELECT version FROM table_versions WHERE name = ?', (table,)).fetchone()[0]
+
+        menu, testimonials = version('menu_items'), version('testimonials')
+        self.conn.execute("UPDATE menu_items SET price = price + 1 WHERE category = 'mains'")
+        self.conn.execute("INSERT INTO testimonials (name, title, content, rating) VALUES ('A', 'B', 'C', 5)")
+        self.conn.execute('DELETE FROM testimonials')
+        self.conn.commit()
+        # Row-level triggers: one bump per row written
+        self.assertGreater(version('menu_items'), menu)
+        self.assertGreater(version('testimonials'), testimonials + 1)
+
+    def test_hot_queries_use_indexes(self):
+        for label, (query, params, index) in HOT_QUERIES.items():
+            with self.subTest(label):
+                plan = ' | '.join(row[3] for row in self.conn.execute('EXPLAIN QUERY PLAN ' + query, params))
+                self.assertIn(index, plan)
+                self.assertNotIn('USE TEMP B-TREE', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
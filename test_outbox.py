@@ -0,0 +1,290 @@
+"""
+Tests for the durable email outbox (hallulies/outbox.py)
+
+Runs against a temporary database with a fake send_many and a fake clock.
+Checks that a claim leases messages until SEND_LEASE runs out, that failed
+messages are retried after exponentially growing delays and marked dead
+after EMAIL_MAX_ATTEMPTS, and that a worker backs off after errors, keeps
+going, and never misses a wake().
+
+Run with: python -m unittest test_outbox
+"""
+
+import contextlib
+import io
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import outbox
+
+
+class Stop(BaseException):
+    """Ends a worker loop under test (the loop itself catches Exception)"""
+
+
+class FakeTime:
+    def __init__(self, now=1700000000.0, max_sleeps=None):
+        self.now = now
+        self.sleeps = []
+        self.max_sleeps = max_sleeps
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.max_sleeps is not None and len(self.sleeps) >= self.max_sleeps:
+            raise Stop
+
+
+class FakeSender:
+    """send_many() that fails the addresses in ``failing`` and records the rest;
+    raises ``error`` instead, once, if it is set"""
+
+    def __init__(self, failing=(), error=None):
+        self.failing = set(failing)
+        self.error = error
+        self.sent = []
+        self.batches = 0
+
+    def __call__(self, messages):
+        self.batches += 1
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        results = []
+        for to_email, subject, body_html in messages:
+            if to_email in self.failing:
+                results.append(ConnectionRefusedError('SMTP host down'))
+            else:
+                self.sent.append(to_email)
+                results.append(None)
+        return results
+
+
+class OutboxTestCase(unittest.TestCase):
+    def setUp(self):
+        self.database = self.enterContext(http_testing.temporary_database())
+        self.clock = FakeTime()
+        self.sender = FakeSender()
+        self.enterContext(mock.patch.object(outbox, 'time', self.clock))
+        self.enterContext(mock.patch.object(outbox, '_send_many', self.sender))
+        self.enterContext(mock.patch.object(outbox, '_local', threading.local()))
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        self.enterContext(contextlib.redirect_stderr(io.StringIO()))
+
+    def enqueue(self, *addresses):
+        conn = self.database.connect()
+        ids = [outbox.enqueue(conn, address, 'Booking confirmed', '<p>Akwaaba</p>') for address in addresses]
+        conn.commit()
+        conn.close()
+        return ids
+
+    def claim(self, limit=10, message_ids=None):
+        conn = self.database.connect()
+        try:
+            return outbox.claim(conn, limit, message_ids)
+        finally:
+            conn.close()
+
+    def deliver(self, messages):
+        conn = self.database.connect()
+        try:
+            return outbox.deliver(conn, messages)
+        finally:
+            conn.close()
+
+    def row(self, message_id):
+        conn = self.database.connect()
+        row = conn.execute('SELECT status, attempts, next_attempt_at, last_error FROM email_outbox WHERE id = ?',
+                           (message_id,)).fetchone()
+        conn.close()
+        return row
+
+
+class ClaimTests(OutboxTestCase):
+    def test_claim_leases_until_the_lease_runs_out(self):
+        message_id, = self.enqueue('ama@example.com')
+        claimed = self.claim()
+        self.assertEqual(claimed, [(message_id, 'ama@example.com', 'Booking confirmed', '<p>Akwaaba</p>', 1)])
+        self.assertEqual(self.row(message_id)[:3], ('sending', 1, self.clock.now + outbox.SEND_LEASE))
+        self.assertEqual(self.claim(), [])
+        self.clock.now += outbox.SEND_LEASE - 1
+        self.assertEqual(self.claim(), [])
+        # The worker that claimed it is presumed dead: claimed again
+        self.clock.now += 1
+        self.assertEqual([message[4] for message in self.claim()], [2])
+
+    def test_claim_limit_and_ids(self):
+        first, second, third = self.enqueue('a@example.com', 'b@example.com', 'c@example.com')
+        self.assertEqual([message[0] for message in self.claim(1)], [first])
+        self.assertEqual([message[0] for message in self.claim(10, [third])], [third])
+        self.assertEqual([message[0] for message in self.claim()], [second])
+
+    def test_not_yet_due(self):
+        message_id, = self.enqueue('ama@example.com')
+        self.clock.now -= 1
+        self.assertEqual(self.claim(), [])
+
+
+class DeliverTests(OutboxTestCase):
+    def test_sent(self):
+        message_id, = self.enqueue('ama@example.com')
+        self.assertEqual(self.deliver(self.claim()), 1)
+        self.assertEqual(self.sender.sent, ['ama@example.com'])
+        status, _, _, last_error = self.row(message_id)
+        self.assertEqual((status, last_error), ('sent', None))
+        self.assertEqual(self.claim(), [])
+
+    def test_retry_delays_grow_exponentially(self):
+        message_id, = self.enqueue('ama@example.com')
+        self.sender.failing.add('ama@example.com')
+        base = outbox.EMAIL_RETRY_BASE_DELAY
+        with mock.patch.object(outbox, 'EMAIL_MAX_ATTEMPTS', 10), \
+                mock.patch.object(outbox, 'EMAIL_RETRY_MAX_DELAY', base * 4), \
+                mock.patch.object(outbox.random, 'uniform', lambda low, high: high):
+            delays = []
+            for _ in range(5):
+                self.deliver(self.claim())
+                status, _, next_attempt_at, last_error = self.row(message_id)
+                self.assertEqual(status, 'pending')
+                self.assertEqual(last_error, 'ConnectionRefusedError: SMTP host down')
+                delays.append(next_attempt_at - self.clock.now)
+                self.assertEqual(self.claim(), [])
+                self.clock.now = next_attempt_at
+        self.assertEqual(delays, [base, base * 2, base * 4, base * 4, base * 4])
+
+    def test_retry_delay_jitter(self):
+        for attempts in (1, 3):
+            delay = outbox.EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= outbox.retry_delay(attempts) <= delay)
+
+    def test_dead_after_max_attempts(self):
+        message_id, ok_id = self.enqueue('ama@example.com', 'kofi@example.com')
+        self.sender.failing.add('ama@example.com')
+        with mock.patch.object(outbox, 'EMAIL_MAX_ATTEMPTS', 3):
+            for attempt in range(1, 4):
+                self.clock.now += outbox.EMAIL_RETRY_MAX_DELAY
+                claimed = self.claim()
+                self.assertEqual(claimed[0][4], attempt)
+                self.deliver(claimed)
+            self.clock.now += outbox.EMAIL_RETRY_MAX_DELAY
+            self.assertEqual(self.claim(), [])
+        self.assertEqual(self.row(message_id)[:2], ('dead', 3))
+        self.assertEqual(self.row(ok_id)[0], 'sent')
+        counts = outbox.stats()
+        self.assertEqual((counts['dead'], counts['sent'], counts['pending']), (1, 1, 0))
+
+    def test_wake_sends_inline_when_outbox_disabled(self):
+        with mock.patch.object(outbox, 'EMAIL_OUTBOX', False):
+            message_id, = self.enqueue('ama@example.com')
+            self.enqueue('kofi@example.com')
+            # Only what this thread enqueued since its last wake()
+            outbox._local.pending = [message_id]
+            outbox.wake()
+        self.assertEqual(self.sender.sent, ['ama@example.com'])
+        self.assertEqual(self.row(message_id)[0], 'sent')
+
+
+class WakeupEvent(threading.Event):
+    """Records whether each wait() found the event already set; a wait that
+    would time out returns at once with the fake clock moved on instead"""
+
+    def __init__(self, clock, max_waits):
+        super().__init__()
+        self.clock = clock
+        self.max_waits = max_waits
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(self.is_set())
+        if len(self.waits) >= self.max_waits:
+            raise Stop
+        if not self.is_set():
+            self.clock.now += timeout
+        return self.is_set()
+
+
+class WorkerTests(OutboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(outbox, '_worker_errors', 0))
+
+    def run_worker(self, max_waits=1):
+        wakeup = WakeupEvent(self.clock, max_waits)
+        with mock.patch.object(outbox, '_wakeup', wakeup):
+            with self.assertRaises(Stop):
+                outbox._work()
+        return wakeup
+
+    def test_backs_off_after_errors_and_keeps_going(self):
+        self.clock.max_sleeps = 5
+        interval = outbox.EMAIL_OUTBOX_POLL_INTERVAL
+        with mock.patch.object(outbox, 'claim', side_effect=RuntimeError('bug in claim')), \
+                mock.patch.object(outbox, 'SEND_LEASE', interval * 8):
+            self.run_worker()
+        self.assertEqual(self.clock.sleeps, [interval, interval * 2, interval * 4, interval * 8, interval * 8])
+        self.assertEqual(outbox._worker_errors, 5)
+
+    def test_recovers_after_database_error(self):
+        self.enqueue('ama@example.com')
+        claim = outbox.claim
+        failures = iter([sqlite3.OperationalError('database is locked')])
+
+        def flaky_claim(*args):
+            for error in failures:
+                raise error
+            return claim(*args)
+
+        with mock.patch.object(outbox, 'claim', flaky_claim):
+            self.run_worker()
+        self.assertEqual(self.clock.sleeps, [outbox.EMAIL_OUTBOX_POLL_INTERVAL])
+        self.assertEqual(self.sender.sent, ['ama@example.com'])
+        self.assertEqual(outbox._worker_errors, 1)
+
+    def test_message_sent_again_after_its_lease(self):
+        message_id, = self.enqueue('ama@example.com')
+        self.sender.error = RuntimeError('bug in send_many')
+        started = self.clock.now
+        self.run_worker(max_waits=outbox.SEND_LEASE)
+        self.assertEqual(self.sender.sent, ['ama@example.com'])
+        self.assertEqual(self.row(message_id)[:2], ('sent', 2))
+        self.assertEqual(outbox._worker_errors, 1)
+        # Not before the lease the failed pass held had run out
+        self.assertGreaterEqual(self.clock.now - started, outbox.SEND_LEASE)
+
+    def test_wake_during_claim_is_not_missed(self):
+        claim = outbox.claim
+
+        def claim_then_enqueue(*args):
+            # A request commits a message and calls wake() just after this claim looked
+            messages = claim(*args)
+            if not self.sender.sent and not messages:
+                self.enqueue('ama@example.com')
+                outbox.wake()
+            return messages
+
+        with mock.patch.object(outbox, 'claim', claim_then_enqueue):
+            wakeup = self.run_worker(max_waits=2)
+        # The first wait returned at once and the message went out before the second
+        self.assertEqual(wakeup.waits, [True, False])
+        self.assertEqual(self.sender.sent, ['ama@example.com'])
+
+    def test_wake_before_claim_is_consumed_by_it(self):
+        self.enqueue('ama@example.com')
+        wakeup = WakeupEvent(self.clock, max_waits=1)
+        wakeup.set()
+        with mock.patch.object(outbox, '_wakeup', wakeup):
+            with self.assertRaises(Stop):
+                outbox._work()
+        # The claim that sent the message answered the wake(): no spurious pass
+        self.assertEqual(wakeup.waits, [False])
+        self.assertEqual((self.sender.sent, self.sender.batches), (['ama@example.com'], 1))
+
+if __name__ == '__main__':
+    unittest.main()
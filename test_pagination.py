@@ -0,0 +1,179 @@
+"""
+Tests for keyset pagination (hallulies/pagination.py) and streamed JSON lists
+
+Checks that cursors round-trip and that tampered ones are refused (400 from
+GET /api/bookings), that pages chained through X-Next-Cursor cover every
+booking exactly once, and that send_json_list() frames long lists as
+HTTP/1.1 chunks or, on HTTP/1.0, ends them with the connection.
+
+Run with: python -m unittest test_pagination
+"""
+
+import base64
+import gzip
+import http.server
+import json
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import pagination, responses
+from hallulies.responses import ResponseMixin
+
+ITEMS = [{'id': number, 'name': f'item {number}'} for number in range(7)]
+
+
+class ListHandler(ResponseMixin, http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    batches = ()
+
+    def do_GET(self):
+        self.send_json_list(iter(self.batches))
+
+
+def batched(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def parse_chunks(body):
+    """The chunks of a chunked body; fails unless it ends with the zero-size chunk"""
+    chunks = []
+    while True:
+        size_line, _, body = body.partition(b'\r\n')
+        size = int(size_line, 16)
+        if size == 0:
+            assert body == b'\r\n', body
+            return chunks
+        chunks.append(body[:size])
+        assert body[size:size + 2] == b'\r\n'
+        body = body[size + 2:]
+
+
+class CursorTests(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = pagination.encode_cursor('2025-01-01 10:00:00', 42)
+        # Goes into query strings and Link headers as it is
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+        self.assertEqual(pagination.decode_cursor(cursor), ['2025-01-01 10:00:00', 42])
+
+    def test_invalid_cursors_rejected(self):
+        def encoded(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+        for cursor in ('not a cursor!', 'e30', encoded({'id': 1}), encoded([1]), encoded([1, 2, 3]),
+                       encoded('text'), encoded([[1], {'a': 2}]), encoded([1, 'x']), encoded(['x', 1.5]),
+                       encoded(['x', True]), encoded(['x', None]), encoded(['x', 2 ** 63])):
+            with self.subTest(cursor):
+                with self.assertRaises(pagination.PaginationError):
+                    pagination.decode_cursor(cursor)
+
+    def test_parse_limit(self):
+        self.assertEqual(pagination.parse_limit(None), pagination.PAGE_SIZE)
+        self.assertEqual(pagination.parse_limit('5'), 5)
+        self.assertEqual(pagination.parse_limit(str(pagination.MAX_PAGE_SIZE + 1)), pagination.MAX_PAGE_SIZE)
+        for value in ('0', '-1', 'ten'):
+            with self.subTest(value):
+                with self.assertRaises(pagination.PaginationError):
+                    pagination.parse_limit(value)
+
+    def test_next_page_headers_keep_filters(self):
+        headers = pagination.next_page_headers('/api/bookings', {'status': 'pending', 'after': 'old'}, 'abc')
+        self.assertEqual(headers['X-Next-Cursor'], 'abc')
+        self.assertEqual(headers['Link'], '</api/bookings?status=pending&after=abc>; rel="next"')
+        self.assertEqual(pagination.next_page_headers('/api/bookings', {}, None), {})
+
+
+class BookingPagesTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http_testing.load_script('api-server.py')
+
+    def setUp(self):
+        conn = self.enterContext(http_testing.temporary_database()).connect()
+        # Equal timestamps: only the id tells these rows apart
+        conn.executemany(
+            "INSERT INTO bookings (guest_name, email, phone, checkin_date, checkout_date, room_type, adults, "
+            "created_at) VALUES (?, 'guest@example.com', '1', '2025-06-01', '2025-06-03', 'Deluxe Room', 2, ?)",
+            [(f'Guest {number}', '2025-01-01 10:00:00' if number < 4 else '2025-01-02 10:00:00')
+             for number in range(7)])
+        conn.commit()
+        conn.close()
+
+    def get(self, path):
+        return http_testing.request(self.server.HalluliesAPIHandler, 'GET', path)
+
+    def test_pages_cover_every_booking_once(self):
+        seen = []
+        path = '/api/bookings?limit=3&fields=id'
+        while True:
+            response = self.get(path)
+            self.assertEqual(response.status, 200)
+            seen.extend(booking['id'] for booking in json.loads(response.body))
+            cursor = response.headers['X-Next-Cursor']
+            if cursor is None:
+                break
+            path = f'/api/bookings?limit=3&fields=id&after={cursor}'
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+    def test_bad_cursor_is_400(self):
+        response = self.get('/api/bookings?after=garbage')
+        self.assertEqual(response.status, 400)
+        self.assertEqual(json.loads(response.body), {'error': 'Invalid cursor'})
+
+    def test_tampered_cursor_is_400(self):
+        for key in ([[1], {'a': 2}], ['2025-01-01 10:00:00', 10 ** 30]):
+            with self.subTest(key):
+                cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+                response = self.get(f'/api/bookings?after={cursor}')
+                self.assertEqual(response.status, 400)
+                self.assertEqual(json.loads(response.body), {'error': 'Invalid cursor'})
+
+    def test_bad_fields_are_400(self):
+        response = self.get('/api/bookings?fields=id,password_hash')
+        self.assertEqual(response.status, 400)
+
+
+class StreamingTests(unittest.TestCase):
+    def get(self, batches, headers=None, version='HTTP/1.1'):
+        handler = type('Handler', (ListHandler,), {'batches': batches})
+        return http_testing.request(handler, 'GET', '/items', headers, version=version)
+
+    def test_one_batch_has_content_length(self):
+        response = self.get([ITEMS])
+        self.assertEqual(response.headers['Content-Length'], str(len(response.body)))
+        self.assertIsNone(response.headers['Transfer-Encoding'])
+        self.assertEqual(json.loads(response.body), ITEMS)
+
+    def test_batches_are_sent_as_chunks(self):
+        response = self.get(batched(ITEMS, 3))
+        self.assertEqual(response.headers['Transfer-Encoding'], 'chunked')
+        self.assertIsNone(response.headers['Content-Length'])
+        chunks = parse_chunks(response.raw.partition(b'\r\n\r\n')[2])
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(b''.join(chunks)), ITEMS)
+        self.assertEqual(json.loads(response.body), ITEMS)
+
+    def test_empty_batches_give_an_empty_list(self):
+        response = self.get([[], [], []])
+        self.assertEqual(json.loads(response.body), [])
+
+    def test_http10_ends_with_connection_close(self):
+        response = self.get(batched(ITEMS, 2), version='HTTP/1.0')
+        self.assertIsNone(response.headers['Transfer-Encoding'])
+        self.assertEqual(response.headers['Connection'], 'close')
+        self.assertEqual(json.loads(response.body), ITEMS)
+
+    def test_compressed_stream(self):
+        response = self.get(batched(ITEMS, 2), {'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.body)), ITEMS)
+
+    def test_streaming_disabled(self):
+        with mock.patch.object(responses, 'JSON_STREAMING', False):
+            response = self.get(batched(ITEMS, 2))
+        self.assertEqual(response.headers['Content-Length'], str(len(response.body)))
+        self.assertEqual(json.loads(response.body), ITEMS)
+
+
+if __name__ == '__main__':
+    unittest.main()
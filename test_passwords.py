@@ -0,0 +1,191 @@
+"""
+Tests for bcrypt password handling (hallulies/passwords.py) and the login
+and registration handlers that use it
+
+Runs at BCRYPT_ROUNDS 4 so each hash takes about a millisecond. Checks
+verification, the rehash when the configured cost changes, that an unknown
+email still costs a bcrypt check, the 72-byte cut, and the PasswordHasherBusy
+refusal when the queue is full; then that every server answers logins
+(including malformed ones) with 200/400/401/503 as it should and
+api-server.py registers users.
+
+Run with: python -m unittest test_passwords
+"""
+
+import json
+import threading
+import unittest
+from unittest import mock
+
+import bcrypt
+
+import http_testing
+from hallulies import passwords, ratelimit
+
+ROUNDS = 4
+SERVERS = {
+    'api-server.py': 'HalluliesAPIHandler',
+    'enhanced-api-server.py': 'EnhancedAPIHandler',
+    'simple-api-server.py': 'SimpleAPIHandler',
+}
+
+
+class PasswordTests(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(passwords, 'BCRYPT_ROUNDS', ROUNDS))
+        self.enterContext(mock.patch.object(passwords, '_dummy_hash', None))
+
+    def test_hash_and_verify(self):
+        password_hash = passwords.hash_password('correct horse')
+        self.assertTrue(password_hash.startswith(f'$2b$0{ROUNDS}$'))
+        self.assertEqual(passwords.cost(password_hash), ROUNDS)
+        self.assertEqual(passwords.verify('correct horse', password_hash), (True, None))
+        self.assertEqual(passwords.verify('wrong horse', password_hash), (False, None))
+
+    def test_rehash_on_cost_change(self):
+        password_hash = passwords.hash_password('correct horse')
+        with mock.patch.object(passwords, 'BCRYPT_ROUNDS', ROUNDS + 1):
+            valid, new_hash = passwords.verify('correct horse', password_hash)
+            self.assertEqual(passwords.verify('wrong horse', password_hash), (False, None))
+        self.assertTrue(valid)
+        self.assertEqual(passwords.cost(new_hash), ROUNDS + 1)
+        self.assertEqual(passwords.verify('correct horse', new_hash)[0], True)
+
+    def test_unknown_user_checked_against_dummy_hash(self):
+        with mock.patch.object(passwords.bcrypt, 'checkpw', wraps=bcrypt.checkpw) as checkpw:
+            self.assertEqual(passwords.verify('anything', None), (False, None))
+        checkpw.assert_called_once()
+        # Same cost as a real user's hash, so the response takes as long
+        self.assertEqual(passwords.cost(checkpw.call_args[0][1].decode()), ROUNDS)
+
+    def test_non_bcrypt_hash_rejected(self):
+        legacy = 'ef92b778bafe771e89245b89ecbc08a44a4e166c06659911881f383d4473e94f'
+        self.assertEqual(passwords.verify('admin123', legacy), (False, None))
+        self.assertIsNone(passwords.cost(legacy))
+
+    def test_long_passwords_cut_at_72_bytes(self):
+        password_hash = passwords.hash_password('a' * 72 + 'first')
+        self.assertTrue(passwords.verify('a' * 72 + 'second', password_hash)[0])
+        self.assertFalse(passwords.verify('a' * 71, password_hash)[0])
+
+    def test_non_string_password_refused(self):
+        for password in (123, None, ['secret'], b'secret'):
+            with self.subTest(password):
+                with self.assertRaises(TypeError):
+                    passwords.verify(password, None)
+                with self.assertRaises(TypeError):
+                    passwords.hash_password(password)
+
+    def test_busy_when_queue_full(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        rejected = passwords.stats()['rejected']
+        with mock.patch.object(passwords, '_slots', slots):
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                passwords.verify('correct horse', None)
+        self.assertEqual(passwords.stats()['rejected'], rejected + 1)
+
+
+class HandlerTestCase(unittest.TestCase):
+    """A temporary database with one user, 'guest@example.com' / 'correct horse'"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.handlers = {script: getattr(http_testing.load_script(script), name) for script, name in SERVERS.items()}
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(passwords, 'BCRYPT_ROUNDS', ROUNDS))
+        self.enterContext(mock.patch.object(ratelimit, 'RATE_LIMIT', False))
+        self.database = self.enterContext(http_testing.temporary_database())
+        conn = self.database.connect()
+        conn.execute("INSERT INTO users (username, email, password_hash) VALUES ('guest', 'guest@example.com', ?)",
+                     (bcrypt.hashpw(b'correct horse', bcrypt.gensalt(ROUNDS)).decode(),))
+        conn.commit()
+        conn.close()
+
+    def post(self, handler, path, data):
+        body = json.dumps(data).encode()
+        response = http_testing.request(handler, 'POST', path, {'Content-Type': 'application/json'}, body)
+        return response.status, json.loads(response.body), response.headers
+
+    def login(self, handler, email, password):
+        return self.post(handler, '/api/auth/login', {'email': email, 'password': password})
+
+    def stored_hash(self):
+        conn = self.database.connect()
+        password_hash = conn.execute("SELECT password_hash FROM users WHERE username = 'guest'").fetchone()[0]
+        conn.close()
+        return password_hash
+
+
+class LoginHandlerTests(HandlerTestCase):
+    def test_login(self):
+        for script, handler in self.handlers.items():
+            with self.subTest(script):
+                status, body, _ = self.login(handler, 'guest@example.com', 'correct horse')
+                self.assertEqual(status, 200)
+                self.assertEqual(body['user']['email'], 'guest@example.com')
+                self.assertEqual(self.login(handler, 'guest@example.com', 'wrong horse')[0], 401)
+                self.assertEqual(self.login(handler, 'nobody@example.com', 'correct horse')[0], 401)
+
+    def test_malformed_login_is_400(self):
+        cases = [
+            ('guest@example.com', 123),
+            ('guest@example.com', ['correct horse']),
+            ('guest@example.com', {'value': 'correct horse'}),
+            (['guest@example.com'], 'correct horse'),
+            (42, 'correct horse'),
+            ('guest@example.com', None),
+            ('', 'correct horse'),
+        ]
+        for script, handler in self.handlers.items():
+            for email, password in cases:
+                with self.subTest(script, email=email, password=password):
+                    self.assertEqual(self.login(handler, email, password)[0], 400)
+
+    def test_busy_is_503_with_retry_after(self):
+        for script, handler in self.handlers.items():
+            with self.subTest(script):
+                with mock.patch.object(passwords, 'verify', side_effect=passwords.PasswordHasherBusy):
+                    status, _, headers = self.login(handler, 'guest@example.com', 'correct horse')
+                self.assertEqual(status, 503)
+                self.assertEqual(headers['Retry-After'], '1')
+
+    def test_login_stores_rehashed_password(self):
+        with mock.patch.object(passwords, 'BCRYPT_ROUNDS', ROUNDS + 1):
+            status = self.login(self.handlers['api-server.py'], 'guest@example.com', 'correct horse')[0]
+        self.assertEqual(status, 200)
+        self.assertEqual(passwords.cost(self.stored_hash()), ROUNDS + 1)
+
+
+class RegisterHandlerTests(HandlerTestCase):
+    def register(self, data):
+        return self.post(self.handlers['api-server.py'], '/api/auth/register', data)
+
+    def test_register_then_login(self):
+        status, body, _ = self.register({'username': 'ama', 'email': 'ama@example.com', 'password': 'kente cloth'})
+        self.assertEqual(status, 201)
+        self.assertEqual(body['user']['role'], 'user')
+        self.assertEqual(self.login(self.handlers['api-server.py'], 'ama@example.com', 'kente cloth')[0], 200)
+
+    def test_duplicate_is_409(self):
+        status = self.register({'username': 'guest', 'email': 'other@example.com', 'password': 'kente cloth'})[0]
+        self.assertEqual(status, 409)
+
+    def test_invalid_registrations_are_400(self):
+        cases = [
+            {'username': 'ama', 'email': 'ama@example.com', 'password': 'short'},
+            {'username': 'ama', 'email': 'not-an-email', 'password': 'kente cloth'},
+            {'username': 'ama', 'email': 'ama@example.com'},
+            {'username': 5, 'email': 'ama@example.com', 'password': 'kente cloth'},
+            {'username': 'ama', 'email': ['ama@example.com'], 'password': 'kente cloth'},
+            {'username': 'ama', 'email': 'ama@example.com', 'password': 12345678},
+            {'username': 'ama', 'email': 'ama@example.com', 'password': ['kente cloth']},
+        ]
+        for data in cases:
+            with self.subTest(data):
+                self.assertEqual(self.register(data)[0], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
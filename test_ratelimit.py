@@ -0,0 +1,202 @@
+"""
+Tests for token-bucket rate limiting (hallulies/ratelimit.py)
+
+Checks the TokenBucket's burst, wait and refill on a fake clock, that a
+KeyedRateLimiter keeps clients apart, sweeps buckets that have filled up
+again and evicts the least recently used beyond max_keys, and that
+@rate_limited answers 429 with Retry-After per client (taken from the
+proxy's end of X-Forwarded-For when trusted) and reports each decorated
+handler under its own name.
+
+Run with: python -m unittest test_ratelimit
+"""
+
+import http.server
+import json
+import math
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import ratelimit
+from hallulies.ratelimit import KeyedRateLimiter, TokenBucket, rate_limited
+from hallulies.responses import ResponseMixin
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_handlers():
+    """Two handler classes with a same-named limited method, decorated afresh (empty buckets)"""
+    class LoginHandler(ResponseMixin, http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.read_body()
+            self.handle_login()
+
+        @rate_limited('auth')
+        def handle_login(self):
+            self.send_json_response({'message': 'ok'})
+
+    class AdminLoginHandler(LoginHandler):
+        @rate_limited('auth')
+        def handle_login(self):
+            self.send_json_response({'message': 'ok'})
+
+    return LoginHandler, AdminLoginHandler
+
+
+class ClockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.enterContext(mock.patch('hallulies.ratelimit.time.monotonic', self.clock))
+
+
+class TokenBucketTests(ClockTestCase):
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        for _ in range(3):
+            self.assertEqual(bucket.try_acquire(), (True, 0.0))
+        allowed, wait = bucket.try_acquire()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.5)
+
+    def test_refill_up_to_burst(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        for _ in range(3):
+            bucket.try_acquire()
+        self.clock.now += 0.5
+        self.assertTrue(bucket.try_acquire()[0])
+        self.assertFalse(bucket.try_acquire()[0])
+        self.clock.now += 60
+        self.assertEqual(sum(bucket.try_acquire()[0] for _ in range(5)), 3)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0)
+        self.assertTrue(all(bucket.try_acquire()[0] for _ in range(100)))
+
+
+class KeyedRateLimiterTests(ClockTestCase):
+    def test_clients_have_their_own_buckets(self):
+        limiter = KeyedRateLimiter(rate=1.0, burst=2)
+        self.assertEqual([limiter.try_acquire('10.0.0.1')[0] for _ in range(3)], [True, True, False])
+        self.assertTrue(limiter.try_acquire('10.0.0.2')[0])
+        stats = limiter.stats()
+        self.assertEqual((stats['clients'], stats['allowed'], stats['rejected']), (2, 3, 1))
+
+    def test_full_buckets_swept(self):
+        limiter = KeyedRateLimiter(rate=1.0, burst=2)
+        for address in ('10.0.0.1', '10.0.0.2'):
+            limiter.try_acquire(address)
+        self.clock.now += 1.5
+        limiter.try_acquire('10.0.0.3')
+        # Idle for less than burst / rate seconds: kept
+        self.assertEqual(limiter.stats()['clients'], 3)
+        self.clock.now += 0.5
+        limiter.try_acquire('10.0.0.3')
+        stats = limiter.stats()
+        self.assertEqual((stats['clients'], stats['swept']), (1, 2))
+
+    def test_active_client_not_swept(self):
+        limiter = KeyedRateLimiter(rate=1.0, burst=2)
+        limiter.try_acquire('10.0.0.1')
+        limiter.try_acquire('10.0.0.1')
+        for _ in range(4):
+            self.clock.now += 1.0
+            limiter.try_acquire('10.0.0.1')
+        self.assertEqual(limiter.stats()['swept'], 0)
+        self.assertFalse(limiter.try_acquire('10.0.0.1')[0])
+
+    def test_max_keys_evicts_least_recently_used(self):
+        limiter = KeyedRateLimiter(rate=1.0, burst=2, max_keys=2)
+        limiter.try_acquire('10.0.0.1')
+        limiter.try_acquire('10.0.0.2')
+        limiter.try_acquire('10.0.0.1')
+        limiter.try_acquire('10.0.0.3')
+        stats = limiter.stats()
+        self.assertEqual((stats['clients'], stats['evicted']), (2, 1))
+        # 10.0.0.1 kept its empty bucket; 10.0.0.2 comes back as a new client
+        self.assertEqual(limiter.try_acquire('10.0.0.1')[0], False)
+        self.assertEqual(limiter.stats()['evicted'], 1)
+        limiter.try_acquire('10.0.0.2')
+        self.assertEqual(limiter.stats()['evicted'], 2)
+
+    def test_unlimited(self):
+        limiter = KeyedRateLimiter(rate=0)
+        self.assertTrue(all(limiter.try_acquire('10.0.0.1')[0] for _ in range(100)))
+        self.assertEqual(limiter.stats()['clients'], 0)
+
+
+class RateLimitedHandlerTests(ClockTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(ratelimit, 'RATE_LIMIT', True))
+        self.enterContext(mock.patch.dict(ratelimit._limiters, clear=True))
+        self.login, self.admin_login = make_handlers()
+        self.per_minute, self.burst = ratelimit.RULES['auth']
+
+    def post(self, handler=None, headers=None):
+        return http_testing.request(handler or self.login, 'POST', '/api/auth/login', headers)
+
+    def use_up_burst(self, handler=None, headers=None):
+        statuses = [self.post(handler, headers).status for _ in range(self.burst)]
+        self.assertEqual(statuses, [200] * self.burst)
+
+    def test_429_with_retry_after(self):
+        self.use_up_burst()
+        rejected = self.post()
+        self.assertEqual(rejected.status, 429)
+        self.assertEqual(rejected.headers['Retry-After'], str(math.ceil(60 / self.per_minute)))
+        self.assertIn('error', json.loads(rejected.body))
+        self.clock.now += 60 / self.per_minute
+        self.assertEqual(self.post().status, 200)
+
+    def test_clients_limited_separately(self):
+        with mock.patch.object(ratelimit, 'RATE_LIMIT_TRUST_FORWARDED', True):
+            self.use_up_burst(headers={'X-Forwarded-For': '203.0.113.7'})
+            self.assertEqual(self.post(headers={'X-Forwarded-For': '203.0.113.7'}).status, 429)
+            self.assertEqual(self.post(headers={'X-Forwarded-For': '198.51.100.20'}).status, 200)
+
+    def test_spoofed_forwarded_for_entries_ignored(self):
+        with mock.patch.object(ratelimit, 'RATE_LIMIT_TRUST_FORWARDED', True):
+            # The proxy appends the address it saw to whatever the client sent
+            self.use_up_burst(headers={'X-Forwarded-For': '10.0.0.1, 203.0.113.7'})
+            for spoofed in ('10.0.0.2', '198.51.100.20, 10.0.0.3'):
+                with self.subTest(spoofed):
+                    self.assertEqual(self.post(headers={'X-Forwarded-For': f'{spoofed}, 203.0.113.7'}).status, 429)
+
+    def test_trusted_proxies(self):
+        with mock.patch.object(ratelimit, 'RATE_LIMIT_TRUST_FORWARDED', True), \
+                mock.patch.object(ratelimit, 'RATE_LIMIT_TRUSTED_PROXIES', 2):
+            self.use_up_burst(headers={'X-Forwarded-For': '10.0.0.1, 203.0.113.7, 10.1.0.5'})
+            self.assertEqual(self.post(headers={'X-Forwarded-For': '203.0.113.7, 10.1.0.6'}).status, 429)
+            self.assertEqual(self.post(headers={'X-Forwarded-For': '10.0.0.1, 198.51.100.20, 10.1.0.5'}).status,
+                             200)
+
+    def test_forwarded_for_ignored_unless_trusted(self):
+        self.use_up_burst(headers={'X-Forwarded-For': '203.0.113.7'})
+        self.assertEqual(self.post(headers={'X-Forwarded-For': '198.51.100.20'}).status, 429)
+
+    def test_disabled(self):
+        with mock.patch.object(ratelimit, 'RATE_LIMIT', False):
+            statuses = {self.post().status for _ in range(self.burst * 3)}
+        self.assertEqual(statuses, {200})
+
+    def test_handlers_with_the_same_name_reported_separately(self):
+        self.use_up_burst()
+        self.post()
+        self.post(self.admin_login)
+        routes = ratelimit.stats()['routes']
+        self.assertEqual(sorted(routes), [self.admin_login.handle_login.__qualname__,
+                                          self.login.handle_login.__qualname__])
+        self.assertEqual(routes[self.login.handle_login.__qualname__]['rejected'], 1)
+        self.assertEqual(routes[self.admin_login.handle_login.__qualname__]['allowed'], 1)
+        self.assertEqual(ratelimit.stats()['rejected'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Tests for on-demand image resizing (hallulies/resizer.py)
+
+Checks that the DiskCache evicts least-recently-used files once it holds
+more than max_bytes, picks up what is already on disk oldest first, and
+notices files removed behind its back, and that concurrent requests for
+the same variant share one render (single flight), including its failure.
+
+Run with: python -m unittest test_resizer
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from hallulies import resizer
+from hallulies.resizer import DiskCache
+
+
+class DiskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def cache(self, max_bytes=25):
+        return DiskCache(self.directory, max_bytes)
+
+    def test_least_recently_used_evicted_over_budget(self):
+        cache = self.cache()
+        cache.put('aa.webp', b'a' * 10)
+        cache.put('bb.webp', b'b' * 10)
+        self.assertEqual(cache.get('aa.webp'), b'a' * 10)
+        cache.put('cc.webp', b'c' * 10)
+        self.assertIsNone(cache.get('bb.webp'))
+        self.assertFalse(os.path.exists(cache.path('bb.webp')))
+        self.assertEqual(cache.get('aa.webp'), b'a' * 10)
+        self.assertEqual(cache.get('cc.webp'), b'c' * 10)
+        stats = cache.stats()
+        self.assertEqual((stats['files'], stats['size'], stats['stores'], stats['evictions']), (2, 20, 3, 1))
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+
+    def test_evicts_as_many_as_needed(self):
+        cache = self.cache()
+        for name in ('aa.webp', 'bb.webp'):
+            cache.put(name, b'x' * 10)
+        cache.put('cc.webp', b'c' * 24)
+        self.assertEqual((cache.stats()['files'], cache.size), (1, 24))
+
+    def test_file_over_budget_kept_alone(self):
+        cache = self.cache()
+        cache.put('aa.webp', b'a' * 10)
+        cache.put('bb.webp', b'b' * 40)
+        self.assertEqual(cache.get('bb.webp'), b'b' * 40)
+        self.assertIsNone(cache.get('aa.webp'))
+
+    def test_replacing_a_file_counts_its_new_size(self):
+        cache = self.cache()
+        cache.put('aa.webp', b'a' * 10)
+        cache.put('aa.webp', b'a' * 5)
+        self.assertEqual((cache.stats()['files'], cache.size), (1, 5))
+
+    def test_existing_files_indexed_oldest_first(self):
+        writer = self.cache()
+        for age, name in enumerate(('new.webp', 'old.webp')):
+            writer.put(name, b'x' * 10)
+            os.utime(writer.path(name), (1700000000 - age, 1700000000 - age))
+        cache = self.cache()
+        self.assertEqual(cache.stats()['size'], 20)
+        cache.put('cc.webp', b'c' * 10)
+        self.assertFalse(os.path.exists(cache.path('old.webp')))
+        self.assertTrue(os.path.exists(cache.path('new.webp')))
+
+    def test_file_removed_elsewhere_is_a_miss(self):
+        cache = self.cache()
+        cache.put('aa.webp', b'a' * 10)
+        os.remove(cache.path('aa.webp'))
+        self.assertIsNone(cache.get('aa.webp'))
+        self.assertEqual((cache.stats()['files'], cache.size), (0, 0))
+
+
+class FakePool:
+    """Renders only when told to, counting the renders it was asked for"""
+
+    def __init__(self):
+        self.submitted = []
+        self.future = Future()
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        return self.future
+
+
+class SingleFlightTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.pool = FakePool()
+        self.enterContext(mock.patch.object(resizer, '_cache', DiskCache(self.directory, 1024)))
+        self.enterContext(mock.patch.object(resizer, '_pool', lambda: self.pool))
+        self.enterContext(mock.patch.object(resizer, '_inflight', {}))
+        self.enterContext(mock.patch.object(resizer, '_counters', {'renders': 0, 'coalesced': 0, 'failures': 0}))
+
+    def request_concurrently(self, count):
+        results = [None] * count
+
+        def request(index):
+            try:
+                results[index] = resizer.resized('images/room2.jpeg', 640, 'webp', 'ab.webp')
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=request, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        # Until all but the leader are waiting on its render
+        deadline = time.monotonic() + 5
+        while resizer._counters['coalesced'] < count - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return threads, results
+
+    def finish(self, threads):
+        for thread in threads:
+            thread.join(5)
+
+    def test_one_render_for_concurrent_requests(self):
+        threads, results = self.request_concurrently(8)
+        self.pool.future.set_result(b'webp bytes')
+        self.finish(threads)
+        self.assertEqual(results, [b'webp bytes'] * 8)
+        self.assertEqual(self.pool.submitted, [('images/room2.jpeg', 640, 'webp')])
+        stats = resizer.stats()
+        self.assertEqual((stats['renders'], stats['coalesced'], stats['in_progress']), (1, 7, 0))
+        # Later requests are served from the disk cache
+        self.assertEqual(resizer.resized('images/room2.jpeg', 640, 'webp', 'ab.webp'), b'webp bytes')
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_failed_render_fails_every_waiter_once(self):
+        threads, results = self.request_concurrently(4)
+        error = OSError('cannot identify image file')
+        self.pool.future.set_exception(error)
+        self.finish(threads)
+        self.assertEqual(results, [error] * 4)
+        self.assertEqual(len(self.pool.submitted), 1)
+        self.assertEqual((resizer._counters['failures'], resizer._inflight), (1, {}))
+        # Not remembered: the next request tries again
+        self.pool.future = Future()
+        self.pool.future.set_result(b'webp bytes')
+        self.assertEqual(resizer.resized('images/room2.jpeg', 640, 'webp', 'ab.webp'), b'webp bytes')
+        self.assertEqual(len(self.pool.submitted), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Tests for the route table (hallulies/router.py)
+
+Checks exact and parameterized routes, the {name:int} and {name:path}
+converters (including ids too long for SQLite), that routes sharing leading
+segments are kept apart by method, and that RoutingMixin answers 405 with
+Allow, a JSON 404 under /api/ and 400 for a body that is not a JSON object.
+
+Run with: python -m unittest test_router
+"""
+
+import http.server
+import json
+import unittest
+
+import http_testing
+from hallulies.responses import ResponseMixin
+from hallulies.router import Router, RoutingMixin
+
+ROUTES = Router([
+    ('GET', '/api/menu', 'handle_get_menu'),
+    ('POST', '/api/menu', 'handle_create_menu_item'),
+    ('GET', '/api/menu/category/{category}', 'handle_get_menu_by_category'),
+    ('PUT', '/api/menu/{menu_id:int}', 'handle_update_menu_item'),
+    ('DELETE', '/api/menu/{menu_id:int}', 'handle_delete_menu_item'),
+    ('GET', '/api/bookings/{booking_id:int}', 'handle_get_booking'),
+    ('GET', '/img/{width:int}/{path:path}', 'handle_resized_image'),
+])
+
+
+class MenuHandler(RoutingMixin, ResponseMixin, http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    routes = ROUTES
+
+    def do_GET(self):
+        if not self.dispatch_route():
+            self.send_json_response({'static': self.path})
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def handle_get_menu(self):
+        self.send_json_response({'handler': 'menu', 'query': self.query})
+
+    def handle_create_menu_item(self, data):
+        self.send_json_response({'handler': 'create', 'data': data}, 201)
+
+    def handle_update_menu_item(self, menu_id, data):
+        self.send_json_response({'handler': 'update', 'menu_id': menu_id, 'data': data})
+
+
+class ResolveTests(unittest.TestCase):
+    def test_exact_route_and_query(self):
+        match = ROUTES.resolve('GET', '/api/menu?category=mains&page=')
+        self.assertEqual((match.handler, match.params, match.path), ('handle_get_menu', {}, '/api/menu'))
+        self.assertEqual(match.query, {'category': 'mains', 'page': ''})
+
+    def test_converters(self):
+        cases = {
+            '/api/menu/category/Main%20Course': ('handle_get_menu_by_category', {'category': 'Main Course'}),
+            '/api/bookings/42': ('handle_get_booking', {'booking_id': 42}),
+            '/api/bookings/' + '9' * 18: ('handle_get_booking', {'booking_id': int('9' * 18)}),
+            '/img/480/images/rooms/deluxe%20room.jpg': ('handle_resized_image',
+                                                         {'width': 480, 'path': 'images/rooms/deluxe room.jpg'}),
+        }
+        for path, (handler, params) in cases.items():
+            with self.subTest(path):
+                match = ROUTES.resolve('GET', path)
+                self.assertEqual((match.handler, match.params), (handler, params))
+
+    def test_non_matching_paths(self):
+        for path in ('/api/bookings/abc', '/api/bookings/-1', '/api/bookings/', '/api/bookings/1/extra',
+                     '/api/bookings/' + '9' * 19, '/api/bookings/99999999999999999999999', '/img/wide/a.jpg',
+                     '/api/unknown'):
+            with self.subTest(path):
+                self.assertIsNone(ROUTES.resolve('GET', path))
+
+    def test_methods_are_kept_apart(self):
+        self.assertEqual(ROUTES.resolve('PUT', '/api/menu/7').handler, 'handle_update_menu_item')
+        self.assertEqual(ROUTES.resolve('DELETE', '/api/menu/7').handler, 'handle_delete_menu_item')
+        # Same bucket ('api', 'menu') under GET holds only the category route
+        self.assertEqual(ROUTES.resolve('GET', '/api/menu/category/7').handler, 'handle_get_menu_by_category')
+        not_allowed = ROUTES.resolve('GET', '/api/menu/7')
+        self.assertIsNone(not_allowed.handler)
+        self.assertEqual(not_allowed.allowed, ['DELETE', 'PUT'])
+        self.assertEqual(ROUTES.resolve('PATCH', '/api/menu').allowed, ['GET', 'POST'])
+
+    def test_routes_added_later_are_compiled(self):
+        router = Router([('GET', '/api/rooms/{room_id:int}', 'handle_get_room')])
+        self.assertIsNone(router.resolve('GET', '/api/rooms/1/photos'))
+        router.add('get', '/api/rooms/{room_id:int}/photos', 'handle_get_room_photos')
+        self.assertEqual(router.resolve('GET', '/api/rooms/1/photos').handler, 'handle_get_room_photos')
+        self.assertEqual(len(router), 2)
+
+    def test_unknown_converter(self):
+        router = Router([('GET', '/api/rooms/{room_id:uuid}', 'handle_get_room')])
+        with self.assertRaises(ValueError):
+            router.resolve('GET', '/api/rooms/1')
+
+
+class DispatchTests(unittest.TestCase):
+    def send(self, method, path, body=None, raw_body=None):
+        if body is not None:
+            raw_body = json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json'} if raw_body else None
+        response = http_testing.request(MenuHandler, method, path, headers, raw_body or b'')
+        return response.status, json.loads(response.body), response.headers
+
+    def test_handlers_get_params_query_and_data(self):
+        self.assertEqual(self.send('GET', '/api/menu?category=mains')[1],
+                         {'handler': 'menu', 'query': {'category': 'mains'}})
+        self.assertEqual(self.send('PUT', '/api/menu/7', {'price': 50})[:2],
+                         (200, {'handler': 'update', 'menu_id': 7, 'data': {'price': 50}}))
+        self.assertEqual(self.send('POST', '/api/menu')[:2], (201, {'handler': 'create', 'data': {}}))
+
+    def test_405_with_allow(self):
+        status, body, headers = self.send('GET', '/api/menu/7')
+        self.assertEqual((status, body), (405, {'error': 'Method not allowed'}))
+        self.assertEqual(headers['Allow'], 'DELETE, PUT')
+
+    def test_404_json_under_api_prefix(self):
+        for path in ('/api/unknown', '/api/bookings/99999999999999999999999'):
+            with self.subTest(path):
+                self.assertEqual(self.send('GET', path)[:2], (404, {'error': 'API endpoint not found'}))
+
+    def test_other_paths_fall_through(self):
+        self.assertEqual(self.send('GET', '/index.html')[:2], (200, {'static': '/index.html'}))
+
+    def test_invalid_json_is_400(self):
+        for raw_body in (b'{"price": ', b'[1, 2]', b'"text"', b'\xff\xfe'):
+            with self.subTest(raw_body):
+                self.assertEqual(self.send('POST', '/api/menu', raw_body=raw_body)[:2],
+                                 (400, {'error': 'Invalid JSON'}))
+
+
+class BookingIdTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http_testing.load_script('api-server.py')
+
+    def setUp(self):
+        self.enterContext(http_testing.temporary_database())
+
+    def test_ids_out_of_range_are_404(self):
+        for booking_id in ('1', '9' * 18, '9' * 19, '99999999999999999999999'):
+            with self.subTest(booking_id):
+                response = http_testing.request(self.server.HalluliesAPIHandler, 'GET', f'/api/bookings/{booking_id}')
+                self.assertEqual(response.status, 404)
+                self.assertIn('error', json.loads(response.body))
+
+
+if __name__ == '__main__':
+    unittest.main()
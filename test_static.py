@@ -0,0 +1,140 @@
+"""
+Tests for Range requests on static files (hallulies/static.py)
+
+Checks parse_ranges() on suffix, open-ended, overlapping, unsatisfiable and
+malformed ranges, If-Range with entity tags and dates, and the responses:
+206 with Content-Range for one range, multipart/byteranges for several,
+416 when none is satisfiable and the full 200 when If-Range no longer
+matches, for files served from memory and from disk alike.
+
+Run with: python -m unittest test_static
+"""
+
+import email
+import email.policy
+import http.server
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import http_testing
+from hallulies import conditional, static
+from hallulies.responses import ResponseMixin
+from hallulies.static import StaticFileMixin
+
+CONTENT = bytes(range(256)) * 8
+
+
+class StaticHandler(ResponseMixin, StaticFileMixin, http.server.SimpleHTTPRequestHandler):
+    pass
+
+
+class ParseRangesTests(unittest.TestCase):
+    def test_parse_ranges(self):
+        cases = {
+            'bytes=0-99': [(0, 99)],
+            'bytes=100-': [(100, 999)],
+            'bytes=-100': [(900, 999)],
+            'bytes=-2000': [(0, 999)],
+            'bytes=900-2000': [(900, 999)],
+            'bytes = 0-9, 20-29': [(0, 9), (20, 29)],
+            'bytes=20-29,0-9': [(0, 9), (20, 29)],
+            'bytes=0-9,5-19,20-29': [(0, 29)],
+            'bytes=1000-': [],
+            'bytes=-0': [],
+            'bytes=1000-1100,0-0': [(0, 0)],
+            'items=0-9': None,
+            'bytes=': None,
+            'bytes=9-0': None,
+            'bytes=a-b': None,
+            'bytes=0-9;': None,
+            'bytes=-': None,
+            'bytes=' + ','.join(f'{n}-{n}' for n in range(static.MAX_RANGES + 1)): None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertEqual(static.parse_ranges(header, 1000), expected)
+
+    def test_if_range(self):
+        etag, modified = '"abc"', 1700000000
+        date = conditional.http_date(modified)
+        cases = {
+            None: True,
+            '"abc"': True,
+            '"other"': False,
+            'W/"abc"': False,
+            date: True,
+            conditional.http_date(modified - 1): False,
+            'not a date': False,
+        }
+        for if_range, expected in cases.items():
+            with self.subTest(if_range):
+                headers = {} if if_range is None else {'If-Range': if_range}
+                self.assertEqual(conditional.if_range_matches(headers, etag, modified), expected)
+        self.assertFalse(conditional.if_range_matches({'If-Range': '"abc"'}, 'W/"abc"', modified))
+
+
+class RangeResponseTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        with open(os.path.join(self.directory, 'menu.pdf'), 'wb') as f:
+            f.write(CONTENT)
+
+    def get(self, headers=None, method='GET'):
+        return http_testing.request(StaticHandler, method, '/menu.pdf', headers, directory=self.directory)
+
+    def check_ranges(self):
+        full = self.get()
+        self.assertEqual(full.body, CONTENT)
+        self.assertEqual(full.headers['Accept-Ranges'], 'bytes')
+
+        one = self.get({'Range': 'bytes=10-19'})
+        self.assertEqual(one.status, 206)
+        self.assertEqual(one.body, CONTENT[10:20])
+        self.assertEqual(one.headers['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(one.headers['Content-Length'], '10')
+        self.assertEqual(self.get({'Range': 'bytes=-5'}).body, CONTENT[-5:])
+
+        several = self.get({'Range': 'bytes=0-3,100-103'})
+        self.assertEqual(several.status, 206)
+        self.assertEqual(several.headers['Content-Length'], str(len(several.body)))
+        message = email.message_from_bytes(
+            b'Content-Type: ' + several.headers['Content-Type'].encode() + b'\r\n\r\n' + several.body,
+            policy=email.policy.HTTP)
+        parts = [(part['Content-Range'], part.get_payload(decode=True)) for part in message.iter_parts()]
+        self.assertEqual(parts, [(f'bytes 0-3/{len(CONTENT)}', CONTENT[0:4]),
+                                 (f'bytes 100-103/{len(CONTENT)}', CONTENT[100:104])])
+
+        unsatisfiable = self.get({'Range': f'bytes={len(CONTENT)}-'})
+        self.assertEqual(unsatisfiable.status, 416)
+        self.assertEqual(unsatisfiable.headers['Content-Range'], f'bytes */{len(CONTENT)}')
+
+        ignored = self.get({'Range': 'bytes=9-0'})
+        self.assertEqual((ignored.status, ignored.body), (200, CONTENT))
+
+    def test_ranges_from_memory(self):
+        self.check_ranges()
+
+    def test_ranges_from_disk(self):
+        with mock.patch.object(static, 'STATIC_CACHE_MAX_FILE_SIZE', 0):
+            self.check_ranges()
+
+    def test_if_range(self):
+        full = self.get()
+        current = self.get({'Range': 'bytes=0-9', 'If-Range': full.headers['ETag']})
+        self.assertEqual(current.status, 206)
+        by_date = self.get({'Range': 'bytes=0-9', 'If-Range': full.headers['Last-Modified']})
+        self.assertEqual(by_date.status, 206)
+        outdated = self.get({'Range': 'bytes=0-9', 'If-Range': '"outdated"'})
+        self.assertEqual((outdated.status, outdated.body), (200, CONTENT))
+
+    def test_head(self):
+        response = self.get({'Range': 'bytes=0-9'}, method='HEAD')
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.headers['Content-Length'], '10')
+        self.assertEqual(response.body, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Tests for the email template engine (hallulies/templates.py)
+
+Checks that values are HTML-escaped unless wrapped in Markup, if/else and
+for, include, extends with blocks (the closest template's block winning),
+that malformed tags and templates including or extending themselves raise
+TemplateError, and that every shipped template compiles.
+
+Run with: python -m unittest test_templates
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from hallulies import templates
+from hallulies.templates import Markup, TemplateError
+
+
+class TemplateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(mock.patch.object(templates, 'EMAIL_TEMPLATES_DIR', self.directory))
+        self.enterContext(mock.patch.dict(templates._compiled, clear=True))
+
+    def write(self, name, source):
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            f.write(source)
+
+    def render(self, source, **context):
+        self.write('test.html', source)
+        templates._compiled.clear()
+        return templates.render('test.html', **context)
+
+
+class RenderTests(TemplateTestCase):
+    def test_values_are_escaped(self):
+        rendered = self.render('<p>{{ name }}</p>', name='<script>alert("Ama & Kofi\'s")</script>')
+        self.assertEqual(rendered, '<p>&lt;script&gt;alert(&quot;Ama &amp; Kofi&#x27;s&quot;)&lt;/script&gt;</p>')
+        self.assertEqual(self.render('{{ nights }} {{ note }}', nights=3, note=None), '3 ')
+
+    def test_markup_inserted_as_is(self):
+        self.assertEqual(self.render('<div>{{ items }}</div>', items=Markup('<li>Jollof</li>')),
+                         '<div><li>Jollof</li></div>')
+
+    def test_missing_value(self):
+        with self.assertRaises(KeyError):
+            self.render('{{ name }}')
+
+    def test_if_else(self):
+        source = '{% if special_requests %}Requests: {{ special_requests }}{% else %}None{% endif %}'
+        self.assertEqual(self.render(source, special_requests='<late check-in>'), 'Requests: &lt;late check-in&gt;')
+        for falsy in ('', None, 0, []):
+            with self.subTest(falsy):
+                self.assertEqual(self.render(source, special_requests=falsy), 'None')
+        self.assertEqual(self.render('{% if phone %}{{ phone }}{% endif %}.'), '.')
+
+    def test_for(self):
+        source = '<ul>{% for room in rooms %}<li>{{ room }}{% if note %} ({{ note }}){% endif %}</li>{% endfor %}</ul>'
+        self.assertEqual(self.render(source, rooms=['Deluxe', 'Suite & Spa'], note=''),
+                         '<ul><li>Deluxe</li><li>Suite &amp; Spa</li></ul>')
+        self.assertEqual(self.render(source, rooms=['Deluxe'], note='sea view'), '<ul><li>Deluxe (sea view)</li></ul>')
+        self.assertEqual(self.render(source, rooms=[], note=''), '<ul></ul>')
+        # The loop variable does not leak out of the loop
+        self.assertEqual(self.render('{% for name in names %}{{ name }}{% endfor %}{{ name }}',
+                                     names=['a', 'b'], name='outer'), 'abouter')
+
+    def test_include(self):
+        self.write('style.css', 'p { color: #333; }')
+        self.assertEqual(self.render('<style>{% include "style.css" %}</style>{{ name }}', name='Ama'),
+                         '<style>p { color: #333; }</style>Ama')
+
+    def test_extends_and_blocks(self):
+        self.write('layout.html', '<h1>{% block title %}Hallulies{% endblock %}</h1>{% block content %}{% endblock %}'
+                                  '<footer>{% block footer %}Accra{% endblock %}</footer>')
+        self.write('booking.html', '{% extends "layout.html" %}{% block content %}<p>{{ guest_name }}</p>{% endblock %}'
+                                   '{% block footer %}Booking desk{% endblock %}')
+        source = '\n{% extends "booking.html" %}\n{% block footer %}{{ desk }}{% endblock %}'
+        self.assertEqual(self.render(source, guest_name='Ama', desk='<Front desk>'),
+                         '<h1>Hallulies</h1><p>Ama</p><footer>&lt;Front desk&gt;</footer>')
+
+    def test_compiled_once(self):
+        self.write('test.html', '{{ name }}')
+        template = templates.get('test.html')
+        self.write('test.html', 'changed')
+        self.assertIs(templates.get('test.html'), template)
+        self.assertEqual(templates.render('test.html', name='Ama'), 'Ama')
+
+
+class TemplateErrorTests(TemplateTestCase):
+    def test_bad_syntax(self):
+        for source in ('{{ guest name }}', '{{ 1 + 1 }}', '{{ __import__("os") }}', '{% if %}x{% endif %}',
+                       '{% if a b %}x{% endif %}', '{% if a %}x', '{% if a %}x{% else %}y',
+                       '{% for room %}x{% endfor %}', '{% for room in %}x{% endfor %}',
+                       '{% for room of rooms %}x{% endfor %}', '{% for room in rooms %}x',
+                       '{% block content %}x', '{% include style.css %}', '{% include "" %}',
+                       '{% endif %}', '{% while a %}', '{% %}', 'x{% extends "layout.html" %}'):
+            with self.subTest(source):
+                with self.assertRaises(TemplateError):
+                    self.render(source, a=1, rooms=[])
+
+    def test_recursive_include(self):
+        self.write('a.html', 'a {% include "b.html" %}')
+        self.write('b.html', 'b {% include "a.html" %}')
+        self.write('self.html', '{% extends "self.html" %}')
+        for name in ('a.html', 'self.html'):
+            with self.subTest(name):
+                with self.assertRaises(TemplateError):
+                    templates.get(name)
+
+    def test_names_outside_the_directory(self):
+        for name in ('../secret.html', '.hidden.html', 'sub/x.html'):
+            with self.subTest(name):
+                with self.assertRaises(TemplateError):
+                    self.render(f'{{% include "{name}" %}}')
+
+
+class ShippedTemplateTests(unittest.TestCase):
+    def test_preload(self):
+        with mock.patch.dict(templates._compiled, clear=True):
+            templates.preload()
+            self.assertIn('booking_confirmation.html', templates._compiled)
+
+
+if __name__ == '__main__':
+    unittest.main()
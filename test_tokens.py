@@ -0,0 +1,108 @@
+"""
+Tests for the verified-token cache (hallulies/tokens.py)
+
+Checks that a repeat token is served from the cache as a private copy,
+that a cached entry is dropped at the token's exp and the token verified
+afresh, that tokens failing verification are never cached, and that the
+cache keeps its least recently used entries within max_entries.
+
+Run with: python -m unittest test_tokens
+"""
+
+import time
+import unittest
+from unittest import mock
+
+import jwt
+
+from hallulies.tokens import TokenVerifier
+
+SECRET_KEY = 'test-secret'
+
+
+def make_token(user_id=1, expires_in=3600, secret=SECRET_KEY):
+    payload = {'user_id': user_id, 'role': 'admin'}
+    if expires_in is not None:
+        payload['exp'] = int(time.time()) + expires_in
+    return jwt.encode(payload, secret, algorithm='HS256')
+
+
+class TokenVerifierTests(unittest.TestCase):
+    def test_repeat_is_a_hit(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        token = make_token()
+        first = verifier.decode(token)
+        with mock.patch('hallulies.tokens.jwt.decode', side_effect=AssertionError('not cached')):
+            second = verifier.decode(token)
+        self.assertEqual(first, second)
+        stats = verifier.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_callers_get_a_copy(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        token = make_token()
+        verifier.decode(token)['role'] = 'guest'
+        self.assertEqual(verifier.decode(token)['role'], 'admin')
+
+    def test_entry_dropped_at_exp(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        token = make_token(expires_in=60)
+        exp = verifier.decode(token)['exp']
+        with mock.patch('hallulies.tokens.time.time', return_value=exp - 1):
+            verifier.decode(token)
+        self.assertEqual(verifier.stats()['hits'], 1)
+        with mock.patch('hallulies.tokens.time.time', return_value=exp):
+            # Verified again by jwt.decode(), which still accepts it by the real clock
+            verifier.decode(token)
+        stats = verifier.stats()
+        self.assertEqual((stats['expired'], stats['misses']), (1, 2))
+
+    def test_expired_token_rejected_and_not_cached(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        token = make_token(expires_in=-10)
+        for _ in range(2):
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                verifier.decode(token)
+        stats = verifier.stats()
+        self.assertEqual((stats['failures'], stats['entries']), (2, 0))
+
+    def test_bad_signature_rejected_and_not_cached(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        with self.assertRaises(jwt.InvalidSignatureError):
+            verifier.decode(make_token(secret='another-secret'))
+        with self.assertRaises(jwt.InvalidTokenError):
+            verifier.decode('not.a.token')
+        self.assertEqual(verifier.stats()['entries'], 0)
+
+    def test_token_without_exp_is_cached(self):
+        verifier = TokenVerifier(SECRET_KEY)
+        token = make_token(expires_in=None)
+        verifier.decode(token)
+        verifier.decode(token)
+        self.assertEqual(verifier.stats()['hits'], 1)
+
+    def test_least_recently_used_evicted(self):
+        verifier = TokenVerifier(SECRET_KEY, max_entries=2)
+        first, second, third = (make_token(user_id) for user_id in (1, 2, 3))
+        verifier.decode(first)
+        verifier.decode(second)
+        verifier.decode(first)
+        verifier.decode(third)
+        stats = verifier.stats()
+        self.assertEqual((stats['entries'], stats['evictions']), (2, 1))
+        verifier.decode(first)
+        self.assertEqual(verifier.stats()['hits'], 2)
+        verifier.decode(second)
+        self.assertEqual(verifier.stats()['misses'], 4)
+
+    def test_cache_disabled(self):
+        verifier = TokenVerifier(SECRET_KEY, max_entries=0)
+        token = make_token()
+        verifier.decode(token)
+        verifier.decode(token)
+        stats = verifier.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (0, 2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()